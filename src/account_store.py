@@ -0,0 +1,185 @@
+import threading
+from array import array
+from typing import Any, Dict, Iterator, List, MutableMapping, Optional
+
+from dao import Account, balance_cents_of
+from lazy_mapping import LazyOwnerIndex
+
+
+# Open addressing string -> row index over a flat int array.
+# A dict would cost an entry plus an int object per row, this costs 8 bytes per row.
+class StringIndex:
+    __slots__ = ("keys", "table", "mask")
+
+    def __init__(self) -> None:
+        self.keys: List[str] = []
+        self.table = array('i', [-1]) * 8
+        self.mask = 7
+
+    def get(self, key: str) -> int:
+        table, keys, mask = self.table, self.keys, self.mask
+        slot = hash(key) & mask
+        while True:
+            row = table[slot]
+            if row < 0 or keys[row] == key:
+                return row
+            slot = (slot + 1) & mask
+
+    def add(self, key: str) -> int:
+        row = self.get(key)
+        if row >= 0:
+            return row
+        row = len(self.keys)
+        self.keys.append(key)
+        if 2 * len(self.keys) > len(self.table):
+            self._resize(2 * len(self.table))
+        else:
+            self._insert(key, row)
+        return row
+
+    def _insert(self, key: str, row: int) -> None:
+        slot = hash(key) & self.mask
+        while self.table[slot] >= 0:
+            slot = (slot + 1) & self.mask
+        self.table[slot] = row
+
+    def _resize(self, size: int) -> None:
+        self.table = array('i', [-1]) * size
+        self.mask = size - 1
+        for row, key in enumerate(self.keys):
+            self._insert(key, row)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+
+# Row proxy into ColumnarAccountStore, same surface as dao.Account (owner_id / balance_cents / account_id / to_dict).
+# Setting balance_cents writes straight into the balances column.
+class AccountRecord:
+    __slots__ = ("store", "row")
+
+    def __init__(self, store: "ColumnarAccountStore", row: int) -> None:
+        self.store = store
+        self.row = row
+
+    @property
+    def account_id(self) -> str:
+        return self.store.account_ids.keys[self.row]
+
+    @property
+    def owner_id(self) -> str:
+        return self.store.owner_ids.keys[self.store.owners[self.row]]
+
+    @owner_id.setter
+    def owner_id(self, value: str) -> None:
+        self.store.set_owner(self.row, value)
+
+    @property
+    def balance_cents(self) -> int:
+        return self.store.balances[self.row]
+
+    @balance_cents.setter
+    def balance_cents(self, value: int) -> None:
+        self.store.balances[self.row] = value
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"owner_id": self.owner_id, "balance_cents": self.balance_cents, "account_id": self.account_id}
+
+    def __eq__(self, other: object) -> bool:
+        return (isinstance(other, (AccountRecord, Account)) and
+                (self.owner_id, self.balance_cents, self.account_id) ==
+                (other.owner_id, other.balance_cents, other.account_id))
+
+    def __repr__(self) -> str:
+        return (f"AccountRecord(owner_id={self.owner_id!r}, balance_cents={self.balance_cents!r}, "
+                f"account_id={self.account_id!r})")
+
+
+# Columnar accounts: parallel arrays of balances (int cents) and owner indices,
+# every account / owner id string is stored once.
+# No object per account - rows are addressed through StringIndex, AccountRecord proxies are created on access.
+class ColumnarAccountStore(MutableMapping):
+    def __init__(self) -> None:
+        self.account_ids = StringIndex()
+        self.balances = array('q')
+        self.owners = array('i')
+        self.owner_ids = StringIndex()
+        # owner row -> account rows, built on the first owner lookup and then kept up to date row by row
+        self._rows_by_owner: Optional[Dict[int, array]] = None
+        self._owner_lock = threading.Lock()
+
+    @staticmethod
+    def from_dict(data: Dict[str, Dict[str, Any]]) -> "ColumnarAccountStore":
+        store = ColumnarAccountStore()
+        for account_id, info in data.items():
+            store.add(account_id, info["owner_id"], balance_cents_of(info))
+        return store
+
+    def to_dict(self) -> Dict[str, Dict[str, Any]]:
+        return {account_id: AccountRecord(self, row).to_dict() for row, account_id in enumerate(self.account_ids.keys)}
+
+    def add(self, account_id: str, owner_id: str, balance_cents: int) -> AccountRecord:
+        with self._owner_lock:
+            owner_row = self.owner_ids.add(owner_id)
+            row = self.account_ids.get(account_id)
+            if row >= 0:
+                self.balances[row] = balance_cents
+                self._move(row, owner_row)
+                return AccountRecord(self, row)
+            row = self.account_ids.add(account_id)
+            self.balances.append(balance_cents)
+            self.owners.append(owner_row)
+            if self._rows_by_owner is not None:
+                self._rows_by_owner.setdefault(owner_row, array('i')).append(row)
+            return AccountRecord(self, row)
+
+    def set_owner(self, row: int, owner_id: str) -> None:
+        with self._owner_lock:
+            self._move(row, self.owner_ids.add(owner_id))
+
+    def _move(self, row: int, owner_row: int) -> None:
+        # called with _owner_lock held
+        previous = self.owners[row]
+        if previous == owner_row:
+            return
+        self.owners[row] = owner_row
+        if self._rows_by_owner is not None:
+            self._rows_by_owner[previous].remove(row)
+            self._rows_by_owner.setdefault(owner_row, array('i')).append(row)
+
+    def accounts_by_owner(self) -> LazyOwnerIndex:
+        return LazyOwnerIndex(self._account_ids_of, self, owners=lambda: iter(self.owner_ids.keys))
+
+    def _account_ids_of(self, owner_id: str) -> List[str]:
+        # owner -> rows is built once from the owners column (an array of row numbers per owner, not objects)
+        with self._owner_lock:
+            owner_row = self.owner_ids.get(owner_id)
+            if owner_row < 0:
+                return []
+            if self._rows_by_owner is None:
+                rows_by_owner: Dict[int, array] = {}
+                for row, owner in enumerate(self.owners):
+                    rows_by_owner.setdefault(owner, array('i')).append(row)
+                self._rows_by_owner = rows_by_owner
+            return [self.account_ids.keys[row] for row in self._rows_by_owner.get(owner_row, ())]
+
+    def __getitem__(self, account_id: str) -> AccountRecord:
+        row = self.account_ids.get(account_id)
+        if row < 0:
+            raise KeyError(account_id)
+        return AccountRecord(self, row)
+
+    def __contains__(self, account_id: object) -> bool:
+        return isinstance(account_id, str) and self.account_ids.get(account_id) >= 0
+
+    def __setitem__(self, account_id: str, account: Account) -> None:
+        self.add(account_id, account.owner_id, account.balance_cents)
+
+    def __delitem__(self, account_id: str) -> None:
+        raise TypeError("Accounts can't be removed from a columnar store.")
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.account_ids.keys)
+
+    def __len__(self) -> int:
+        return len(self.account_ids)
@@ -1,7 +1,19 @@
 import logging
-from typing import Dict, List, Optional
-from exceptions import UnauthorizedAccessError, InvalidAmountError, AccountNotFoundError, ATMError
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Mapping, MutableMapping, Optional, Tuple
+from exceptions import UnauthorizedAccessError, InvalidAmountError, AccountNotFoundError, ATMError, BatchError, \
+    UndispensableAmountError
 from dao import User, Password, Account
+from atm_handler.atm_handler import AtmHandler
+from money import is_cents
+from password_hasher import PasswordHasher, default_password_hasher
+from rate_limiter import LoginLimiter
+from index_manager import IndexManager
+from limits import WithdrawalLimits
+from cash_dispenser import CashDispenser
+from batch import BatchResult, chunked, read_operations
+from session import CommitGate, LockTable, Session
+from transaction_history import StatementPage, TransactionHistory
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -9,32 +21,114 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 
 class ATM:
     def __init__(self,
-                  users: Optional[Dict[str, User]],
-                  passwords: Optional[Dict[str, Password]],
-                  accounts: Optional[Dict[str, Account]]) -> None:
+                  users: Optional[Mapping[str, User]],
+                  passwords: Optional[Mapping[str, Password]],
+                  accounts: Optional[MutableMapping[str, Account]],
+                  journal: Optional[AtmHandler] = None,
+                  accounts_by_owner: Optional[Mapping[str, List[Account]]] = None,
+                  password_hasher: Optional[PasswordHasher] = None,
+                  login_limiter: Optional[LoginLimiter] = None,
+                  history: Optional[TransactionHistory] = None,
+                  limits: Optional[WithdrawalLimits] = None,
+                  cash: Optional[CashDispenser] = None) -> None:
 
         self.users = users
         self.passwords = passwords
         self.accounts = accounts
         self.specific_user: Optional[str] = None
+        self.password_hasher = password_hasher or default_password_hasher()
+        self.login_limiter = login_limiter or LoginLimiter()
 
-        self.accounts_by_owner: Dict[str, List[Account]] = {}
-        self.build_owner_account_index()
-
-    def build_owner_account_index(self) -> None:
-        for account in self.accounts.values():
-            owner_id = account.owner_id
-            if owner_id not in self.accounts_by_owner:
-                self.accounts_by_owner[owner_id] = []
-            self.accounts_by_owner[owner_id].append(account)
-
-    def authenticate(self, user_id: str, password: str) -> str:
-        if user_id in self.passwords and self.passwords[user_id].password == password:
-            self.specific_user = user_id
-            logging.info(f"User '{user_id}' authenticated successfully.")
-            return self.users[user_id].name
+        # per account / per user locks, mutations from concurrent sessions never take a global lock
+        self.account_locks = LockTable()
+        self.password_locks = LockTable()
+        self.user_locks = LockTable()
+        # snapshots (see flusher.py) take it exclusively, so they never see a half applied commit
+        self.commit_gate = CommitGate()
+
+        # objects touched since the last collect_changes(), for handlers that persist only the delta (the flusher).
+        # with a journal every record is already persisted and nothing drains them, so they are not tracked
+        self.track_changes: bool = journal is None
+        self.changed_accounts: Dict[str, Account] = {}
+        self.changed_passwords: Dict[str, Password] = {}
+        # created / reassigned accounts and edited users, persisted as whole entries
+        self.changed_account_entries: Dict[str, Account] = {}
+        self.changed_users: Dict[str, User] = {}
+        self.cassettes_changed = False
+
+        # optional write-ahead journal, every mutation is appended to it before it is acknowledged
+        self.journal = journal
+        # optional append-only transaction history, every committed balance change is recorded in it
+        self.history = history
+        # optional daily limit / velocity rules for withdrawals and outgoing transfers
+        self.limits = limits
+        if history is not None and limits is not None:
+            # the windows are in memory only, after a restart they are refilled from the history
+            limits.rebuild(history.entries_since(limits.clock() - limits.window_seconds), self._owner_of)
+        # optional note inventory, a withdrawal the machine can't pay out in notes is rejected
+        self.cash = cash
+        # the handler whose journal is compacted after the operations that append to it (see compacting), without
+        # a journal the flusher compacts
+        self.compactor: Optional[AtmHandler] = journal if isinstance(journal, AtmHandler) else None
+
+        # users/passwords/accounts may be any mapping, e.g. a lazy proxy over the handler (see lazy_mapping.py),
+        # a handler backed by an indexed store answers owner lookups itself, then there is no full scan here.
+        # owner / email / balance indexes are updated by every mutation (index_manager.py)
+        self.indexes = IndexManager(users, accounts, accounts_by_owner, commit_gate=self.commit_gate)
+
+    @classmethod
+    def from_handler(cls, atm_handler: AtmHandler, password_hasher: Optional[PasswordHasher] = None,
+                     history: Optional[TransactionHistory] = None,
+                     limits: Optional[WithdrawalLimits] = None,
+                     cash: Optional[CashDispenser] = None) -> "ATM":
+        return cls(atm_handler.get_users(),
+                   atm_handler.get_passwords(),
+                   atm_handler.get_accounts(),
+                   journal=atm_handler.get_journal(),
+                   accounts_by_owner=atm_handler.get_accounts_by_owner(),
+                   password_hasher=password_hasher,
+                   history=history,
+                   limits=limits,
+                   cash=cash)
+
+    @property
+    def accounts_by_owner(self) -> Mapping[str, List[Account]]:
+        return self.indexes.accounts_by_owner
+
+    def rebuild_indexes(self, workers: int = 1) -> None:
+        self.indexes.rebuild(workers)
+
+    def authenticate(self, user_id: str, password: str, client_id: Optional[str] = None) -> str:
+        name = self._verify_credentials(user_id, password, client_id)
+        self.specific_user = user_id
+        return name
+
+    def login(self, user_id: str, password: str, client_id: Optional[str] = None) -> Session:
+        # a session carries its own user, so many sessions can run against one ATM concurrently
+        name = self._verify_credentials(user_id, password, client_id)
+        return Session(self, user_id, name)
+
+    def _verify_credentials(self, user_id: str, password: str, client_id: Optional[str] = None) -> str:
+        # a locked out user / client is rejected before any password work
+        self.login_limiter.check(user_id, client_id)
+        if user_id in self.passwords:
+            stored = self.passwords[user_id].password
+            if self.password_hasher.verify(user_id, password, stored):
+                if self.password_hasher.needs_rehash(stored):
+                    self._rehash_password(user_id, password)
+                self.login_limiter.record_success(user_id, client_id)
+                logging.info("User '%s' authenticated successfully.", user_id)
+                return self.users[user_id].name
+        self.login_limiter.record_failure(user_id, client_id)
         raise UnauthorizedAccessError("Authentication failed: Invalid username or password.")
 
+    def _rehash_password(self, user_id: str, password: str) -> None:
+        # plaintext (or weaker) entries are upgraded on the first successful login, a failure doesn't fail the login
+        try:
+            self._store_password(user_id, self.password_hasher.hash(password))
+        except ATMError as e:
+            logging.warning("Password of user '%s' was not re-hashed: %s", user_id, e)
+
     def authenticated_user_required(func):
         def wrapper(self, *args, **kwargs):
             if not self.specific_user:
@@ -42,100 +136,484 @@ class ATM:
             return func(self, *args, **kwargs)
         return wrapper
 
+    def compacting(func):
+        # the operation's record may make the journal due for compaction - it runs here, once the operation's locks
+        # are released, and with commits held off, so the snapshot never has a half-applied or not yet durable change
+        def wrapper(self, *args, **kwargs):
+            result = func(self, *args, **kwargs)
+            compactor = self.compactor
+            if compactor is not None and compactor.compaction_due():
+                with self.commit_gate.exclusive():
+                    if compactor.compaction_due():
+                        compactor.compact()
+            return result
+        return wrapper
+
     @authenticated_user_required
-    def get_balance(self) -> Dict[str, float]:
-        return {account.account_id: account.balance for account in self.accounts_by_owner[self.specific_user]}
+    def get_balance(self) -> Dict[str, int]:
+        return self._get_balance(self.specific_user)
+
+    def _get_balance(self, user_id: str) -> Dict[str, int]:
+        return {account.account_id: account.balance_cents for account in self.accounts_by_owner[user_id]}
 
     @authenticated_user_required
-    def withdraw(self, account_id: str, amount: float) -> None:
-        if not self._can_withdraw(account_id, amount):
-            self._raise_withdraw_error(account_id, amount)
-        self.accounts[account_id].balance -= amount
+    def withdraw(self, account_id: str, amount: int) -> None:
+        self._withdraw(self.specific_user, account_id, amount)
+
+    @compacting
+    def _withdraw(self, user_id: str, account_id: str, amount: int) -> None:
+        if not self._can_withdraw(user_id, account_id, amount):
+            self._raise_withdraw_error(user_id, account_id, amount)
+        with self.account_locks.hold(account_id), self._within_limits(user_id, account_id, amount):
+            self._commit_balances("withdraw", {account_id: self.accounts[account_id].balance_cents - amount},
+                                  [(account_id, -amount, None)], dispense=amount)
+
+    @contextmanager
+    def _within_limits(self, user_id: str, account_id: str, amount: int) -> Iterator[None]:
+        # counts the operation against the limits before the commit, takes it back if the commit fails
+        if self.limits is None:
+            yield
+            return
+        reservation = self.limits.reserve(user_id, account_id, amount)
+        try:
+            yield
+        except BaseException:
+            self.limits.release(reservation, amount)
+            raise
 
-    def _can_withdraw(self, account_id: str, amount: float) -> bool:
+    @contextmanager
+    def _dispensing(self, amount: int) -> Iterator[Optional[Dict[int, int]]]:
+        # yields the notes to pay amount with, with the dispenser locked - they are planned, taken and the record
+        # queued in the journal under the lock, so cassette after-images reach the journal in the order the notes
+        # were taken. the lock is released before the journal write
+        if not amount or self.cash is None:
+            yield None
+            return
+        with self.cash.lock:
+            notes = self.cash.plan(amount)
+            if notes is None:
+                raise UndispensableAmountError("Withdrawal failed: The machine can't dispense this amount.")
+            yield notes
+
+    def _can_withdraw(self, user_id: str, account_id: str, amount: int) -> bool:
         return (
-            amount > 0 and
+            is_cents(amount) and amount > 0 and
             account_id in self.accounts and
-            self.accounts[account_id].owner_id == self.specific_user
+            self.accounts[account_id].owner_id == user_id
         )
 
-    def _raise_withdraw_error(self, account_id: str, amount: float) -> None:
-        if amount <= 0:
+    def _raise_withdraw_error(self, user_id: str, account_id: str, amount: int) -> None:
+        if not is_cents(amount):
+            raise InvalidAmountError("Withdrawal failed: Amount must be a whole number of cents.")
+        elif amount <= 0:
             raise InvalidAmountError("Withdrawal failed: Amount must be positive.")
         elif account_id not in self.accounts:
             raise AccountNotFoundError("Withdrawal failed: Account not found.")
-        elif self.accounts[account_id].owner_id != self.specific_user:
+        elif self.accounts[account_id].owner_id != user_id:
             raise UnauthorizedAccessError("Withdrawal failed: Unauthorized access.")
 
     @authenticated_user_required
-    def deposit(self, account_id: str, amount: float) -> None:
-        if not self._can_deposit(account_id, amount):
-            self._raise_deposit_error(account_id, amount)
-        self.accounts[account_id].balance += amount
+    def deposit(self, account_id: str, amount: int) -> None:
+        self._deposit(self.specific_user, account_id, amount)
+
+    @compacting
+    def _deposit(self, user_id: str, account_id: str, amount: int) -> None:
+        if not self._can_deposit(user_id, account_id, amount):
+            self._raise_deposit_error(user_id, account_id, amount)
+        with self.account_locks.hold(account_id):
+            self._commit_balances("deposit", {account_id: self.accounts[account_id].balance_cents + amount},
+                                  [(account_id, amount, None)])
 
-    def _can_deposit(self, account_id: str, amount: float) -> bool:
+    def _can_deposit(self, user_id: str, account_id: str, amount: int) -> bool:
         return (
-            amount > 0 and
+            is_cents(amount) and amount > 0 and
             account_id in self.accounts and
-            self.accounts[account_id].owner_id == self.specific_user
+            self.accounts[account_id].owner_id == user_id
         )
 
-    def _raise_deposit_error(self, account_id: str, amount: float) -> None:
-        if amount <= 0:
+    def _raise_deposit_error(self, user_id: str, account_id: str, amount: int) -> None:
+        if not is_cents(amount):
+            raise InvalidAmountError("Deposit failed: Amount must be a whole number of cents.")
+        elif amount <= 0:
             raise InvalidAmountError("Deposit failed: Amount must be positive.")
         elif account_id not in self.accounts:
             raise AccountNotFoundError("Deposit failed: Account not found.")
-        elif self.accounts[account_id].owner_id != self.specific_user:
+        elif self.accounts[account_id].owner_id != user_id:
             raise UnauthorizedAccessError("Deposit failed: Unauthorized access.")
 
     @authenticated_user_required
-    def transfer(self, from_account: str, to_account: str, amount: float) -> None:
-        if not self._can_transfer(from_account, to_account, amount):
-            self._raise_transfer_error(from_account, to_account, amount)
-        from_account_balance = self.accounts[from_account].balance
-        to_account_balance = self.accounts[to_account].balance
+    def transfer(self, from_account: str, to_account: str, amount: int) -> None:
+        self._transfer(self.specific_user, from_account, to_account, amount)
+
+    @compacting
+    def _transfer(self, user_id: str, from_account: str, to_account: str, amount: int) -> None:
+        if not self._can_transfer(user_id, from_account, to_account, amount):
+            self._raise_transfer_error(user_id, from_account, to_account, amount)
+        # both locks are taken in a fixed (sorted) order, so two opposite transfers can't deadlock
+        with self.account_locks.hold(from_account, to_account), self._within_limits(user_id, from_account, amount):
+            balances = {from_account: self.accounts[from_account].balance_cents - amount}
+            # from_account and to_account may be the same account
+            balances[to_account] = balances.get(to_account, self.accounts[to_account].balance_cents) + amount
+            self._commit_balances("transfer", balances,
+                                  [(from_account, -amount, to_account), (to_account, amount, from_account)])
+
+    def _commit_balances(self, operation: str, balances: Dict[str, int],
+                         legs: List[Tuple[str, int, Optional[str]]], dispense: int = 0) -> None:
+        # apply the new balances and journal them as one record, rollback if the journal write fails
+        # the caller holds the locks of all the accounts in balances
+        # legs - (account_id, amount, counterparty) of every change, in order, for the transaction history
+        # dispense - cents paid out in notes (a withdrawal), the cassettes are updated in the same record
+        previous_balances = {account_id: self.accounts[account_id].balance_cents for account_id in balances}
+        taken: Optional[Dict[int, int]] = None
+
+        def rollback(e: Exception) -> ATMError:
+            logging.error("%s failed: %s, rollback initiated.", operation.capitalize(), e)
+            for account_id, balance in previous_balances.items():
+                self.accounts[account_id].balance_cents = balance
+            if taken:
+                self.cash.put_back(taken)
+            return ATMError(f"{operation.capitalize()} failed due to an unexpected error.")
+
+        with self._pinned(self.accounts, balances), self.commit_gate.shared():
+            with self._dispensing(dispense) as notes:
+                try:
+                    for account_id, balance in balances.items():
+                        account = self.accounts[account_id]
+                        account.balance_cents = balance
+                        if self.track_changes:
+                            self.changed_accounts[account_id] = account
+                    record = {"op": operation, "balances": balances}
+                    if notes:
+                        record["cassettes"] = self.cash.take(notes)
+                        taken = notes
+                        if self.track_changes:
+                            self.cassettes_changed = True
+                    pending = self._submit_to_journal(record)
+                except Exception as e:
+                    raise rollback(e)
+            try:
+                self._wait_for_journal(pending)
+            except Exception as e:
+                if not taken:
+                    raise rollback(e)
+                with self.cash.lock:
+                    error = rollback(e)
+                    self._journal_returned_notes(taken)
+                raise error
+            for account_id, balance in balances.items():
+                self.indexes.balance_changed(account_id, previous_balances[account_id], balance)
+            self._record_history(operation, previous_balances, legs)
+
+    @contextmanager
+    def _pinned(self, mapping: Mapping, keys: Iterable[str]) -> Iterator[None]:
+        # objects are changed in place before their record is durable, a bounded cache in front of the store
+        # (CachedMapping) keeps them until then - evicted, they would be reloaded without the change
+        pin = getattr(mapping, "pin", None)
+        if pin is None:
+            yield
+            return
+        keys = list(keys)
+        pin(keys)
+        try:
+            yield
+        finally:
+            mapping.unpin(keys)
+
+    def _record_history(self, operation: str, previous_balances: Dict[str, int],
+                        legs: List[Tuple[str, int, Optional[str]]]) -> None:
+        # the balances are already committed, a failed history write is logged and doesn't fail the operation
+        if self.history is None:
+            return
+        running = dict(previous_balances)
+        entries = []
+        for account_id, amount, counterparty in legs:
+            running[account_id] += amount
+            entries.append((account_id, amount, running[account_id], counterparty))
+        try:
+            self.history.record(operation, entries)
+        except Exception as e:
+            logging.error("%s was not recorded in the transaction history: %s", operation.capitalize(), e)
+
+    @authenticated_user_required
+    def get_statement(self, account_id: str, since: int = 0, limit: int = 50) -> StatementPage:
+        return self._get_statement(self.specific_user, account_id, since, limit)
+
+    def _get_statement(self, user_id: str, account_id: str, since: int = 0, limit: int = 50) -> StatementPage:
+        if self.history is None:
+            raise ATMError("Statement failed: Transaction history is not enabled.")
+        if account_id not in self.accounts:
+            raise AccountNotFoundError("Statement failed: Account not found.")
+        if self.accounts[account_id].owner_id != user_id:
+            raise UnauthorizedAccessError("Statement failed: Unauthorized access.")
+        return self.history.get_statement(account_id, since, limit)
+
+    def _append_to_journal(self, record: Dict) -> None:
+        if self.journal is not None:
+            self.journal.append(record)
+
+    def _journal_returned_notes(self, notes: Dict[int, int]) -> None:
+        # the notes of a failed withdrawal are back in the cassettes, but a withdrawal queued after it may already
+        # have journaled them as paid out - the restored counts are journaled after it. called with the cash lock
         try:
-            self.accounts[from_account].balance -= amount
-            self.accounts[to_account].balance += amount
+            self._append_to_journal({"op": "cassettes",
+                                     "cassettes": {str(note): self.cash.counts[note] for note in notes}})
         except Exception as e:
-            logging.error(f"Transfer failed: {e}, rollback initiated.")
-            self.accounts[from_account].balance = from_account_balance
-            self.accounts[to_account].balance = to_account_balance
-            raise ATMError("Transfer failed due to an unexpected error.")
+            logging.error("Returned notes were not journaled: %s", e)
+
+    def _submit_to_journal(self, record: Dict) -> Optional[object]:
+        # a journal that queues (GroupCommitter) takes the record now and makes it durable in _wait_for_journal,
+        # so the caller can release its locks in between; any other journal is written here
+        submit = getattr(self.journal, "submit", None)
+        if submit is None:
+            self._append_to_journal(record)
+            return None
+        return submit(record)
+
+    def _wait_for_journal(self, pending: Optional[object]) -> None:
+        if pending is not None:
+            self.journal.wait(pending)
 
-    def _can_transfer(self, from_account: str, to_account: str, amount: float) -> bool:
+    def collect_changes(self) -> Dict:
+        # after-images of everything touched since the last call, in the journal record format (see save_changes)
+        with self.commit_gate.exclusive():
+            accounts, self.changed_accounts = self.changed_accounts, {}
+            passwords, self.changed_passwords = self.changed_passwords, {}
+            entries, self.changed_account_entries = self.changed_account_entries, {}
+            users, self.changed_users = self.changed_users, {}
+            cassettes_changed, self.cassettes_changed = self.cassettes_changed, False
+            changes = {
+                "balances": {account_id: account.balance_cents for account_id, account in accounts.items()},
+                "passwords": {user_id: password.password for user_id, password in passwords.items()},
+            }
+            if entries:
+                changes["accounts"] = {account_id: account.to_dict() for account_id, account in entries.items()}
+            if users:
+                changes["users"] = {user_id: user.to_dict() for user_id, user in users.items()}
+            if cassettes_changed:
+                changes["cassettes"] = self.cash.inventory()
+            return changes
+
+    def _owner_of(self, account_id: str) -> Optional[str]:
+        account = self.accounts.get(account_id)
+        return account.owner_id if account is not None else None
+
+    def _can_transfer(self, user_id: str, from_account: str, to_account: str, amount: int) -> bool:
         return (
-            amount > 0 and
+            is_cents(amount) and amount > 0 and
             from_account in self.accounts and
             to_account in self.accounts and
-            self.accounts[from_account].owner_id == self.specific_user
+            self.accounts[from_account].owner_id == user_id
         )
 
-    def _raise_transfer_error(self, from_account: str, to_account: str, amount: float) -> None:
-        if amount <= 0:
+    def _raise_transfer_error(self, user_id: str, from_account: str, to_account: str, amount: int) -> None:
+        if not is_cents(amount):
+            raise InvalidAmountError("Transfer failed: Amount must be a whole number of cents.")
+        elif amount <= 0:
             raise InvalidAmountError("Transfer failed: Amount must be positive.")
         elif from_account not in self.accounts:
             raise AccountNotFoundError("Transfer failed: From account not found.")
         elif to_account not in self.accounts:
             raise AccountNotFoundError("Transfer failed: To account not found.")
-        elif self.accounts[from_account].owner_id != self.specific_user:
+        elif self.accounts[from_account].owner_id != user_id:
             raise UnauthorizedAccessError("Transfer failed: Unauthorized access.")
 
     @authenticated_user_required
     def change_password(self, new_password: str) -> None:
+        self._change_password(self.specific_user, new_password)
+
+    def _change_password(self, user_id: str, new_password: str) -> None:
         if not self._is_valid_password(new_password):
             raise Exception("Password change failed: Invalid password.")
-        self.passwords[self.specific_user].password = new_password
+        # the KDF runs before any lock is taken
+        self._store_password(user_id, self.password_hasher.hash(new_password))
         logging.info("Password changed successfully.")
 
+    @compacting
+    def _store_password(self, user_id: str, hashed: str) -> None:
+        with self.password_locks.hold(user_id), self._pinned(self.passwords, (user_id,)):
+            password = self.passwords[user_id]
+            previous_password = password.password
+            with self.commit_gate.shared():
+                try:
+                    password.password = hashed
+                    if self.track_changes:
+                        self.changed_passwords[user_id] = password
+                    self._append_to_journal({"op": "change_password", "passwords": {user_id: hashed}})
+                except Exception as e:
+                    logging.error("Password change failed: %s, rollback initiated.", e)
+                    password.password = previous_password
+                    raise ATMError("Password change failed due to an unexpected error.")
+
     def _is_valid_password(self, password: str) -> bool:
         return bool(password)
 
-    def get_users(self) -> Dict[str, User]:
+    @compacting
+    def apply_batch(self, operations: Iterable[Dict], atomic: bool = True) -> BatchResult:
+        # back-office posting (payroll / settlement files): no session and no ownership checks, amounts in cents,
+        # the batch is validated in one pass and committed as a single journal record.
+        # atomic - any invalid operation rejects the whole batch (BatchError), otherwise only the valid ones are applied
+        failures: Dict[int, str] = {}
+        postings: List[List[Tuple[str, int, Optional[str]]]] = []
+        for index, operation in enumerate(operations):
+            try:
+                postings.append(self._batch_postings(operation))
+            except (ATMError, KeyError, TypeError, ValueError) as e:
+                failures[index] = str(e)
+        if atomic and failures:
+            raise BatchError(failures)
+
+        account_ids = {account_id for legs in postings for account_id, _, _ in legs}
+        with self.account_locks.hold(*account_ids):
+            balances: Dict[str, int] = {}
+            for legs in postings:
+                for account_id, delta, _ in legs:
+                    balances[account_id] = balances.get(account_id, self.accounts[account_id].balance_cents) + delta
+            if balances:
+                self._commit_balances("batch", balances, [leg for legs in postings for leg in legs])
+        return BatchResult(applied=len(postings), failures=failures)
+
+    def apply_batch_file(self, path: str, chunk_size: int = 10000) -> BatchResult:
+        # streaming variant - the file is read and committed chunk by chunk, failures are reported per operation
+        result = BatchResult()
+        offset = 0
+        for chunk in chunked(read_operations(path), chunk_size):
+            result.merge(self.apply_batch(chunk, atomic=False), offset)
+            offset += len(chunk)
+        return result
+
+    def _batch_postings(self, operation: Dict) -> List[Tuple[str, int, Optional[str]]]:
+        if isinstance(operation, Exception):
+            raise operation
+        if not isinstance(operation, dict):
+            raise ValueError("Batch operation failed: Operation must be a JSON object.")
+        op = operation.get("op")
+        amount = operation["amount"]
+        if not is_cents(amount):
+            raise InvalidAmountError("Batch operation failed: Amount must be a whole number of cents.")
+        if amount <= 0:
+            raise InvalidAmountError("Batch operation failed: Amount must be positive.")
+        if op == "deposit":
+            legs = [(str(operation["account_id"]), amount, None)]
+        elif op == "withdraw":
+            legs = [(str(operation["account_id"]), -amount, None)]
+        elif op == "transfer":
+            from_account, to_account = str(operation["from_account"]), str(operation["to_account"])
+            legs = [(from_account, -amount, to_account), (to_account, amount, from_account)]
+        else:
+            raise ValueError(f"Unknown batch operation '{op}'.")
+        for account_id, _, _ in legs:
+            if account_id not in self.accounts:
+                raise AccountNotFoundError(f"Batch operation failed: Account '{account_id}' not found.")
+        return legs
+
+    # back-office maintenance: no session and no ownership checks, every change is journaled as a whole entry
+
+    @compacting
+    def open_account(self, owner_id: str, account_id: str, balance_cents: int = 0) -> Account:
+        if owner_id not in self.users:
+            raise UnauthorizedAccessError("Open account failed: Owner not found.")
+        if not is_cents(balance_cents) or balance_cents < 0:
+            raise InvalidAmountError("Open account failed: Balance must be a non-negative number of cents.")
+        with self.account_locks.hold(account_id):
+            if account_id in self.accounts:
+                raise ATMError("Open account failed: Account already exists.")
+            account = Account(owner_id=owner_id, balance_cents=balance_cents, account_id=account_id)
+            with self.commit_gate.shared():
+                # journaled first, there is nothing to roll back if the write fails
+                try:
+                    self._append_to_journal({"op": "open_account", "accounts": {account_id: account.to_dict()}})
+                except Exception as e:
+                    logging.error("Open account failed: %s.", e)
+                    raise ATMError("Open account failed due to an unexpected error.")
+                self.accounts[account_id] = account
+                # the store's own entry, a columnar store keeps no Account objects
+                account = self.accounts[account_id]
+                if self.track_changes:
+                    self.changed_account_entries[account_id] = account
+                self.indexes.account_added(account)
+        logging.info("Account '%s' opened for user '%s'.", account_id, owner_id)
+        return account
+
+    @compacting
+    def reassign_account(self, account_id: str, owner_id: str) -> None:
+        if account_id not in self.accounts:
+            raise AccountNotFoundError("Reassign failed: Account not found.")
+        if owner_id not in self.users:
+            raise UnauthorizedAccessError("Reassign failed: Owner not found.")
+        with self.account_locks.hold(account_id), self._pinned(self.accounts, (account_id,)):
+            account = self.accounts[account_id]
+            previous_owner = account.owner_id
+            if previous_owner == owner_id:
+                return
+            with self.commit_gate.shared():
+                try:
+                    account.owner_id = owner_id
+                    if self.track_changes:
+                        self.changed_account_entries[account_id] = account
+                    self._append_to_journal({"op": "reassign_account", "accounts": {account_id: account.to_dict()}})
+                except Exception as e:
+                    logging.error("Reassign failed: %s, rollback initiated.", e)
+                    account.owner_id = previous_owner
+                    raise ATMError("Reassign failed due to an unexpected error.")
+                self.indexes.owner_changed(account, previous_owner)
+
+    @compacting
+    def update_email(self, user_id: str, email: str) -> None:
+        if user_id not in self.users:
+            raise UnauthorizedAccessError("Update email failed: User not found.")
+        # reserved until the index has the new email, the reservation is what makes the check atomic
+        if email and not self.indexes.reserve_email(user_id, email):
+            raise ATMError("Update email failed: Email is already in use.")
+        try:
+            with self.user_locks.hold(user_id), self._pinned(self.users, (user_id,)):
+                user = self.users[user_id]
+                previous_email = user.email
+                with self.commit_gate.shared():
+                    try:
+                        user.email = email
+                        if self.track_changes:
+                            self.changed_users[user_id] = user
+                        self._append_to_journal({"op": "update_email", "users": {user_id: user.to_dict()}})
+                    except Exception as e:
+                        logging.error("Update email failed: %s, rollback initiated.", e)
+                        user.email = previous_email
+                        raise ATMError("Update email failed due to an unexpected error.")
+                    self.indexes.email_changed(user_id, previous_email, email)
+        finally:
+            if email:
+                self.indexes.release_email(email)
+
+    @compacting
+    def load_cassettes(self, counts: Mapping[int, int]) -> None:
+        # a refill: sets the number of notes of the given denominations (cents)
+        if self.cash is None:
+            raise ATMError("Load cassettes failed: The machine has no cash dispenser.")
+        for note, count in counts.items():
+            if not is_cents(note) or note <= 0 or not is_cents(count) or count < 0:
+                raise InvalidAmountError("Load cassettes failed: Invalid denomination or note count.")
+        with self.cash.lock:
+            previous = {note: self.cash.counts.get(note) for note in counts}
+            with self.commit_gate.shared():
+                try:
+                    self.cash.counts.update(counts)
+                    if self.track_changes:
+                        self.cassettes_changed = True
+                    self._append_to_journal({"op": "load_cassettes",
+                                             "cassettes": {str(note): count for note, count in counts.items()}})
+                except Exception as e:
+                    logging.error("Load cassettes failed: %s, rollback initiated.", e)
+                    for note, count in previous.items():
+                        if count is None:
+                            del self.cash.counts[note]
+                        else:
+                            self.cash.counts[note] = count
+                    raise ATMError("Load cassettes failed due to an unexpected error.")
+
+    def get_users(self) -> Mapping[str, User]:
         return self.users
 
-    def get_passwords(self) -> Dict[str, Password]:
+    def get_passwords(self) -> Mapping[str, Password]:
         return self.passwords
 
-    def get_accounts(self) -> Dict[str, Account]:
+    def get_accounts(self) -> MutableMapping[str, Account]:
         return self.accounts
@@ -1,5 +1,17 @@
+import json
+import logging
+import sys
 from atm import ATM, ATMError, UnauthorizedAccessError
+from typing import Iterator, List, Optional, TextIO
+
 from atm_handler.atm_handler import AtmHandler
+from atm_protocol import ATMProtocol, ConnectionState, parse_request
+from flusher import BackgroundFlusher
+from money import format_cents, to_cents
+from cash_dispenser import CashDispenser
+from limits import WithdrawalLimits
+from metrics import ATM_OPERATIONS, MetricsRegistry
+from transaction_history import TransactionHistory
 
 
 class IOInterface:
@@ -9,17 +21,59 @@ class IOInterface:
     def print(self, message: str) -> None:
         print(message)
 
+    def lines(self) -> Iterator[str]:
+        return iter(sys.stdin)
+
+    def flush(self) -> None:
+        sys.stdout.flush()
+
+
+# Non-interactive IO: answers / commands come from a stream (a file, stdin), the output is collected and written
+# buffer_lines messages at a time instead of one write per message
+class BufferedIOInterface(IOInterface):
+    def __init__(self, source: TextIO = None, sink: TextIO = None, buffer_lines: int = 1024) -> None:
+        self.source = source if source is not None else sys.stdin
+        self.sink = sink if sink is not None else sys.stdout
+        self.buffer_lines = buffer_lines
+        self.pending: List[str] = []
+
+    def input(self, prompt: str) -> str:
+        line = self.source.readline()
+        if not line:
+            raise EOFError("Input exhausted.")
+        return line.rstrip("\r\n")
+
+    def print(self, message: str) -> None:
+        self.pending.append(message)
+        if len(self.pending) >= self.buffer_lines:
+            self.flush()
+
+    def lines(self) -> Iterator[str]:
+        return iter(self.source)
+
+    def flush(self) -> None:
+        if self.pending:
+            self.pending.append("")
+            self.sink.write("\n".join(self.pending))
+            self.pending.clear()
+        self.sink.flush()
+
 
 class ATMCLI:
-    def __init__(self, atm_handler: AtmHandler = None) -> None:
+    def __init__(self, atm_handler: AtmHandler = None, flush_interval: Optional[float] = None,
+                 flush_threshold: int = 100, history: Optional[TransactionHistory] = None,
+                 limits: Optional[WithdrawalLimits] = None, cash: Optional[CashDispenser] = None,
+                 metrics: Optional[MetricsRegistry] = None) -> None:
         # load data from file
         self.atm_handler = atm_handler
 
         self.io_interface = IOInterface()
         # init atm instance with data from file
-        self.atm = ATM(self.atm_handler.get_users(),
-                    self.atm_handler.get_passwords(),
-                    self.atm_handler.get_accounts())
+        self.atm = ATM.from_handler(self.atm_handler, history=history, limits=limits, cash=cash)
+        if metrics is not None:
+            metrics.instrument(self.atm, ATM_OPERATIONS, "atm_operation")
+        # snapshot handlers are persisted in the background, exit is only the final flush
+        self.flusher = BackgroundFlusher.attach(self.atm, self.atm_handler, flush_interval, flush_threshold)
 
         # Scalable menu actions
         self.menu_actions = {
@@ -28,8 +82,12 @@ class ATMCLI:
             "3": ("Deposit cash", self.handle_deposit),
             "4": ("Change password", self.handle_change_password),
             "5": ("Transfer to another account", self.handle_transfer),
-            "6": ("Logout", None),
+            "6": ("Account statement", self.handle_statement),
+            "7": ("Logout", None),
         }
+        # printed on every loop, built once
+        self.menu_text = "\n--- ATM Menu ---\n" + "\n".join(f"{key}. {desc}"
+                                                            for key, (desc, _) in self.menu_actions.items())
 
     def run(self):
         while True:
@@ -48,20 +106,50 @@ class ATMCLI:
                 self.io_interface.print(f"An unexpected error occurred: {e}")
 
         try:
-            self.atm_handler.save_data(
-                self.atm.get_users(),
-                self.atm.get_passwords(),
-                self.atm.get_accounts(),
-            )
-            self.io_interface.print("Customer data saved. Goodbye!")
+            if self.save_data():
+                self.io_interface.print("Customer data saved. Goodbye!")
+            else:
+                self.io_interface.print("Failed to save customer data.")
         except Exception as e:
             self.io_interface.print(f"Failed to save customer data: {e}")
+        self.io_interface.flush()
+
+    def run_script(self) -> None:
+        # headless mode: every input line is a protocol request (see atm_protocol.py, "login" is "authenticate"),
+        # every response is written as one JSON line. the save outcome goes to the log, the output stays JSONL
+        protocol = ATMProtocol(self.atm)
+        state = ConnectionState(client_id="script")
+        # json.dumps with options builds a new encoder per call
+        encode = json.JSONEncoder(ensure_ascii=False).encode
+        for line in self.io_interface.lines():
+            if not line.strip():
+                continue
+            try:
+                request = parse_request(line)
+            except ValueError as e:
+                response = {"ok": False, "error": "BadRequest", "message": str(e)}
+            else:
+                response = protocol.handle(state, request)
+            self.io_interface.print(encode(response))
+        try:
+            if not self.save_data():
+                logging.error("Failed to save customer data.")
+        except Exception as e:
+            logging.error("Failed to save customer data: %s", e)
+        self.io_interface.flush()
+
+    def save_data(self) -> bool:
+        if self.flusher is not None:
+            return self.flusher.stop()
+        return self.atm_handler.save_data(
+            self.atm.get_users(),
+            self.atm.get_passwords(),
+            self.atm.get_accounts(),
+        )
 
     def account_menu(self):
         while True:
-            self.io_interface.print("\n--- ATM Menu ---")
-            for key, (desc, _) in self.menu_actions.items():
-                self.io_interface.print(f"{key}. {desc}")
+            self.io_interface.print(self.menu_text)
 
             choice = self.io_interface.input("Choose an option: ")
             action = self.menu_actions.get(choice)
@@ -86,26 +174,44 @@ class ATMCLI:
 
     def handle_balance(self):
         try:
-            balance = self.atm.get_balance()
+            balance = {account_id: format_cents(cents) for account_id, cents in self.atm.get_balance().items()}
             self.io_interface.print(f"Your balance is: {balance}")
         except Exception as e:
             self.io_interface.print(f"Failed to retrieve balance: {e}")
 
+    def handle_statement(self):
+        acc_num = self.io_interface.input("Account number: ")
+        since = 0
+        try:
+            while True:
+                page = self.atm.get_statement(acc_num, since=since, limit=10)
+                for t in page.transactions:
+                    counterparty = f" ({t.counterparty})" if t.counterparty else ""
+                    self.io_interface.print(f"#{t.seq} {t.operation}{counterparty}: {format_cents(t.amount_cents)}, "
+                                            f"balance {format_cents(t.balance_cents)}")
+                if page.next_since is None:
+                    break
+                if self.io_interface.input("More? (y/n): ").lower() != "y":
+                    break
+                since = page.next_since
+        except ATMError as e:
+            self.io_interface.print(f"Statement failed: {e}")
+
     def handle_withdraw(self):
         acc_num = self.io_interface.input("Account number: ")
         try:
-            amount = float(self.io_interface.input("Amount to withdraw: "))
+            amount = to_cents(self.io_interface.input("Amount to withdraw: "))
             self.atm.withdraw(account_id=acc_num, amount=amount)
-            self.io_interface.print(f"Withdrew {amount} from account {acc_num}.")
+            self.io_interface.print(f"Withdrew {format_cents(amount)} from account {acc_num}.")
         except ATMError as e:
             self.io_interface.print(f"Withdrawal failed: {e}")
 
     def handle_deposit(self):
         acc_num = self.io_interface.input("Account number: ")
         try:
-            amount = float(self.io_interface.input("Amount to deposit: "))
+            amount = to_cents(self.io_interface.input("Amount to deposit: "))
             self.atm.deposit(account_id=acc_num, amount=amount)
-            self.io_interface.print(f"Deposited {amount} to account {acc_num}.")
+            self.io_interface.print(f"Deposited {format_cents(amount)} to account {acc_num}.")
         except ATMError as e:
             self.io_interface.print(f"Deposit failed: {e}")
 
@@ -113,8 +219,8 @@ class ATMCLI:
         from_acc = self.io_interface.input("From account number: ")
         to_acc = self.io_interface.input("To account number: ")
         try:
-            amount = float(self.io_interface.input("Amount to transfer: "))
+            amount = to_cents(self.io_interface.input("Amount to transfer: "))
             self.atm.transfer(from_acc, to_acc, amount)
-            self.io_interface.print(f"Transferred {amount} from account {from_acc} to account {to_acc}.")
+            self.io_interface.print(f"Transferred {format_cents(amount)} from account {from_acc} to account {to_acc}.")
         except ATMError as e:
             self.io_interface.print(f"Transfer failed: {e}")
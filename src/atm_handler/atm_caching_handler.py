@@ -0,0 +1,124 @@
+import logging
+from typing import Dict, List, Mapping, Optional
+
+from atm_handler.atm_handler import AtmHandler
+from config import NEGATIVE_CACHE_ENTRIES, RECORD_CACHE_MAX_BYTES, RECORD_CACHE_MAX_ENTRIES
+from lazy_mapping import CachedMapping, LazyMapping, LazyOwnerIndex
+
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# journal record sections that can create an id (open_account, a new user), balances and passwords only ever change
+# entries that exist, and those are updated in place
+CREATING_SECTIONS = ("users", "accounts")
+
+
+# ATM Caching Handler - bounded read-through cache in front of another handler (typically sqlite), for the hot
+# lookups of get_balance / withdraw / transfer. users, passwords and accounts are CachedMappings (lazy_mapping.py):
+# LRU by entries and / or bytes, unknown ids are remembered so a mistyped account fails without a query.
+# Writes go through: ATM mutates the cached objects and journals them to the backend as before, an object is pinned
+# (never evicted) from its change until the record is durable, so an evicted entry is never newer than the store.
+# a record that creates ids drops their negative entries.
+class AtmCachingHandler(AtmHandler):
+    def __init__(self, backend: AtmHandler, max_entries: Optional[int] = RECORD_CACHE_MAX_ENTRIES,
+                 max_bytes: Optional[int] = RECORD_CACHE_MAX_BYTES,
+                 negative_entries: int = NEGATIVE_CACHE_ENTRIES) -> None:
+        super().__init__()
+        self.backend = backend
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.negative_entries = negative_entries
+        self.tables: Dict[str, CachedMapping] = {}
+
+    def _table(self, name: str, source: Mapping) -> CachedMapping:
+        table = self.tables.get(name)
+        if table is None or table.source is not source:
+            table = self.tables[name] = CachedMapping(source, self.max_entries, self.max_bytes,
+                                                      self.negative_entries)
+        return table
+
+    def load_data(self) -> Optional[Dict]:
+        # a reload replaces the backend's mappings, the caches are rebuilt over the new ones
+        self.tables.clear()
+        return self.backend.load_data()
+
+    def get_users(self) -> CachedMapping:
+        return self._table("users", self.backend.get_users())
+
+    def get_passwords(self) -> CachedMapping:
+        return self._table("passwords", self.backend.get_passwords())
+
+    def get_accounts(self) -> CachedMapping:
+        return self._table("accounts", self.backend.get_accounts())
+
+    def get_accounts_by_owner(self) -> Optional[Mapping]:
+        # the backend's owner lookup, resolved through the cache (its own accounts mapping would bypass it)
+        index = self.backend.get_accounts_by_owner()
+        if not isinstance(index, LazyOwnerIndex):
+            return index
+        return LazyOwnerIndex(index.lookup, self.get_accounts(), owners=index.owners)
+
+    def get_inventory(self) -> Optional[Dict[int, int]]:
+        return self.backend.get_inventory()
+
+    def get_journal(self) -> Optional["AtmCachingHandler"]:
+        return self if self.backend.get_journal() is not None else None
+
+    def append(self, record: Dict) -> None:
+        self.backend.get_journal().append(record)
+        self._written(record)
+
+    def append_many(self, records: List[Dict]) -> None:
+        journal = self.backend.get_journal()
+        if hasattr(journal, "append_many"):
+            journal.append_many(records)
+        else:
+            for record in records:
+                journal.append(record)
+        for record in records:
+            self._written(record)
+
+    def save_changes(self, delta: Dict) -> bool:
+        saved = self.backend.save_changes(delta)
+        self._written(delta)
+        return saved
+
+    def save_data(self, users: Mapping, passwords: Mapping, accounts: Mapping) -> bool:
+        return self.backend.save_data(self._saved(users), self._saved(passwords), self._saved(accounts))
+
+    @staticmethod
+    def _saved(mapping: Mapping) -> Mapping:
+        # an in-memory backend gets its own mapping back (it holds the very objects ATM changed), a lazy one only
+        # the rows still cached - a changed row that was evicted already reached the store through the journal
+        if not isinstance(mapping, CachedMapping):
+            return mapping
+        return mapping.cached_items() if isinstance(mapping.source, LazyMapping) else mapping.source
+
+    def _written(self, record: Dict) -> None:
+        for name in CREATING_SECTIONS:
+            table = self.tables.get(name)
+            if table is not None:
+                for key in record.get(name) or ():
+                    table.forget_missing(key)
+
+    def compaction_due(self) -> bool:
+        return self.backend.compaction_due()
+
+    def compact(self) -> bool:
+        return self.backend.compact()
+
+    def invalidate(self) -> None:
+        # the store was changed by someone else, every table starts cold
+        for table in self.tables.values():
+            table.invalidate()
+
+    def cache_stats(self) -> Dict[str, Dict[str, float]]:
+        return {name: {"cached": table.cached, "bytes": table.bytes, "hits": table.stats.hits,
+                       "misses": table.stats.misses, "negative_hits": table.stats.negative_hits,
+                       "evictions": table.stats.evictions, "hit_ratio": table.stats.hit_ratio}
+                for name, table in self.tables.items()}
+
+    def close(self) -> None:
+        if hasattr(self.backend, "close"):
+            self.backend.close()
@@ -2,6 +2,7 @@ import logging
 from typing import Dict, Optional
 
 from atm_handler.atm_handler import AtmHandler
+from dao import Account, Password, User
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -13,70 +14,88 @@ class AtmEphemeralHandler(AtmHandler):
     def __init__(self) -> None:
         super().__init__()
         self.data: Optional[Dict] = None
-        self.users: Optional[Dict] = None
-        self.passwords: Optional[Dict] = None
-        self.accounts: Optional[Dict] = None
+        self.users: Optional[Dict[str, User]] = None
+        self.passwords: Optional[Dict[str, Password]] = None
+        self.accounts: Optional[Dict[str, Account]] = None
+        self.inventory: Dict[int, int] = {}
 
     def load_data(self) -> Optional[Dict]:
         self.data = {
             "users": {
                 "1": {
+                    "user_id": "1",
                     "name": "John Doe",
                     "email": ""
                 },
                 "2": {
+                    "user_id": "2",
                     "name": "Jane Smith",
                     "email": ""
                 }
             },
             "passwords": {
                 "1": {
+                    "user_id": "1",
                     "password": "111"
                 },
                 "2": {
+                    "user_id": "2",
                     "password": "qwerty"
                 }
             },
             "accounts": {
                 "1": {
                     "owner_id": "1",
-                    "balance": 1000,
+                    "balance_cents": 100000,
                     "account_id": "1"
                 },
                 "2": {
                     "owner_id": "1",
-                    "balance": 2000,
+                    "balance_cents": 200000,
                     "account_id": "2"
                 },
                 "3": {
                     "owner_id": "2",
-                    "balance": 1500,
+                    "balance_cents": 150000,
                     "account_id": "3"
                 },
                 "4": {
                     "owner_id": "2",
-                    "balance": 2500,
+                    "balance_cents": 250000,
                     "account_id": "4"
                 }
             }
         }
         return self.data
 
-    def get_users(self) -> Optional[Dict]:
-        if self.data is None:
-            self.load_data()
-        return self.data.get('users')
+    def get_users(self) -> Dict[str, User]:
+        if self.users is None:
+            self.users = {uid: User.from_dict(info) for uid, info in self._section('users').items()}
+        return self.users
 
-    def get_passwords(self) -> Optional[Dict]:
-        if self.data is None:
-            self.load_data()
-        return self.data.get('passwords')
+    def get_passwords(self) -> Dict[str, Password]:
+        if self.passwords is None:
+            self.passwords = {uid: Password.from_dict(info) for uid, info in self._section('passwords').items()}
+        return self.passwords
 
-    def get_accounts(self) -> Optional[Dict]:
+    def get_accounts(self) -> Dict[str, Account]:
+        if self.accounts is None:
+            self.accounts = {aid: Account.from_dict(info) for aid, info in self._section('accounts').items()}
+        return self.accounts
+
+    def get_inventory(self) -> Dict[int, int]:
+        # kept for the life of the process only
+        return self.inventory
+
+    def _section(self, name: str) -> Dict:
         if self.data is None:
             self.load_data()
-        return self.data.get('accounts')
+        return self.data.get(name, {})
 
     def save_data(self, users: Optional[Dict], passwords: Optional[Dict], accounts: Optional[Dict]) -> bool:
         # do nothing
         return True
+
+    def save_changes(self, delta: Dict) -> bool:
+        # nothing to persist, the changes already live in the returned objects
+        return True
@@ -1,9 +1,16 @@
 import json
 import logging
-from typing import Dict, Optional
+import os
+import threading
+from typing import Dict, List, Mapping, MutableMapping, Optional
 
 from atm_handler.atm_handler import AtmHandler
-from dao import Account, Password, User
+from account_store import ColumnarAccountStore
+from atm_handler.atomic_file import atomic_write
+from atm_handler.json_stream import iter_sections, write_sections
+from dao import Account, Password, User, balance_cents_of
+from exceptions import DataFileCorruptedError, InvalidAmountError
+from lazy_mapping import LazyOwnerIndex
 
 
 # Configure logging
@@ -12,62 +19,215 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 
 # ATM File Handler to manage data storage and retrieval
 # This class handles the loading and saving of ATM data to a JSON file.
+# Partial updates (save_changes) are appended to a sidecar delta file, one record of after-images
+# (new balances / passwords) per line, and replayed on top of the snapshot on load. Rewriting the snapshot
+# (save_data, or every `compact_every` records) empties the delta file.
 class AtmFileHandler(AtmHandler):
-    def __init__(self, data_file: str = 'data.json') -> None:
+    def __init__(self, data_file: str = 'data.json', columnar: bool = False, delta_file: Optional[str] = None,
+                 compact_every: int = 1000) -> None:
         self.data_file: str = data_file
+        # columnar - keep accounts in a ColumnarAccountStore (parallel arrays) instead of an Account per entry
+        self.columnar: bool = columnar
+        self.delta_file: str = delta_file or f"{data_file}.delta"
+        self.compact_every: int = compact_every
+        self.records_since_compaction: int = 0
+        self._delta_fd: Optional[int] = None
+        # records and snapshot rewrites come from several threads, they are serialized here
+        self._lock = threading.RLock()
         self.data: Optional[Dict] = None
         self.users: Optional[Dict[str, User]] = None
         super().__init__()
         self.passwords: Optional[Dict[str, Password]] = None
-        self.accounts: Optional[Dict[str, Account]] = None
+        self.accounts: Optional[MutableMapping[str, Account]] = None
+        self.inventory: Dict[int, int] = {}
 
     def load_data(self) -> Optional[Dict]:
+        # entries are streamed straight into dao objects, the raw JSON is never held as a whole
+        self.users, self.passwords, self.accounts = {}, {}, self._new_accounts()
+        self.inventory = {}
         try:
             with open(self.data_file, 'r', encoding='utf-8') as f:
-                self.data = json.load(f)
+                for section, key, info in iter_sections(f):
+                    if section == "users":
+                        self.users[key] = User.from_dict(info)
+                    elif section == "passwords":
+                        self.passwords[key] = Password.from_dict(info)
+                    elif section == "accounts":
+                        self._add_account(key, info)
+                    elif section == "cassettes":
+                        self.inventory[int(key)] = int(info)
         except FileNotFoundError:
-            logging.error(f"File '{self.data_file}' not found.")
-            self.data = {}
-        except json.JSONDecodeError:
-            logging.error(f"Failed to decode JSON from file '{self.data_file}'.")
-            self.data = {}
-        except Exception as e:
-            logging.error(f"An unexpected error occurred while loading data: {e}")
-            self.data = {}
+            logging.error("File '%s' not found.", self.data_file)
+            self.users, self.passwords, self.accounts = {}, {}, self._new_accounts()
+        except json.JSONDecodeError as e:
+            # never fall back to empty data here, the next save would wipe every balance
+            logging.error("Failed to decode JSON from file '%s'.", self.data_file)
+            raise DataFileCorruptedError(f"Data file '{self.data_file}' is corrupted: {e}") from e
+        except (KeyError, TypeError, ValueError, InvalidAmountError) as e:
+            logging.error("Malformed entry in file '%s': %s", self.data_file, e)
+            raise DataFileCorruptedError(f"Data file '{self.data_file}' has a malformed entry: {e}") from e
+        self.data = {"users": self.users, "passwords": self.passwords, "accounts": self.accounts}
+        self.records_since_compaction = self._replay_deltas()
         return self.data
 
     def get_users(self) -> Dict[str, User]:
-        # Deserialize
         if self.data is None:
             self.load_data()
-        users = {uid: User.from_dict(info) for uid, info in self.data["users"].items()}
-        return users
+        return self.users
 
     def get_passwords(self) -> Dict[str, Password]:
         if self.data is None:
             self.load_data()
-        passwords = {uid: Password.from_dict(info) for uid, info in self.data["passwords"].items()}
-        return passwords
+        return self.passwords
+
+    def get_accounts(self) -> MutableMapping[str, Account]:
+        if self.data is None:
+            self.load_data()
+        return self.accounts
 
-    def get_accounts(self) -> Dict[str, Account]:
+    def get_inventory(self) -> Optional[Dict[int, int]]:
         if self.data is None:
             self.load_data()
-        accounts = {uid: Account.from_dict(info) for uid, info in self.data["accounts"].items()}
-        return accounts
+        return self.inventory
+
+    def get_accounts_by_owner(self) -> Optional[LazyOwnerIndex]:
+        if self.columnar:
+            return self.get_accounts().accounts_by_owner()
+        return None
+
+    def _new_accounts(self) -> MutableMapping[str, Account]:
+        return ColumnarAccountStore() if self.columnar else {}
+
+    def _add_account(self, account_id: str, info: Dict) -> None:
+        if self.columnar:
+            self.accounts.add(account_id, info["owner_id"], balance_cents_of(info))
+        else:
+            self.accounts[account_id] = Account.from_dict(info)
 
-    def save_data(self, users: Dict[str, User], passwords: Dict[str, Password], accounts: Dict[str, Account]) -> bool:
+    def save_data(self, users: Mapping[str, User], passwords: Mapping[str, Password],
+                  accounts: Mapping[str, Account]) -> bool:
+        # entries are serialized one at a time, no second in-memory copy of the dataset,
+        # the file is replaced atomically so a crash mid-write leaves the previous snapshot intact
         try:
-            with open(self.data_file, 'w', encoding='utf-8') as f:
-                json_data = {
-                           "users": {uid: user.to_dict() for uid, user in users.items()},
-                            "passwords": {uid: pw.to_dict() for uid, pw in passwords.items()},
-                            "accounts": {aid: acc.to_dict() for aid, acc in accounts.items()}
-                }
-                json.dump(json_data, f, indent=2, ensure_ascii=False)
+            with self._lock:
+                with atomic_write(self.data_file) as f:
+                    write_sections(f, [
+                        ("users", ((uid, user.to_dict()) for uid, user in users.items())),
+                        ("passwords", ((uid, pw.to_dict()) for uid, pw in passwords.items())),
+                        ("accounts", ((aid, acc.to_dict()) for aid, acc in accounts.items())),
+                        ("cassettes", ((str(note), count) for note, count in self.inventory.items())),
+                    ])
+                # the new snapshot contains every delta record
+                self._truncate_deltas()
             return True
         except IOError as e:
-            logging.error(f"Failed to write to file '{self.data_file}': {e}")
+            logging.error("Failed to write to file '%s': %s", self.data_file, e)
             return False
         except Exception as e:
-            logging.error(f"An unexpected error occurred while saving data: {e}")
+            logging.error("An unexpected error occurred while saving data: %s", e)
             return False
+
+    def save_changes(self, delta: Dict) -> bool:
+        # cost is one appended line per call, independent of the size of the bank
+        if not any(delta.values()):
+            return True
+        try:
+            self._append_record(delta)
+            return True
+        except OSError as e:
+            logging.error("Failed to write to file '%s': %s", self.delta_file, e)
+            return False
+
+    def compact(self) -> bool:
+        # write a fresh snapshot and only then drop the delta records it contains
+        if self.data is None:
+            self.load_data()
+        return self.save_data(self.users, self.passwords, self.accounts)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._delta_fd is not None:
+                os.close(self._delta_fd)
+                self._delta_fd = None
+
+    def _append_record(self, record: Dict) -> None:
+        with self._lock:
+            self._write_record(record)
+            self._record_appended()
+
+    def _append_records(self, records: List[Dict]) -> None:
+        with self._lock:
+            self._write_records(records)
+            self._record_appended(len(records))
+
+    def _write_record(self, record: Dict) -> None:
+        self._write_records([record])
+
+    def _write_records(self, records: List[Dict]) -> None:
+        # one write and one fsync, however many records
+        lines = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+        fd = self._open_deltas()
+        os.write(fd, lines.encode("utf-8"))
+        os.fsync(fd)
+
+    def _record_appended(self, count: int = 1) -> None:
+        self.records_since_compaction += count
+
+    def compaction_due(self) -> bool:
+        return self.records_since_compaction >= self.compact_every
+
+    def _open_deltas(self) -> int:
+        if self._delta_fd is None:
+            self._delta_fd = os.open(self.delta_file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        return self._delta_fd
+
+    def _truncate_deltas(self) -> None:
+        if self._delta_fd is not None:
+            os.ftruncate(self._delta_fd, 0)
+            os.fsync(self._delta_fd)
+        elif os.path.exists(self.delta_file):
+            os.truncate(self.delta_file, 0)
+        self.records_since_compaction = 0
+
+    def _replay_deltas(self) -> int:
+        # records are after-images, replaying a record that is already part of the snapshot is harmless
+        replayed = 0
+        valid_length = 0
+        try:
+            with open(self.delta_file, 'rb') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # a torn write from a crash, everything before it is still valid
+                        logging.warning("Ignoring torn record at the end of '%s'.", self.delta_file)
+                        break
+                    if not line.endswith(b"\n"):
+                        break
+                    self._apply_record(record)
+                    replayed += 1
+                    valid_length += len(line)
+        except FileNotFoundError:
+            return 0
+        # cut the torn tail so new records are not appended after garbage
+        if valid_length != os.path.getsize(self.delta_file):
+            os.truncate(self.delta_file, valid_length)
+        return replayed
+
+    def _apply_record(self, record: Dict) -> None:
+        for user_id, info in record.get("users", {}).items():
+            self.users[user_id] = User.from_dict(info)
+        for account_id, info in record.get("accounts", {}).items():
+            if account_id in self.accounts and not self.columnar:
+                account = self.accounts[account_id]
+                account.owner_id, account.balance_cents = info["owner_id"], balance_cents_of(info)
+            else:
+                self._add_account(account_id, info)
+        for account_id, balance in record.get("balances", {}).items():
+            if account_id in self.accounts:
+                self.accounts[account_id].balance_cents = balance
+        for user_id, password in record.get("passwords", {}).items():
+            if user_id in self.passwords:
+                self.passwords[user_id].password = password
+        for note, count in record.get("cassettes", {}).items():
+            self.inventory[int(note)] = count
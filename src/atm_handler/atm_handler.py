@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import Dict, Optional
+from typing import Dict, Mapping, Optional
 
 
 class AtmHandler(ABC):
@@ -22,3 +22,29 @@ class AtmHandler(ABC):
     @abstractmethod
     def save_data(self, users: Optional[Dict], passwords: Optional[Dict], accounts: Optional[Dict]) -> bool:
         pass
+
+    def save_changes(self, delta: Dict) -> bool:
+        # delta holds only what changed: {"balances": {account_id: cents}, "passwords": {user_id: password}},
+        # handlers that can update in place override it, the default rewrites everything
+        return self.save_data(self.get_users(), self.get_passwords(), self.get_accounts())
+
+    def get_accounts_by_owner(self) -> Optional[Mapping]:
+        # handlers that can look accounts up by owner return owner_id -> accounts, otherwise ATM builds the index
+        return None
+
+    def get_inventory(self) -> Optional[Dict[int, int]]:
+        # handlers that persist the cash cassettes return denomination (cents) -> notes, ATM updates it in place
+        # and journals / flushes the after-images as a "cassettes" section
+        return None
+
+    def get_journal(self) -> Optional["AtmHandler"]:
+        # handlers that support a write-ahead journal return the object ATM appends its records to
+        return None
+
+    def compaction_due(self) -> bool:
+        # handlers that rewrite a snapshot every so many journal records say so here instead of compacting inside
+        # an append - the snapshot must be taken with commits held off (ATM.compacting, the flusher)
+        return False
+
+    def compact(self) -> bool:
+        return True
@@ -0,0 +1,35 @@
+import logging
+from typing import Dict, List, Optional
+
+from atm_handler.atm_file_handler import AtmFileHandler
+from dao import Account, Password, User
+
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+# ATM Journal Handler - append-only write-ahead journal on top of the JSON snapshot.
+# The journal is the delta file of AtmFileHandler, but every mutation is appended (and fsync'd) as it happens,
+# before ATM acknowledges it, the snapshot is rewritten only when the journal is compacted.
+class AtmJournalHandler(AtmFileHandler):
+    def __init__(self, data_file: str = 'data.json', journal_file: Optional[str] = None,
+                 compact_every: int = 1000, columnar: bool = False) -> None:
+        super().__init__(data_file=data_file, columnar=columnar, delta_file=journal_file or f"{data_file}.journal",
+                         compact_every=compact_every)
+        self.journal_file: str = self.delta_file
+
+    def get_journal(self) -> "AtmJournalHandler":
+        return self
+
+    def append(self, record: Dict) -> None:
+        # errors propagate, ATM rolls the operation back
+        self._append_record(record)
+
+    def append_many(self, records: List[Dict]) -> None:
+        # a group commit (group_commit.py), all the records are made durable by one fsync
+        self._append_records(records)
+
+    def save_data(self, users: Dict[str, User], passwords: Dict[str, Password], accounts: Dict[str, Account]) -> bool:
+        self.users, self.passwords, self.accounts = users, passwords, accounts
+        return super().save_data(users, passwords, accounts)
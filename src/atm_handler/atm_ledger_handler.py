@@ -0,0 +1,99 @@
+import logging
+from typing import Dict, List, Mapping, Optional
+
+from atm_handler.atm_file_handler import AtmFileHandler
+from atm_handler.ledger_file import AccountLedger, LedgerAccounts, write_ledger
+from dao import Account, Password, User
+from lazy_mapping import LazyOwnerIndex
+
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+# ATM Ledger Handler - accounts live in the binary ledger (ledger_file.py) which is mapped instead of parsed,
+# users and passwords in a small file of the data.json layout.
+# Balances are updated in place: a record is appended (and fsync'd) to the journal first and only then written into
+# the mapped file, compaction flushes the mapping and empties the journal. Startup costs the users file plus the
+# journal records since the last compaction, not the number of accounts.
+class AtmLedgerHandler(AtmFileHandler):
+    def __init__(self, ledger_file: str = 'data.ledger', users_file: Optional[str] = None,
+                 journal_file: Optional[str] = None, compact_every: int = 1000) -> None:
+        super().__init__(data_file=users_file or f"{ledger_file}.users.json",
+                         delta_file=journal_file or f"{ledger_file}.journal", compact_every=compact_every)
+        self.ledger_file: str = ledger_file
+        self.ledger: Optional[AccountLedger] = None
+
+    def _new_accounts(self) -> LedgerAccounts:
+        if self.ledger is None:
+            self.ledger = AccountLedger(self.ledger_file)
+        return LedgerAccounts(self.ledger)
+
+    def get_accounts_by_owner(self) -> LazyOwnerIndex:
+        # the owner table of the ledger, the accounts of one owner are contiguous records
+        accounts = self.get_accounts()
+        return LazyOwnerIndex(self.ledger.account_ids_of, accounts, owners=self.ledger.owner_ids)
+
+    def get_journal(self) -> "AtmLedgerHandler":
+        return self
+
+    def append(self, record: Dict) -> None:
+        if record.get("accounts"):
+            raise TypeError("Accounts can't be added to or moved in a ledger file, convert it again.")
+        with self._lock:
+            self._write_record(record)
+            self.accounts.write_balances(record.get("balances", {}))
+            self._record_appended()
+
+    def append_many(self, records: List[Dict]) -> None:
+        # a group commit (group_commit.py), one fsync before any of the balances is written into the mapping
+        if any(record.get("accounts") for record in records):
+            raise TypeError("Accounts can't be added to or moved in a ledger file, convert it again.")
+        with self._lock:
+            self._write_records(records)
+            for record in records:
+                self.accounts.write_balances(record.get("balances", {}))
+            self._record_appended(len(records))
+
+    def save_changes(self, delta: Dict) -> bool:
+        try:
+            self.append(delta)
+            return True
+        except (OSError, TypeError) as e:
+            logging.error("Failed to save changes to '%s': %s", self.ledger_file, e)
+            return False
+
+    def save_data(self, users: Mapping[str, User], passwords: Mapping[str, Password],
+                  accounts: Mapping[str, Account]) -> bool:
+        with self._lock:
+            try:
+                if accounts is self.accounts:
+                    # balances are already in place, they only have to reach the disk before the journal is emptied
+                    self.ledger.flush()
+                else:
+                    self._replace_ledger(accounts)
+            except OSError as e:
+                logging.error("Failed to write to file '%s': %s", self.ledger_file, e)
+                return False
+            return super().save_data(users, passwords, {})
+
+    def _replace_ledger(self, accounts: Mapping[str, Account]) -> None:
+        write_ledger(self.ledger_file,
+                     ((account.account_id, account.owner_id, account.balance_cents) for account in accounts.values()))
+        if self.ledger is not None:
+            self.ledger.close()
+            self.ledger = None
+        if self.data is not None:
+            self.accounts = self.data["accounts"] = self._new_accounts()
+
+    def _apply_record(self, record: Dict) -> None:
+        # replayed records are already durable, their balances go straight into the mapped file
+        super()._apply_record({section: entries for section, entries in record.items() if section != "balances"})
+        self.accounts.write_balances(record.get("balances", {}))
+
+    def close(self) -> None:
+        super().close()
+        with self._lock:
+            if self.ledger is not None:
+                self.ledger.close()
+                self.ledger = None
@@ -0,0 +1,276 @@
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+import uuid
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, Set, Tuple
+
+from atm_handler.atm_file_handler import AtmFileHandler
+from atm_handler.atm_handler import AtmHandler
+from dao import Account, Password, User
+
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# (users, passwords, accounts, cassettes) of one shard as plain column lists, cheap to pass between processes and
+# merged back with map() instead of a Python loop per row
+ShardRows = Tuple[Tuple[List[str], List[str], List[str]], Tuple[List[str], List[str]],
+                  Tuple[List[str], List[str], List[int]], Dict[int, int]]
+
+# the cash cassettes are not keyed by user or account, they live in one fixed shard
+CASSETTE_SHARD = 0
+
+
+def shard_of(key: str, shard_count: int) -> int:
+    # stable across processes and restarts, unlike hash()
+    return zlib.crc32(key.encode("utf-8")) % shard_count
+
+
+# One shard: a file of the data.json layout plus its journal.
+# Records of a cross-shard transaction carry a txid and are only prepared here, replay applies them only when the
+# coordinator log holds the commit decision for that txid (presumed abort).
+class ShardHandler(AtmFileHandler):
+    def __init__(self, data_file: str, committed: Optional[Set[str]] = None) -> None:
+        # compaction is driven by AtmShardedHandler for all the shards at once
+        super().__init__(data_file=data_file, delta_file=f"{data_file}.journal", compact_every=sys.maxsize)
+        self.committed: Set[str] = committed if committed is not None else set()
+
+    def _apply_record(self, record: Dict) -> None:
+        if "txid" in record and record["txid"] not in self.committed:
+            return
+        super()._apply_record(record)
+
+
+def _load_shard(data_file: str, committed: Set[str]) -> ShardRows:
+    shard = ShardHandler(data_file, committed)
+    shard.load_data()
+    users, passwords, accounts = shard.users.values(), shard.passwords.values(), shard.accounts.values()
+    return (([user.user_id for user in users], [user.name for user in users], [user.email for user in users]),
+            ([password.user_id for password in passwords], [password.password for password in passwords]),
+            ([account.account_id for account in accounts], [account.owner_id for account in accounts],
+             [account.balance_cents for account in accounts]),
+            shard.inventory)
+
+
+def _save_shard(data_file: str, rows: ShardRows) -> bool:
+    (user_ids, names, emails), (password_ids, hashes), (account_ids, owner_ids, balances), inventory = rows
+    shard = ShardHandler(data_file)
+    shard.inventory = inventory
+    return shard.save_data(dict(zip(user_ids, map(User, user_ids, names, emails))),
+                           dict(zip(password_ids, map(Password, password_ids, hashes))),
+                           dict(zip(account_ids, map(Account, owner_ids, balances, account_ids))))
+
+
+def _empty_rows() -> ShardRows:
+    return ([], [], []), ([], []), ([], [], []), {}
+
+
+# ATM Sharded Handler - users / passwords are partitioned by user_id and accounts by account_id across
+# shard_count files, which are loaded and saved in parallel by a process pool. ATM sees one merged mapping.
+# Every record is split by shard: a record touching one shard is a plain journal append, a record touching several
+# (a cross-shard transfer) is committed with two phases - the parts are prepared (fsync'd) in every shard journal,
+# then the decision is fsync'd to the coordinator log, which is the commit point.
+class AtmShardedHandler(AtmHandler):
+    def __init__(self, data_file: str = 'data.json', shard_count: int = 4, workers: Optional[int] = None,
+                 compact_every: int = 1000) -> None:
+        super().__init__()
+        self.data_file: str = data_file
+        self.shard_count: int = shard_count
+        self.workers: int = workers or shard_count
+        self.compact_every: int = compact_every
+        root, extension = os.path.splitext(data_file)
+        self.shard_files: List[str] = [f"{root}.shard{i}{extension}" for i in range(shard_count)]
+        self.coordinator_log: str = f"{data_file}.2pc"
+        self.shards: List[ShardHandler] = [ShardHandler(path) for path in self.shard_files]
+        self.records_since_compaction: int = 0
+        self.data: Optional[Dict] = None
+        self.users: Optional[Dict[str, User]] = None
+        self.passwords: Optional[Dict[str, Password]] = None
+        self.accounts: Optional[Dict[str, Account]] = None
+        self.inventory: Dict[int, int] = {}
+        self._coordinator_fd: Optional[int] = None
+        self._lock = threading.RLock()
+
+    def _map(self, func: Callable, *iterables: Iterable) -> List:
+        # spawn - forking a process that runs server / flusher threads can inherit a held lock
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            return list(pool.map(func, *iterables))
+
+    def load_data(self) -> Optional[Dict]:
+        committed = self._committed_transactions()
+        self.users, self.passwords, self.accounts = {}, {}, {}
+        self.inventory = {}
+        if self.workers <= 1:
+            # in process, the shard objects are merged as they are
+            for path in self.shard_files:
+                shard = ShardHandler(path, committed)
+                shard.load_data()
+                self.users.update(shard.users)
+                self.passwords.update(shard.passwords)
+                self.accounts.update(shard.accounts)
+                self.inventory.update(shard.inventory)
+            self.data = {"users": self.users, "passwords": self.passwords, "accounts": self.accounts}
+            return self.data
+        parts = self._map(_load_shard, self.shard_files, [committed] * self.shard_count)
+        for (user_ids, names, emails), (password_ids, hashes), (account_ids, owner_ids, balances), inventory in parts:
+            self.users.update(zip(user_ids, map(User, user_ids, names, emails)))
+            self.passwords.update(zip(password_ids, map(Password, password_ids, hashes)))
+            self.accounts.update(zip(account_ids, map(Account, owner_ids, balances, account_ids)))
+            self.inventory.update(inventory)
+        self.data = {"users": self.users, "passwords": self.passwords, "accounts": self.accounts}
+        return self.data
+
+    def get_users(self) -> Dict[str, User]:
+        if self.data is None:
+            self.load_data()
+        return self.users
+
+    def get_passwords(self) -> Dict[str, Password]:
+        if self.data is None:
+            self.load_data()
+        return self.passwords
+
+    def get_accounts(self) -> Dict[str, Account]:
+        if self.data is None:
+            self.load_data()
+        return self.accounts
+
+    def get_inventory(self) -> Dict[int, int]:
+        if self.data is None:
+            self.load_data()
+        return self.inventory
+
+    def get_journal(self) -> "AtmShardedHandler":
+        return self
+
+    def append(self, record: Dict) -> None:
+        parts = self._split(record)
+        with self._lock:
+            if len(parts) == 1:
+                shard, part = parts.popitem()
+                self.shards[shard]._write_record(part)
+            elif parts:
+                txid = uuid.uuid4().hex
+                # phase 1 - every participant holds its part durably, nothing is decided yet
+                for shard, part in parts.items():
+                    part["txid"] = txid
+                    self.shards[shard]._write_record(part)
+                # phase 2 - the decision, a crash before this line aborts the transaction on every shard
+                self._write_decision(txid)
+            self.records_since_compaction += 1
+
+    def compaction_due(self) -> bool:
+        return self.records_since_compaction >= self.compact_every
+
+    def save_changes(self, delta: Dict) -> bool:
+        try:
+            self.append(delta)
+            return True
+        except OSError as e:
+            logging.error("Failed to save changes to the shards of '%s': %s", self.data_file, e)
+            return False
+
+    def _split(self, record: Dict) -> Dict[int, Dict]:
+        parts: Dict[int, Dict] = {}
+        for section in ("users", "passwords", "accounts", "balances"):
+            for key, value in record.get(section, {}).items():
+                part = parts.setdefault(shard_of(key, self.shard_count), {"op": record.get("op")})
+                part.setdefault(section, {})[key] = value
+        if record.get("cassettes"):
+            parts.setdefault(CASSETTE_SHARD, {"op": record.get("op")})["cassettes"] = record["cassettes"]
+        return parts
+
+    def save_data(self, users: Mapping[str, User], passwords: Mapping[str, Password],
+                  accounts: Mapping[str, Account]) -> bool:
+        if self.workers <= 1:
+            return self._save_in_process(users, passwords, accounts)
+        rows: List[ShardRows] = [_empty_rows() for _ in range(self.shard_count)]
+        for uid, user in users.items():
+            user_ids, names, emails = rows[shard_of(uid, self.shard_count)][0]
+            user_ids.append(uid)
+            names.append(user.name)
+            emails.append(user.email)
+        for uid, password in passwords.items():
+            password_ids, hashes = rows[shard_of(uid, self.shard_count)][1]
+            password_ids.append(uid)
+            hashes.append(password.password)
+        for aid, account in accounts.items():
+            account_ids, owner_ids, balances = rows[shard_of(aid, self.shard_count)][2]
+            account_ids.append(aid)
+            owner_ids.append(account.owner_id)
+            balances.append(account.balance_cents)
+        rows[CASSETTE_SHARD][3].update(self.inventory)
+        with self._lock:
+            try:
+                saved = self._map(_save_shard, self.shard_files, rows)
+            except Exception as e:
+                logging.error("An unexpected error occurred while saving the shards: %s", e)
+                return False
+            return self._shards_saved(saved)
+
+    def _save_in_process(self, users: Mapping[str, User], passwords: Mapping[str, Password],
+                         accounts: Mapping[str, Account]) -> bool:
+        parts: List[Tuple[Dict, Dict, Dict]] = [({}, {}, {}) for _ in range(self.shard_count)]
+        for uid, user in users.items():
+            parts[shard_of(uid, self.shard_count)][0][uid] = user
+        for uid, password in passwords.items():
+            parts[shard_of(uid, self.shard_count)][1][uid] = password
+        for aid, account in accounts.items():
+            parts[shard_of(aid, self.shard_count)][2][aid] = account
+        for i, shard in enumerate(self.shards):
+            shard.inventory = self.inventory if i == CASSETTE_SHARD else {}
+        with self._lock:
+            return self._shards_saved([shard.save_data(*part) for shard, part in zip(self.shards, parts)])
+
+    def _shards_saved(self, saved: List[bool]) -> bool:
+        if not all(saved):
+            return False
+        # every shard snapshot contains the committed transactions, their decisions are not needed anymore
+        self._truncate_coordinator_log()
+        self.records_since_compaction = 0
+        return True
+
+    def compact(self) -> bool:
+        if self.data is None:
+            self.load_data()
+        return self.save_data(self.users, self.passwords, self.accounts)
+
+    def close(self) -> None:
+        with self._lock:
+            for shard in self.shards:
+                shard.close()
+            if self._coordinator_fd is not None:
+                os.close(self._coordinator_fd)
+                self._coordinator_fd = None
+
+    def _write_decision(self, txid: str) -> None:
+        if self._coordinator_fd is None:
+            self._coordinator_fd = os.open(self.coordinator_log, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        os.write(self._coordinator_fd, (json.dumps({"txid": txid, "decision": "commit"}) + "\n").encode("utf-8"))
+        os.fsync(self._coordinator_fd)
+
+    def _truncate_coordinator_log(self) -> None:
+        if self._coordinator_fd is not None:
+            os.ftruncate(self._coordinator_fd, 0)
+            os.fsync(self._coordinator_fd)
+        elif os.path.exists(self.coordinator_log):
+            os.truncate(self.coordinator_log, 0)
+
+    def _committed_transactions(self) -> Set[str]:
+        committed: Set[str] = set()
+        try:
+            with open(self.coordinator_log, 'rb') as f:
+                for line in f:
+                    try:
+                        committed.add(json.loads(line)["txid"])
+                    except (ValueError, KeyError):
+                        # a torn decision was never acknowledged, the transaction is aborted
+                        break
+        except FileNotFoundError:
+            pass
+        return committed
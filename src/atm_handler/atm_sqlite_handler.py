@@ -0,0 +1,191 @@
+import logging
+import sqlite3
+import threading
+from typing import Callable, Dict, List, Mapping, Optional
+
+from atm_handler.atm_handler import AtmHandler
+from dao import Account, Password, User
+from lazy_mapping import LazyMapping, LazyOwnerIndex
+
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    email TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS passwords (
+    user_id TEXT PRIMARY KEY,
+    password TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS accounts (
+    account_id TEXT PRIMARY KEY,
+    owner_id TEXT NOT NULL,
+    balance_cents INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS accounts_owner_id ON accounts (owner_id);
+CREATE TABLE IF NOT EXISTS cassettes (
+    denomination INTEGER PRIMARY KEY,
+    count INTEGER NOT NULL
+);
+"""
+
+
+# Lazy view over one table, a row becomes a dao object on first access
+class SqliteTable(LazyMapping):
+    def __init__(self, handler: "AtmSqliteHandler", table: str, key: str, columns: List[str],
+                 factory: Callable[..., object]) -> None:
+        select = f"SELECT {', '.join(columns)} FROM {table} WHERE {key} = ?"
+
+        def load(item_id: str):
+            row = handler.query_one(select, (item_id,))
+            return None if row is None else factory(**dict(zip(columns, row)))
+
+        super().__init__(
+            loader=load,
+            keys=lambda: (item_id for (item_id,) in handler.query_all(f"SELECT {key} FROM {table}")),
+            length=lambda: handler.query_one(f"SELECT COUNT(*) FROM {table}")[0],
+            contains=lambda item_id: handler.query_one(
+                f"SELECT 1 FROM {table} WHERE {key} = ?", (item_id,)) is not None,
+        )
+
+
+# ATM SQLite Handler - indexed SQLite file, nothing is loaded up front.
+# ATM only pays for the rows it touches: the authenticated user's accounts and a transfer counterparty.
+class AtmSqliteHandler(AtmHandler):
+    def __init__(self, db_file: str = 'data.db') -> None:
+        super().__init__()
+        self.db_file: str = db_file
+        self.connection: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self.users: Optional[SqliteTable] = None
+        self.passwords: Optional[SqliteTable] = None
+        self.accounts: Optional[SqliteTable] = None
+        self.inventory: Optional[Dict[int, int]] = None
+
+    def load_data(self) -> Optional[Dict]:
+        self.connection = sqlite3.connect(self.db_file, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=FULL")
+        self.connection.executescript(SCHEMA)
+        self.users = SqliteTable(self, "users", "user_id", ["user_id", "name", "email"], User)
+        self.passwords = SqliteTable(self, "passwords", "user_id", ["user_id", "password"], Password)
+        self.accounts = SqliteTable(self, "accounts", "account_id", ["account_id", "owner_id", "balance_cents"], Account)
+        return None
+
+    def get_users(self) -> SqliteTable:
+        if self.connection is None:
+            self.load_data()
+        return self.users
+
+    def get_passwords(self) -> SqliteTable:
+        if self.connection is None:
+            self.load_data()
+        return self.passwords
+
+    def get_accounts(self) -> SqliteTable:
+        if self.connection is None:
+            self.load_data()
+        return self.accounts
+
+    def get_accounts_by_owner(self) -> LazyOwnerIndex:
+        # answered from the owner_id index instead of a full scan
+        return LazyOwnerIndex(
+            lookup=lambda owner_id: [aid for (aid,) in self.query_all(
+                "SELECT account_id FROM accounts WHERE owner_id = ?", (owner_id,))],
+            accounts=self.get_accounts(),
+            owners=lambda: [oid for (oid,) in self.query_all("SELECT DISTINCT owner_id FROM accounts")],
+        )
+
+    def get_inventory(self) -> Dict[int, int]:
+        # a handful of rows, loaded whole
+        if self.inventory is None:
+            if self.connection is None:
+                self.load_data()
+            self.inventory = dict(self.query_all("SELECT denomination, count FROM cassettes"))
+        return self.inventory
+
+    def get_journal(self) -> "AtmSqliteHandler":
+        return self
+
+    # append / append_many / save_changes share _commit rather than calling each other, they may be wrapped
+    # by metrics.instrument and a nested call would be recorded twice
+    def append(self, record: Dict) -> None:
+        # every ATM operation is committed as one transaction
+        self._commit([record])
+
+    def append_many(self, records: List[Dict]) -> None:
+        # a group commit (group_commit.py) is one transaction for all the records
+        self._commit(records)
+
+    def _commit(self, records: List[Dict]) -> None:
+        with self._lock, self.connection:
+            for record in records:
+                self._write_record(record)
+
+    def _write_record(self, record: Dict) -> None:
+        self.connection.executemany("INSERT OR REPLACE INTO users (user_id, name, email) VALUES (?, ?, ?)",
+                                    [(uid, u["name"], u["email"]) for uid, u in record.get("users", {}).items()])
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO accounts (account_id, owner_id, balance_cents) VALUES (?, ?, ?)",
+            [(aid, a["owner_id"], a["balance_cents"]) for aid, a in record.get("accounts", {}).items()])
+        self.connection.executemany("UPDATE accounts SET balance_cents = ? WHERE account_id = ?",
+                                    [(balance, aid) for aid, balance in record.get("balances", {}).items()])
+        self.connection.executemany("UPDATE passwords SET password = ? WHERE user_id = ?",
+                                    [(pw, uid) for uid, pw in record.get("passwords", {}).items()])
+        self.connection.executemany("INSERT OR REPLACE INTO cassettes (denomination, count) VALUES (?, ?)",
+                                    [(int(note), count) for note, count in record.get("cassettes", {}).items()])
+
+    def save_changes(self, delta: Dict) -> bool:
+        try:
+            self._commit([delta])
+            return True
+        except sqlite3.Error as e:
+            logging.error("Failed to write to database '%s': %s", self.db_file, e)
+            return False
+
+    def save_data(self, users: Mapping[str, User], passwords: Mapping[str, Password],
+                  accounts: Mapping[str, Account]) -> bool:
+        # lazy tables only hold what was touched, plain dicts (e.g. an import from data.json) are written fully
+        try:
+            self.execute("INSERT OR REPLACE INTO users (user_id, name, email) VALUES (?, ?, ?)",
+                         [(u.user_id, u.name, u.email) for u in self._items(users)])
+            self.execute("INSERT OR REPLACE INTO passwords (user_id, password) VALUES (?, ?)",
+                         [(p.user_id, p.password) for p in self._items(passwords)])
+            self.execute("INSERT OR REPLACE INTO accounts (account_id, owner_id, balance_cents) VALUES (?, ?, ?)",
+                         [(a.account_id, a.owner_id, a.balance_cents) for a in self._items(accounts)])
+            if self.inventory is not None:
+                self.execute("INSERT OR REPLACE INTO cassettes (denomination, count) VALUES (?, ?)",
+                             list(self.inventory.items()))
+            return True
+        except sqlite3.Error as e:
+            logging.error("Failed to write to database '%s': %s", self.db_file, e)
+            return False
+
+    def close(self) -> None:
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def query_one(self, sql: str, params: tuple = ()) -> Optional[tuple]:
+        with self._lock:
+            return self.connection.execute(sql, params).fetchone()
+
+    def query_all(self, sql: str, params: tuple = ()) -> List[tuple]:
+        with self._lock:
+            return self.connection.execute(sql, params).fetchall()
+
+    def execute(self, sql: str, rows: List[tuple]) -> None:
+        if self.connection is None:
+            self.load_data()
+        with self._lock, self.connection:
+            self.connection.executemany(sql, rows)
+
+    @staticmethod
+    def _items(mapping: Mapping) -> List:
+        if isinstance(mapping, SqliteTable):
+            return list(mapping.loaded.values())
+        return list(mapping.values())
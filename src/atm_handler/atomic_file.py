@@ -0,0 +1,32 @@
+import os
+import tempfile
+from contextlib import contextmanager, suppress
+from typing import IO, Iterator
+
+
+# Crash-safe file replacement: write a temp file next to the target, fsync it, rename it over the target
+# and fsync the directory. Readers only ever see the old or the new complete file, never a truncated one.
+@contextmanager
+def atomic_write(path: str, encoding: str = 'utf-8', buffering: int = 1 << 20, binary: bool = False) -> Iterator[IO]:
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, 'wb' if binary else 'w', encoding=None if binary else encoding, buffering=buffering) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        with suppress(FileNotFoundError):
+            os.unlink(temp_path)
+        raise
+    fsync_directory(directory)
+
+
+def fsync_directory(directory: str) -> None:
+    # makes the rename itself durable
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
@@ -0,0 +1,134 @@
+import json
+import re
+from typing import Any, Iterable, Iterator, TextIO, Tuple
+
+# Incremental reader / writer for the data.json layout: a top level object of sections, each section an
+# object of id -> small object. Only one entry is held in memory at a time, the entry objects themselves
+# are decoded by the C json decoder.
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_ENTRY_KEY = re.compile(r'[ \t\n\r]*"((?:[^"\\]|\\.)*)"[ \t\n\r]*:[ \t\n\r]*')
+_ENTRY_END = re.compile(r'[ \t\n\r]*([,}])')
+
+
+class _StreamReader:
+    def __init__(self, f: TextIO, chunk_size: int = 1 << 16) -> None:
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        while True:
+            self.pos = _WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return ""
+
+    def expect(self, char: str) -> None:
+        if self.peek() != char:
+            raise json.JSONDecodeError(f"Expecting '{char}'", self.buffer, self.pos)
+        self.pos += 1
+
+    def skip(self, char: str) -> bool:
+        if self.peek() == char:
+            self.pos += 1
+            return True
+        return False
+
+    def value(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                # the value is cut by the end of the buffer
+                if self.fill():
+                    continue
+                raise
+            # a number at the very end of the buffer may continue in the next chunk
+            if end == len(self.buffer) and self.fill():
+                continue
+            self.pos = end
+            return value
+
+    def entries(self) -> Iterator[Tuple[str, Any]]:
+        # "key": value pairs of the current object up to its closing brace, one regex for the key and the separator,
+        # an entry cut by the end of the buffer is parsed again after a refill
+        if self.skip("}"):
+            return
+        while True:
+            buffer = self.buffer
+            key_match = _ENTRY_KEY.match(buffer, self.pos)
+            value_end = end_match = None
+            if key_match is not None and key_match.end() < len(buffer):
+                try:
+                    value, value_end = self.decoder.raw_decode(buffer, key_match.end())
+                except json.JSONDecodeError:
+                    value_end = None
+                if value_end is not None:
+                    end_match = _ENTRY_END.match(buffer, value_end)
+            if end_match is None:
+                if self.fill():
+                    continue
+                raise json.JSONDecodeError("Expecting property", self.buffer, self.pos)
+            key = key_match.group(1)
+            if "\\" in key:
+                key = json.loads(f'"{key}"')
+            self.pos = end_match.end()
+            yield key, value
+            if end_match.group(1) == "}":
+                return
+
+
+def iter_sections(f: TextIO, chunk_size: int = 1 << 16) -> Iterator[Tuple[str, str, Any]]:
+    # yields (section, id, entry) for every entry, sections that are not objects are skipped
+    reader = _StreamReader(f, chunk_size)
+    if reader.peek() == "":
+        return
+    reader.expect("{")
+    if reader.skip("}"):
+        return
+    while True:
+        section = reader.value()
+        reader.expect(":")
+        if reader.skip("{"):
+            for key, entry in reader.entries():
+                yield section, key, entry
+        else:
+            reader.value()
+        if not reader.skip(","):
+            break
+    reader.expect("}")
+
+
+def write_sections(f: TextIO, sections: Iterable[Tuple[str, Iterable[Tuple[str, Any]]]]) -> None:
+    # entries are serialized one at a time, one entry per line
+    f.write("{")
+    for section_number, (section, entries) in enumerate(sections):
+        f.write(",\n  " if section_number else "\n  ")
+        f.write(json.dumps(section, ensure_ascii=False))
+        f.write(": {")
+        empty = True
+        for key, entry in entries:
+            f.write("\n    " if empty else ",\n    ")
+            f.write(json.dumps(key, ensure_ascii=False))
+            f.write(": ")
+            f.write(json.dumps(entry, ensure_ascii=False))
+            empty = False
+        f.write("}" if empty else "\n  }")
+    f.write("\n}\n")
@@ -0,0 +1,293 @@
+import argparse
+import mmap
+import struct
+import sys
+import zlib
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, MutableMapping, Tuple
+
+from atm_handler.atomic_file import atomic_write
+from atm_handler.json_stream import iter_sections, write_sections
+from dao import Account, Password, User, balance_cents_of
+from exceptions import DataFileCorruptedError
+
+# Binary account ledger, every integer little endian:
+#   header       magic, counts, hash table sizes and section offsets
+#   records      one fixed width record per account: id string number, owner number, balance_cents -
+#                sorted by owner, the accounts of one owner are contiguous
+#   account table   open addressing account id -> record number (crc32 of the id, linear probing)
+#   owners       one entry per owner: id string number, first record, record count
+#   owner table  open addressing owner id -> owner number
+#   strings      count + 1 offsets and the utf-8 bytes of every account / owner id
+# The file is mapped, nothing is parsed up front - a lookup touches the hash slot, the record and the id bytes.
+
+MAGIC = b"ATMLEDG1"
+HEADER = struct.Struct("<8sIIII6Q")
+RECORD = struct.Struct("<IIq")
+OWNER = struct.Struct("<III")
+SLOT = struct.Struct("<I")
+OFFSET = struct.Struct("<Q")
+BALANCE = struct.Struct("<q")
+BALANCE_POSITION = 8
+EMPTY = 0xFFFFFFFF
+
+
+def _table_size(count: int) -> int:
+    size = 8
+    while size < 2 * count:
+        size *= 2
+    return size
+
+
+def _little_endian(values: array) -> bytes:
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values.tobytes()
+
+
+def _hash_table(keys: List[bytes], size: int) -> array:
+    table = array('I', [EMPTY]) * size
+    mask = size - 1
+    for number, key in enumerate(keys):
+        slot = zlib.crc32(key) & mask
+        while table[slot] != EMPTY:
+            slot = (slot + 1) & mask
+        table[slot] = number
+    return table
+
+
+def write_ledger(path: str, accounts: Iterable[Tuple[str, str, int]]) -> None:
+    # accounts - (account_id, owner_id, balance_cents), the file is replaced atomically
+    entries = sorted(accounts, key=lambda entry: entry[1])
+    owners: List[str] = []
+    owner_ranges: List[List[int]] = []
+    for row, (_, owner_id, _) in enumerate(entries):
+        if not owners or owners[-1] != owner_id:
+            owners.append(owner_id)
+            owner_ranges.append([row, 0])
+        owner_ranges[-1][1] += 1
+
+    account_keys = [account_id.encode("utf-8") for account_id, _, _ in entries]
+    owner_keys = [owner_id.encode("utf-8") for owner_id in owners]
+    account_slots, owner_slots = _table_size(len(entries)), _table_size(len(owners))
+    records = HEADER.size
+    account_table = records + RECORD.size * len(entries)
+    owners_offset = account_table + SLOT.size * account_slots
+    owner_table = owners_offset + OWNER.size * len(owners)
+    string_offsets = -(-(owner_table + SLOT.size * owner_slots) // 8) * 8
+    string_data = string_offsets + OFFSET.size * (len(account_keys) + len(owner_keys) + 1)
+
+    offsets = array('Q', [0])
+    for key in account_keys + owner_keys:
+        offsets.append(offsets[-1] + len(key))
+
+    with atomic_write(path, binary=True) as f:
+        f.write(HEADER.pack(MAGIC, len(entries), len(owners), account_slots, owner_slots,
+                            records, account_table, owners_offset, owner_table, string_offsets, string_data))
+        owner_number = -1
+        for row, (_, owner_id, balance_cents) in enumerate(entries):
+            if owner_number < 0 or owners[owner_number] != owner_id:
+                owner_number += 1
+            f.write(RECORD.pack(row, owner_number, balance_cents))
+        f.write(_little_endian(_hash_table(account_keys, account_slots)))
+        for number, (first, count) in enumerate(owner_ranges):
+            f.write(OWNER.pack(len(entries) + number, first, count))
+        f.write(_little_endian(_hash_table(owner_keys, owner_slots)))
+        f.write(b"\0" * (string_offsets - owner_table - SLOT.size * owner_slots))
+        f.write(_little_endian(offsets))
+        for key in account_keys:
+            f.write(key)
+        for key in owner_keys:
+            f.write(key)
+
+
+class AccountLedger:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._file = open(path, 'r+b')
+        self.mm = mmap.mmap(self._file.fileno(), 0)
+        try:
+            (magic, self.account_count, self.owner_count, account_slots, owner_slots, self.records,
+             self.account_table, self.owners, self.owner_table, self.string_offsets,
+             self.string_data) = HEADER.unpack_from(self.mm, 0)
+        except struct.error as e:
+            raise DataFileCorruptedError(f"Ledger file '{path}' is corrupted: {e}") from e
+        if magic != MAGIC:
+            raise DataFileCorruptedError(f"'{path}' is not a ledger file.")
+        self.account_mask = account_slots - 1
+        self.owner_mask = owner_slots - 1
+
+    def string_bytes(self, number: int) -> bytes:
+        start, end = struct.unpack_from("<QQ", self.mm, self.string_offsets + OFFSET.size * number)
+        return self.mm[self.string_data + start:self.string_data + end]
+
+    def string(self, number: int) -> str:
+        return self.string_bytes(number).decode("utf-8")
+
+    def _find(self, key: str, table: int, mask: int, string_of) -> int:
+        encoded = key.encode("utf-8")
+        slot = zlib.crc32(encoded) & mask
+        while True:
+            number = SLOT.unpack_from(self.mm, table + SLOT.size * slot)[0]
+            if number == EMPTY:
+                return -1
+            if self.string_bytes(string_of(number)) == encoded:
+                return number
+            slot = (slot + 1) & mask
+
+    def row_of(self, account_id: str) -> int:
+        # account ids are string numbers 0..account_count-1, in record order
+        return self._find(account_id, self.account_table, self.account_mask, lambda row: row)
+
+    def owner_number_of(self, owner_id: str) -> int:
+        return self._find(owner_id, self.owner_table, self.owner_mask, lambda number: self.account_count + number)
+
+    def account_id(self, row: int) -> str:
+        return self.string(row)
+
+    def owner_id(self, row: int) -> str:
+        owner_number = RECORD.unpack_from(self.mm, self.records + RECORD.size * row)[1]
+        return self.string(self.account_count + owner_number)
+
+    def balance(self, row: int) -> int:
+        return BALANCE.unpack_from(self.mm, self.records + RECORD.size * row + BALANCE_POSITION)[0]
+
+    def set_balance(self, row: int, balance_cents: int) -> None:
+        BALANCE.pack_into(self.mm, self.records + RECORD.size * row + BALANCE_POSITION, balance_cents)
+
+    def rows_of(self, owner_id: str) -> range:
+        owner_number = self.owner_number_of(owner_id)
+        if owner_number < 0:
+            return range(0)
+        _, first, count = OWNER.unpack_from(self.mm, self.owners + OWNER.size * owner_number)
+        return range(first, first + count)
+
+    def account_ids_of(self, owner_id: str) -> List[str]:
+        return [self.account_id(row) for row in self.rows_of(owner_id)]
+
+    def owner_ids(self) -> Iterator[str]:
+        return (self.string(self.account_count + number) for number in range(self.owner_count))
+
+    def flush(self) -> None:
+        self.mm.flush()
+
+    def close(self) -> None:
+        self.mm.close()
+        self._file.close()
+
+
+# Row proxy into a LedgerAccounts mapping, same surface as dao.Account.
+class LedgerRecord:
+    __slots__ = ("accounts", "row")
+
+    def __init__(self, accounts: "LedgerAccounts", row: int) -> None:
+        self.accounts = accounts
+        self.row = row
+
+    @property
+    def account_id(self) -> str:
+        return self.accounts.ledger.account_id(self.row)
+
+    @property
+    def owner_id(self) -> str:
+        return self.accounts.ledger.owner_id(self.row)
+
+    @owner_id.setter
+    def owner_id(self, value: str) -> None:
+        if value != self.owner_id:
+            raise TypeError("Accounts can't be moved in a ledger file, convert it again.")
+
+    @property
+    def balance_cents(self) -> int:
+        return self.accounts.balance_of(self.row)
+
+    @balance_cents.setter
+    def balance_cents(self, value: int) -> None:
+        self.accounts.pending[self.row] = value
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"owner_id": self.owner_id, "balance_cents": self.balance_cents, "account_id": self.account_id}
+
+    def __eq__(self, other: object) -> bool:
+        return (isinstance(other, (LedgerRecord, Account)) and
+                (self.owner_id, self.balance_cents, self.account_id) ==
+                (other.owner_id, other.balance_cents, other.account_id))
+
+    def __repr__(self) -> str:
+        return (f"LedgerRecord(owner_id={self.owner_id!r}, balance_cents={self.balance_cents!r}, "
+                f"account_id={self.account_id!r})")
+
+
+# account_id -> LedgerRecord over a mapped ledger. New balances stay in `pending` until the handler has journaled
+# them (write_balances), so the mapped file never holds half of an operation the journal doesn't know about.
+class LedgerAccounts(MutableMapping):
+    def __init__(self, ledger: AccountLedger) -> None:
+        self.ledger = ledger
+        self.pending: Dict[int, int] = {}
+
+    def balance_of(self, row: int) -> int:
+        balance = self.pending.get(row)
+        return self.ledger.balance(row) if balance is None else balance
+
+    def write_balances(self, balances: Dict[str, int]) -> None:
+        for account_id, balance in balances.items():
+            row = self.ledger.row_of(account_id)
+            if row >= 0:
+                self.ledger.set_balance(row, balance)
+                self.pending.pop(row, None)
+
+    def __getitem__(self, account_id: str) -> LedgerRecord:
+        row = self.ledger.row_of(account_id) if isinstance(account_id, str) else -1
+        if row < 0:
+            raise KeyError(account_id)
+        return LedgerRecord(self, row)
+
+    def __contains__(self, account_id: object) -> bool:
+        return isinstance(account_id, str) and self.ledger.row_of(account_id) >= 0
+
+    def __setitem__(self, account_id: str, account: Account) -> None:
+        record = self[account_id] if account_id in self else None
+        if record is None or record.owner_id != account.owner_id:
+            raise TypeError("Accounts can't be added to or moved in a ledger file, convert it again.")
+        record.balance_cents = account.balance_cents
+
+    def __delitem__(self, account_id: str) -> None:
+        raise TypeError("Accounts can't be removed from a ledger file.")
+
+    def __iter__(self) -> Iterator[str]:
+        return (self.ledger.account_id(row) for row in range(self.ledger.account_count))
+
+    def __len__(self) -> int:
+        return self.ledger.account_count
+
+
+def convert_json_to_ledger(data_file: str, ledger_file: str, users_file: str) -> int:
+    # data.json layout -> binary ledger (accounts) + users_file (users and passwords), returns the account count
+    users: Dict[str, User] = {}
+    passwords: Dict[str, Password] = {}
+    accounts: List[Tuple[str, str, int]] = []
+    with open(data_file, 'r', encoding='utf-8') as f:
+        for section, key, info in iter_sections(f):
+            if section == "users":
+                users[key] = User.from_dict(info)
+            elif section == "passwords":
+                passwords[key] = Password.from_dict(info)
+            elif section == "accounts":
+                accounts.append((key, info["owner_id"], balance_cents_of(info)))
+    write_ledger(ledger_file, accounts)
+    with atomic_write(users_file) as f:
+        write_sections(f, [
+            ("users", ((uid, user.to_dict()) for uid, user in users.items())),
+            ("passwords", ((uid, pw.to_dict()) for uid, pw in passwords.items())),
+        ])
+    return len(accounts)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Convert data.json into a binary account ledger")
+    parser.add_argument('data_file')
+    parser.add_argument('ledger_file')
+    parser.add_argument('--users-file', default=None, help="users / passwords file (default <ledger_file>.users.json)")
+    args = parser.parse_args()
+    count = convert_json_to_ledger(args.data_file, args.ledger_file, args.users_file or f"{args.ledger_file}.users.json")
+    print(f"{count} accounts written to '{args.ledger_file}'.")
@@ -0,0 +1,100 @@
+import json
+import logging
+from typing import Any, Callable, Dict, Optional
+
+from atm import ATM
+from exceptions import ATMError, UnauthorizedAccessError
+from session import Session
+
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def parse_request(line) -> Dict:
+    # one protocol line (str or bytes), ValueError when it isn't a JSON object
+    request = json.loads(line)
+    if not isinstance(request, dict):
+        raise ValueError("Request must be a JSON object.")
+    return request
+
+
+# Per connection state, one logged in session at a time
+class ConnectionState:
+    def __init__(self, client_id: Optional[str] = None) -> None:
+        self.client_id = client_id
+        self.session: Optional[Session] = None
+
+
+# Line-delimited JSON protocol over the ATM business rules, amounts and balances are int cents.
+# request:  {"op": "withdraw", "account_id": "1", "amount": 1000, "id": 7}
+# response: {"ok": true, "result": null, "id": 7} / {"ok": false, "error": "InvalidAmountError", "message": "..."}
+class ATMProtocol:
+    def __init__(self, atm: ATM) -> None:
+        self.atm = atm
+        self.operations: Dict[str, Callable[[ConnectionState, Dict], Any]] = {
+            "authenticate": self.handle_authenticate,
+            "login": self.handle_authenticate,
+            "balance": self.handle_balance,
+            "withdraw": self.handle_withdraw,
+            "deposit": self.handle_deposit,
+            "transfer": self.handle_transfer,
+            "change_password": self.handle_change_password,
+            "statement": self.handle_statement,
+            "logout": self.handle_logout,
+        }
+
+    def handle(self, state: ConnectionState, request: Dict) -> Dict:
+        response: Dict[str, Any]
+        try:
+            operation = self.operations.get(request.get("op"))
+            if operation is None:
+                raise ValueError(f"Unknown operation '{request.get('op')}'.")
+            response = {"ok": True, "result": operation(state, request)}
+        except ATMError as e:
+            response = {"ok": False, "error": type(e).__name__, "message": str(e)}
+        except (KeyError, TypeError, ValueError) as e:
+            response = {"ok": False, "error": "BadRequest", "message": str(e)}
+        except Exception as e:
+            logging.error("Unexpected error while handling '%s': %s", request.get('op'), e)
+            response = {"ok": False, "error": "InternalError", "message": str(e)}
+        if "id" in request:
+            response["id"] = request["id"]
+        return response
+
+    @staticmethod
+    def session_of(state: ConnectionState) -> Session:
+        if state.session is None:
+            raise UnauthorizedAccessError("Operation not allowed: User must be authenticated.")
+        return state.session
+
+    def handle_authenticate(self, state: ConnectionState, request: Dict) -> Dict:
+        state.session = self.atm.login(str(request["user_id"]), str(request["password"]), state.client_id)
+        return {"name": state.session.name}
+
+    def handle_balance(self, state: ConnectionState, request: Dict) -> Dict[str, int]:
+        return self.session_of(state).get_balance()
+
+    def handle_withdraw(self, state: ConnectionState, request: Dict) -> None:
+        self.session_of(state).withdraw(str(request["account_id"]), request["amount"])
+
+    def handle_deposit(self, state: ConnectionState, request: Dict) -> None:
+        self.session_of(state).deposit(str(request["account_id"]), request["amount"])
+
+    def handle_transfer(self, state: ConnectionState, request: Dict) -> None:
+        self.session_of(state).transfer(str(request["from_account"]), str(request["to_account"]),
+                                        request["amount"])
+
+    def handle_statement(self, state: ConnectionState, request: Dict) -> Dict:
+        page = self.session_of(state).get_statement(str(request["account_id"]), int(request.get("since", 0)),
+                                                    int(request.get("limit", 50)))
+        return {"transactions": [transaction.to_dict() for transaction in page.transactions],
+                "next_since": page.next_since}
+
+    def handle_change_password(self, state: ConnectionState, request: Dict) -> None:
+        self.session_of(state).change_password(str(request["new_password"]))
+
+    def handle_logout(self, state: ConnectionState, request: Dict) -> None:
+        if state.session is not None:
+            state.session.logout()
+            state.session = None
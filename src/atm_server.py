@@ -0,0 +1,192 @@
+import asyncio
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import AbstractSet, Dict, Optional
+
+from atm import ATM
+from atm_handler.atm_handler import AtmHandler
+from atm_protocol import ATMProtocol, ConnectionState, parse_request
+from flusher import BackgroundFlusher
+from group_commit import GroupCommitter
+from cash_dispenser import CashDispenser
+from limits import WithdrawalLimits
+from metrics import ATM_OPERATIONS, MetricsRegistry
+from transaction_history import TransactionHistory
+
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# operations that may block on disk (journal fsync, sqlite commit, a sqlite / caching handler query for a balance)
+# run on the executor, the rest inline
+BLOCKING_OPERATIONS = {"authenticate", "balance", "withdraw", "deposit", "transfer", "change_password", "statement"}
+
+
+async def close_writer(writer: asyncio.StreamWriter) -> None:
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except ConnectionError:
+        # the peer is already gone
+        pass
+
+
+async def skip_line(reader: asyncio.StreamReader) -> None:
+    # drops the rest of an over-limit line, a chunk at a time
+    while True:
+        try:
+            await reader.readuntil(b"\n")
+            return
+        except asyncio.LimitOverrunError as e:
+            await reader.readexactly(e.consumed)
+
+
+# asyncio TCP front-end, every connection is a coroutine on one event loop
+class ATMServer:
+    def __init__(self, atm: ATM, atm_handler: Optional[AtmHandler] = None, max_workers: int = 32,
+                 flusher: Optional[BackgroundFlusher] = None, metrics: Optional[MetricsRegistry] = None,
+                 blocking_operations: AbstractSet[str] = BLOCKING_OPERATIONS) -> None:
+        self.atm = atm
+        self.atm_handler = atm_handler
+        self.flusher = flusher
+        self.protocol = ATMProtocol(atm)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="atm-io")
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.metrics = metrics
+        self.metrics_server: Optional[asyncio.AbstractServer] = None
+        self.blocking_operations = blocking_operations
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0, reuse_port: bool = False) -> asyncio.AbstractServer:
+        self.server = await asyncio.start_server(self.handle_connection, host, port, reuse_port=reuse_port)
+        logging.info("ATM server listening on %s", self.address)
+        return self.server
+
+    async def start_metrics(self, host: str = "127.0.0.1", port: int = 0) -> asyncio.AbstractServer:
+        # scrape endpoint: GET /metrics (Prometheus text format) and GET /metrics.json
+        self.metrics_server = await asyncio.start_server(self.handle_metrics, host, port)
+        logging.info("Metrics endpoint listening on %s", self.metrics_server.sockets[0].getsockname()[:2])
+        return self.metrics_server
+
+    async def handle_metrics(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            try:
+                request_line = await reader.readline()
+                # the headers are not needed
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+            except ValueError:
+                # a line over the stream limit (readline turns LimitOverrunError into ValueError)
+                request_line = None
+            parts = request_line.split() if request_line is not None else []
+            path = parts[1].decode("latin-1") if len(parts) > 1 else ""
+            if request_line is None:
+                status, content_type, body = "400 Bad Request", "text/plain", "bad request\n"
+            elif path == "/metrics":
+                status, content_type, body = "200 OK", "text/plain; version=0.0.4", self.metrics.prometheus_text()
+            elif path == "/metrics.json":
+                status, content_type, body = "200 OK", "application/json", self.metrics.to_json()
+            else:
+                status, content_type, body = "404 Not Found", "text/plain", "not found\n"
+            payload = body.encode("utf-8")
+            writer.write(f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\nContent-Length: {len(payload)}\r\n"
+                         f"Connection: close\r\n\r\n".encode("latin-1") + payload)
+            await writer.drain()
+        except ConnectionError as e:
+            logging.info("Metrics connection dropped: %s", e)
+        finally:
+            await close_writer(writer)
+
+    @property
+    def address(self) -> Optional[tuple]:
+        if self.server is None or not self.server.sockets:
+            return None
+        return self.server.sockets[0].getsockname()[:2]
+
+    async def serve_forever(self) -> None:
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        peer = writer.get_extra_info("peername")
+        state = ConnectionState(client_id=str(peer[0]) if peer else None)
+        try:
+            while True:
+                # readuntil, not readline - readline turns an over-limit line into a ValueError after throwing away
+                # an unknown part of it, so the next request could not be found
+                try:
+                    line = await reader.readuntil(b"\n")
+                except asyncio.IncompleteReadError as e:
+                    # end of the stream, possibly after a last line without a newline
+                    if not e.partial:
+                        break
+                    line = e.partial
+                except asyncio.LimitOverrunError:
+                    await skip_line(reader)
+                    line = None
+                if line is None:
+                    response = {"ok": False, "error": "BadRequest", "message": "Request line too long."}
+                else:
+                    try:
+                        request = parse_request(line)
+                    except ValueError as e:
+                        response = {"ok": False, "error": "BadRequest", "message": str(e)}
+                    else:
+                        response = await self.dispatch(state, request)
+                writer.write(json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError) as e:
+            logging.info("Connection %s dropped: %s", peer, e)
+        finally:
+            if state.session is not None:
+                state.session.logout()
+            await close_writer(writer)
+
+    async def dispatch(self, state: ConnectionState, request: Dict) -> Dict:
+        if request.get("op") in self.blocking_operations:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, self.protocol.handle, state, request)
+        return self.protocol.handle(state, request)
+
+    async def close(self) -> bool:
+        if self.metrics_server is not None:
+            self.metrics_server.close()
+            await self.metrics_server.wait_closed()
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        saved = True
+        loop = asyncio.get_running_loop()
+        if self.flusher is not None:
+            saved = await loop.run_in_executor(self.executor, self.flusher.stop)
+        elif self.atm_handler is not None:
+            saved = await loop.run_in_executor(self.executor, self._save_snapshot)
+        self.executor.shutdown(wait=True)
+        return saved
+
+    def _save_snapshot(self) -> bool:
+        # connections still running on the executor may be committing, the snapshot waits for them
+        with self.atm.commit_gate.exclusive():
+            return self.atm_handler.save_data(self.atm.get_users(), self.atm.get_passwords(), self.atm.get_accounts())
+
+
+async def serve(atm_handler: AtmHandler, host: str, port: int,
+                flush_interval: Optional[float] = None, flush_threshold: int = 100,
+                history: Optional[TransactionHistory] = None, limits: Optional[WithdrawalLimits] = None,
+                cash: Optional[CashDispenser] = None, metrics: Optional[MetricsRegistry] = None,
+                metrics_port: Optional[int] = None, group_commit: bool = False) -> None:
+    atm = ATM.from_handler(atm_handler, history=history, limits=limits, cash=cash)
+    if group_commit and atm.journal is not None:
+        # concurrent connections share fsyncs, handlers without a journal get the flusher below instead
+        atm.journal = GroupCommitter(atm.journal)
+    if metrics is not None:
+        metrics.instrument(atm, ATM_OPERATIONS, "atm_operation")
+    flusher = BackgroundFlusher.attach(atm, atm_handler, flush_interval, flush_threshold)
+    server = ATMServer(atm, atm_handler, flusher=flusher, metrics=metrics)
+    await server.start(host, port)
+    if metrics is not None and metrics.enabled and metrics_port is not None:
+        await server.start_metrics(host, metrics_port)
+    try:
+        await server.serve_forever()
+    finally:
+        await server.close()
@@ -0,0 +1,37 @@
+import itertools
+import json
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Union
+
+
+# Outcome of a batch: how many operations were applied and why the others were rejected (by index in the batch)
+@dataclass
+class BatchResult:
+    applied: int = 0
+    failures: Dict[int, str] = field(default_factory=dict)
+
+    def merge(self, other: "BatchResult", offset: int) -> None:
+        self.applied += other.applied
+        self.failures.update({offset + index: message for index, message in other.failures.items()})
+
+
+# Settlement file reader - one JSON operation per line, read lazily so the file is never fully in memory.
+# A malformed line is yielded as a ValueError, apply_batch reports it as a failure of that operation.
+def read_operations(path: str) -> Iterator[Union[Dict, ValueError]]:
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                yield ValueError(f"Line {line_number}: {e}")
+
+
+def chunked(operations: Iterable, chunk_size: int) -> Iterator[List]:
+    iterator = iter(operations)
+    while True:
+        chunk = list(itertools.islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
@@ -0,0 +1,74 @@
+import argparse
+import logging
+import os
+import tempfile
+import time
+from typing import List
+
+from atm import ATM
+from atm_handler.atm_file_handler import AtmFileHandler
+from benchmarks.common import print_table
+from benchmarks.datasets import Dataset
+from benchmarks.workload import WorkloadDriver, generate_operations
+from cluster import ATMCluster, ClusterATM
+from password_hasher import PasswordHasher
+
+
+def run_worker(atm: ClusterATM, operations: List[dict], workers: int, kdf_iterations: int, results) -> None:
+    # the worker's index (its slot in the ledger's response queues) picks its slice of the operations
+    atm.password_hasher = PasswordHasher(iterations=kdf_iterations)
+    driver = WorkloadDriver(atm)
+    part = operations[atm.ledger.worker::workers]
+    start = time.perf_counter()
+    for operation in part:
+        driver.run_one(operation)
+    results.put((len(part), start, time.perf_counter()))
+
+
+def single_process(data_file: str, operations: List[dict], kdf_iterations: int) -> float:
+    handler = AtmFileHandler(data_file=data_file)
+    atm = ATM.from_handler(handler, password_hasher=PasswordHasher(iterations=kdf_iterations))
+    return WorkloadDriver(atm).run(operations)
+
+
+def clustered(data_file: str, operations: List[dict], workers: int, kdf_iterations: int) -> float:
+    cluster = ATMCluster(AtmFileHandler(data_file=data_file), workers=workers)
+    results = cluster.context.Queue()
+    cluster.start()
+    cluster.run_workers(run_worker, operations, workers, kdf_iterations, results)
+    cluster.join()
+    cluster.stop()
+    parts = [results.get() for _ in range(workers)]
+    # wall clock from the first worker's start to the last worker's end
+    return sum(count for count, _, _ in parts) / (max(end for _, _, end in parts) - min(start for _, start, _ in parts))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Session throughput of the worker / ledger cluster")
+    parser.add_argument('--accounts', type=int, default=10_000)
+    parser.add_argument('--operations', type=int, default=20_000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--login-share', type=int, default=20, help="percent of the operations that are logins")
+    parser.add_argument('--kdf-iterations', type=int, default=20_000,
+                        help="PBKDF2 iterations, the login cost is what the workers spread over the cores")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    hasher = PasswordHasher(iterations=args.kdf_iterations)
+    dataset = Dataset(max(1, args.accounts // 2), args.accounts).generate()
+    rest = (100 - args.login_share) / 4
+    mix = {"authenticate": args.login_share, "balance": rest, "withdraw": rest, "deposit": rest, "transfer": rest}
+    operations = list(generate_operations(dataset, args.operations, mix=mix))
+    with tempfile.TemporaryDirectory() as directory:
+        data_file = os.path.join(directory, "data.json")
+        dataset.write(data_file, hasher)
+        rows = [("single process", f"{single_process(data_file, operations, args.kdf_iterations):,.0f}")]
+        for workers in args.workers:
+            rows.append((f"{workers} workers + ledger",
+                         f"{clustered(data_file, operations, workers, args.kdf_iterations):,.0f}"))
+    print(f"{args.operations:,} operations, {args.login_share}% logins, {os.cpu_count()} cores")
+    print_table(("", "ops/s"), rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+import argparse
+import time
+from dataclasses import asdict, dataclass
+
+from account_store import ColumnarAccountStore
+from benchmarks.common import make_raw_accounts, measure, print_table
+from dao import Account
+
+
+# a plain (pre-slots) dataclass Account, kept here as the baseline
+@dataclass
+class DictAccount:
+    owner_id: str
+    balance_cents: int
+    account_id: str
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Account representation memory / serialization benchmark")
+    parser.add_argument('--accounts', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    raw = make_raw_accounts(args.accounts)
+    builders = {
+        "dataclass (__dict__)": lambda: {aid: DictAccount(info["owner_id"], info["balance_cents"], info["account_id"])
+                                         for aid, info in raw.items()},
+        "dataclass (slots)": lambda: {aid: Account.from_dict(info) for aid, info in raw.items()},
+        "columnar store": lambda: ColumnarAccountStore.from_dict(raw),
+    }
+    serializers = {
+        "dataclass (__dict__)": lambda accounts: {aid: asdict(acc) for aid, acc in accounts.items()},
+        "dataclass (slots)": lambda accounts: {aid: acc.to_dict() for aid, acc in accounts.items()},
+        "columnar store": lambda accounts: accounts.to_dict(),
+    }
+
+    rows = []
+    for name, build in builders.items():
+        accounts, load_seconds, memory = measure(build)
+        start = time.perf_counter()
+        serializers[name](accounts)
+        to_dict_seconds = time.perf_counter() - start
+        rows.append((name, f"{memory / 2 ** 20:.1f} MiB", f"{memory / args.accounts:.0f} B",
+                     f"{load_seconds:.2f}s", f"{to_dict_seconds:.2f}s"))
+        del accounts
+    print(f"{args.accounts:,} accounts")
+    print_table(("representation", "memory", "per account", "from_dict", "to_dict"), rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+import argparse
+import random
+import time
+
+from benchmarks.common import print_table
+from cash_dispenser import CashDispenser, solve_notes
+from config import CASSETTES
+
+
+def plan_us(cash: CashDispenser, amounts, clear_cache: bool) -> float:
+    start = time.perf_counter()
+    for amount in amounts:
+        if clear_cache:
+            solve_notes.cache_clear()
+        cash.plan(amount)
+    return (time.perf_counter() - start) / len(amounts) * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Note dispensing solver latency")
+    parser.add_argument('--plans', type=int, default=10_000)
+    parser.add_argument('--max-amount', type=int, default=800, help="largest withdrawal in major units")
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    # multiples of 10.00, some of them (e.g. 10.00, 30.00) can't be paid with 20 / 50 / 100 notes
+    amounts = [rng.randrange(1, args.max_amount // 10 + 1) * 1000 for _ in range(args.plans)]
+    rows = []
+    for name, cassettes in (("full cassettes", dict(CASSETTES)), ("low on 50s and 100s", {2000: 1000, 5000: 3, 10000: 1})):
+        cash = CashDispenser(cassettes)
+        rows.append((name, f"{plan_us(cash, amounts, clear_cache=True):,.1f} us",
+                     f"{plan_us(cash, amounts, clear_cache=False):,.1f} us"))
+    print(f"{args.plans:,} withdrawals up to {args.max_amount:,}")
+    print_table(("", "solver", "memoized"), rows)
+
+
+if __name__ == '__main__':
+    main()
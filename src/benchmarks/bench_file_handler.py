@@ -0,0 +1,87 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Tuple
+
+from atm_handler.atm_file_handler import AtmFileHandler
+from atm_handler.json_stream import write_sections
+from benchmarks.common import make_raw_accounts, print_table
+from dao import Account, Password, User
+
+
+def peak(func: Callable[[], object]) -> Tuple[float, int]:
+    # (seconds, peak traced bytes) - timed on a separate run, tracemalloc slows allocations down
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    func()
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak_bytes
+
+
+def write_dataset(path: str, accounts_count: int) -> None:
+    raw_accounts = make_raw_accounts(accounts_count)
+    owners = {info["owner_id"] for info in raw_accounts.values()}
+    with open(path, 'w', encoding='utf-8') as f:
+        write_sections(f, [
+            ("users", ((uid, {"user_id": uid, "name": f"user {uid}", "email": ""}) for uid in owners)),
+            ("passwords", ((uid, {"user_id": uid, "password": uid}) for uid in owners)),
+            ("accounts", raw_accounts.items()),
+        ])
+
+
+def json_load(path: str):
+    # the previous AtmFileHandler: json.load, then a second full copy as dao objects
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    return (data,
+            {uid: User.from_dict(info) for uid, info in data["users"].items()},
+            {uid: Password.from_dict(info) for uid, info in data["passwords"].items()},
+            {aid: Account.from_dict(info) for aid, info in data["accounts"].items()})
+
+
+def json_dump(path: str, users, passwords, accounts) -> None:
+    with open(path, 'w', encoding='utf-8') as f:
+        json_data = {
+            "users": {uid: user.to_dict() for uid, user in users.items()},
+            "passwords": {uid: pw.to_dict() for uid, pw in passwords.items()},
+            "accounts": {aid: acc.to_dict() for aid, acc in accounts.items()}
+        }
+        json.dump(json_data, f, indent=2, ensure_ascii=False)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="AtmFileHandler load / save benchmark")
+    parser.add_argument('--accounts', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "data.json")
+        out_path = os.path.join(directory, "out.json")
+        write_dataset(path, args.accounts)
+        print(f"{args.accounts:,} accounts, {os.path.getsize(path) / 2 ** 20:.0f} MiB file")
+
+        handler = AtmFileHandler(data_file=path)
+        handler.load_data()
+        users, passwords, accounts = handler.get_users(), handler.get_passwords(), handler.get_accounts()
+
+        rows = []
+        for name, func in [
+            ("load: json.load + dao copy", lambda: json_load(path)),
+            ("load: streaming", lambda: AtmFileHandler(data_file=path).load_data()),
+            ("load: streaming, columnar", lambda: AtmFileHandler(data_file=path, columnar=True).load_data()),
+            ("save: json.dump(indent=2)", lambda: json_dump(out_path, users, passwords, accounts)),
+            ("save: streaming", lambda: AtmFileHandler(data_file=out_path).save_data(users, passwords, accounts)),
+        ]:
+            elapsed, peak_bytes = peak(func)
+            rows.append((name, f"{elapsed:.2f}s", f"{peak_bytes / 2 ** 20:.0f} MiB"))
+        print_table(("operation", "time", "peak memory"), rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+import argparse
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import Optional
+
+from atm import ATM
+from atm_handler.atm_journal_handler import AtmJournalHandler
+from benchmarks.common import print_table
+from dao import Account, Password, User
+from group_commit import GroupCommitter
+
+
+def make_handler(directory: str, sessions: int) -> AtmJournalHandler:
+    # one account per session, so the sessions never wait on each other's account locks
+    handler = AtmJournalHandler(data_file=os.path.join(directory, "data.json"), compact_every=10 ** 9)
+    handler.save_data({"user": User(user_id="user", name="user")},
+                      {"user": Password(user_id="user", password="password")},
+                      {str(i): Account(account_id=str(i), owner_id="user", balance_cents=0) for i in range(sessions)})
+    return handler
+
+
+def deposits_per_second(sessions: int, operations: int, max_wait: Optional[float], max_batch: int) -> tuple:
+    # max_wait None - every deposit is fsync'd on its own
+    with tempfile.TemporaryDirectory() as directory:
+        handler = make_handler(directory, sessions)
+        atm = ATM.from_handler(handler)
+        committer = None
+        if max_wait is not None:
+            atm.journal = committer = GroupCommitter(atm.journal, max_batch=max_batch, max_wait=max_wait)
+        session = atm.login("user", "password")
+        per_session = operations // sessions
+
+        def work(account_id: str) -> None:
+            for _ in range(per_session):
+                session.deposit(account_id, 100)
+
+        threads = [threading.Thread(target=work, args=(str(i),)) for i in range(sessions)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        handler.close()
+    done = per_session * sessions
+    return done / elapsed, committer.batches if committer is not None else done
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Durable deposits per second with and without group commit")
+    parser.add_argument('--sessions', type=int, default=32, help="concurrent sessions (threads)")
+    parser.add_argument('--operations', type=int, default=5_000)
+    parser.add_argument('--max-batch', type=int, default=128)
+    parser.add_argument('--windows', type=float, nargs='+', default=[0.0, 0.0005, 0.001, 0.002, 0.005],
+                        help="max_wait values (seconds) to try")
+    args = parser.parse_args()
+
+    # the login (and its password rehash) logs at INFO
+    logging.getLogger().setLevel(logging.WARNING)
+    rows = []
+    for max_wait in [None] + args.windows:
+        rate, fsyncs = deposits_per_second(args.sessions, args.operations, max_wait, args.max_batch)
+        label = "fsync per operation" if max_wait is None else f"group commit, max wait {max_wait * 1000:g} ms"
+        rows.append((label, f"{rate:,.0f}", f"{fsyncs:,}",
+                     f"{args.operations // args.sessions * args.sessions / fsyncs:,.1f}"))
+    print(f"{args.sessions} sessions, {args.operations:,} deposits, journal handler")
+    print_table(("", "ops/s", "fsyncs", "records / fsync"), rows)
+
+
+if __name__ == '__main__':
+    main()
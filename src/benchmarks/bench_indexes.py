@@ -0,0 +1,72 @@
+import argparse
+import heapq
+import random
+import time
+
+from atm import ATM
+from benchmarks.common import make_raw_accounts, print_table
+from dao import Account, Password, User
+
+
+def per_call(func, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Secondary indexes vs full scans")
+    parser.add_argument('--accounts', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--workers', type=int, default=4, help="processes for the parallel rebuild")
+    args = parser.parse_args()
+
+    raw = make_raw_accounts(args.accounts)
+    accounts = {aid: Account.from_dict(info) for aid, info in raw.items()}
+    owners = {account.owner_id for account in accounts.values()}
+    users = {oid: User(user_id=oid, name=f"user {oid}", email=f"user{oid}@example.com") for oid in owners}
+    atm = ATM(users, {oid: Password(user_id=oid, password="x") for oid in owners}, accounts)
+    del raw
+
+    rows = []
+    for workers in (1, args.workers):
+        start = time.perf_counter()
+        atm.rebuild_indexes(workers=workers)
+        rows.append((f"rebuild ({workers} worker{'s' if workers > 1 else ''})", "",
+                     f"{time.perf_counter() - start:.2f}s", ""))
+
+    rng = random.Random(1)
+    owner, email = rng.choice(sorted(owners)), f"user{rng.choice(sorted(owners))}@example.com"
+    low, high = 500_000, 510_000
+    queries = [
+        ("accounts of an owner",
+         lambda: [a for a in accounts.values() if a.owner_id == owner],
+         lambda: atm.accounts_by_owner[owner]),
+        ("user by email",
+         lambda: next(u for u in users.values() if u.email == email),
+         lambda: atm.indexes.user_by_email(email)),
+        ("balance band",
+         lambda: sorted((a.balance_cents, aid) for aid, a in accounts.items() if low <= a.balance_cents <= high),
+         lambda: atm.indexes.accounts_in_balance_range(low, high)),
+        ("top 10 balances",
+         lambda: heapq.nlargest(10, ((a.balance_cents, aid) for aid, a in accounts.items())),
+         lambda: atm.indexes.top_balances(10)),
+    ]
+    for name, scan, indexed in queries:
+        scan_seconds = per_call(scan, max(1, args.repeat // 10))
+        index_seconds = per_call(indexed, args.repeat * 100)
+        rows.append((name, f"{scan_seconds * 1e3:.1f}ms", f"{index_seconds * 1e6:.1f}us",
+                     f"{scan_seconds / index_seconds:,.0f}x"))
+
+    atm.authenticate(owner, "x")
+    account_id = atm.accounts_by_owner[owner][0].account_id
+    update_seconds = per_call(lambda: atm.deposit(account_id, 100), args.repeat * 100)
+    rows.append(("deposit (keeps indexes current)", "", f"{update_seconds * 1e6:.1f}us", ""))
+
+    print(f"{args.accounts:,} accounts")
+    print_table(("", "full scan", "index", "speedup"), rows)
+
+
+if __name__ == '__main__':
+    main()
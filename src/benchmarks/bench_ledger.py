@@ -0,0 +1,53 @@
+import argparse
+import os
+import tempfile
+import time
+
+from atm import ATM
+from atm_handler.atm_file_handler import AtmFileHandler
+from atm_handler.atm_ledger_handler import AtmLedgerHandler
+from atm_handler.ledger_file import convert_json_to_ledger
+from benchmarks.bench_file_handler import write_dataset
+from benchmarks.common import print_table
+
+
+def cold_start(make_handler, user_id: str):
+    # handler -> ATM -> first balance, what a restarted ATM pays before serving the first customer
+    start = time.perf_counter()
+    handler = make_handler()
+    atm = ATM.from_handler(handler)
+    atm._get_balance(user_id)
+    return handler, time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Cold start: data.json vs the binary account ledger")
+    parser.add_argument('--accounts', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        data_file = os.path.join(directory, "data.json")
+        ledger_file = os.path.join(directory, "data.ledger")
+        users_file = os.path.join(directory, "data.ledger.users.json")
+        write_dataset(data_file, args.accounts)
+        start = time.perf_counter()
+        convert_json_to_ledger(data_file, ledger_file, users_file)
+        convert_seconds = time.perf_counter() - start
+
+        user_id = str(args.accounts // 4)
+        rows = []
+        for name, make_handler in (("data.json (file mode)", lambda: AtmFileHandler(data_file=data_file)),
+                                   ("ledger", lambda: AtmLedgerHandler(ledger_file=ledger_file,
+                                                                       users_file=users_file))):
+            handler, seconds = cold_start(make_handler, user_id)
+            rows.append((name, f"{seconds:.3f}s"))
+            handler.close()
+
+        print(f"{args.accounts:,} accounts, {os.path.getsize(data_file) / 2 ** 20:.0f} MiB data.json, "
+              f"{os.path.getsize(ledger_file) / 2 ** 20:.0f} MiB ledger + "
+              f"{os.path.getsize(users_file) / 2 ** 20:.0f} MiB users file, converted in {convert_seconds:.2f}s")
+        print_table(("", "cold start + first balance"), rows)
+
+
+if __name__ == '__main__':
+    main()
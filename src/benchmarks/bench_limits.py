@@ -0,0 +1,69 @@
+import argparse
+import time
+
+from atm import ATM
+from benchmarks.common import print_table
+from dao import Account, Password, User
+from limits import WithdrawalLimits
+
+
+class Clock:
+    # moves one second per call, so the windows keep rolling during the run
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        self.now += 1.0
+        return self.now
+
+
+def make_atm(accounts: int, limits: WithdrawalLimits = None) -> ATM:
+    return ATM({"user": User(user_id="user", name="user")},
+               {"user": Password(user_id="user", password="password")},
+               {str(i): Account(owner_id="user", balance_cents=10 ** 15, account_id=str(i)) for i in range(accounts)},
+               limits=limits)
+
+
+def unreachable_limits() -> WithdrawalLimits:
+    # the default windows without a cap, no operation is ever rejected and every call runs the full check
+    limits = WithdrawalLimits(clock=Clock())
+    for rule in limits.rules:
+        rule.max_amount_cents = rule.max_count = None
+    return limits
+
+
+def reserve_ns(accounts: int, operations: int) -> float:
+    limits = unreachable_limits()
+    start = time.perf_counter()
+    for i in range(operations):
+        limits.reserve("user", str(i % accounts), 100)
+    return (time.perf_counter() - start) / operations * 1e9
+
+
+def withdrawals_per_second(accounts: int, operations: int, limits: WithdrawalLimits = None) -> float:
+    session = make_atm(accounts, limits).login("user", "password")
+    start = time.perf_counter()
+    for i in range(operations):
+        session.withdraw(str(i % accounts), 100)
+    return operations / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Cost of the withdrawal limit checks on the hot path")
+    parser.add_argument('--accounts', type=int, default=1000)
+    parser.add_argument('--operations', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    # the check must not grow with the number of past operations
+    print_table(("past operations", "reserve"),
+                [(f"{operations:,}", f"{reserve_ns(args.accounts, operations):,.0f} ns") for operations in args.operations])
+
+    operations = args.operations[0]
+    print()
+    print_table(("", "withdrawals"),
+                [("no limits", f"{withdrawals_per_second(args.accounts, operations):,.0f}/s"),
+                 ("limits", f"{withdrawals_per_second(args.accounts, operations, unreachable_limits()):,.0f}/s")])
+
+
+if __name__ == '__main__':
+    main()
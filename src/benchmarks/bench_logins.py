@@ -0,0 +1,51 @@
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from atm import ATM
+from benchmarks.common import print_table
+from dao import Account, Password, User
+from password_hasher import PasswordHasher, VerificationCache
+
+
+def make_atm(users: int, hasher: PasswordHasher) -> ATM:
+    # the same hash for everybody keeps the setup fast, the salt only matters against an offline attacker
+    stored = hasher.hash("password")
+    return ATM({str(i): User(user_id=str(i), name=f"user {i}") for i in range(users)},
+               {str(i): Password(user_id=str(i), password=stored) for i in range(users)},
+               {str(i): Account(owner_id=str(i), balance_cents=0, account_id=str(i)) for i in range(users)},
+               password_hasher=hasher)
+
+
+def logins_per_second(atm: ATM, users: int, logins: int, threads: int) -> float:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(lambda i: atm.login(str(i % users), "password"), range(logins)))
+    return logins / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Login throughput with hashed passwords")
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--logins', type=int, default=1000)
+    parser.add_argument('--iterations', type=int, default=None, help="PBKDF2 iterations (default from config)")
+    parser.add_argument('--threads', type=int, default=32, help="concurrent sessions")
+    parser.add_argument('--kdf-workers', type=int, default=4)
+    args = parser.parse_args()
+
+    rows = []
+    for name, cache_size in (("no cache", 0), ("verification cache", args.users)):
+        hasher = PasswordHasher(iterations=args.iterations, max_workers=args.kdf_workers,
+                                cache=VerificationCache(max_size=cache_size))
+        atm = make_atm(args.users, hasher)
+        # cold - every user pays the KDF once, warm - repeated logins within the cache TTL
+        cold = logins_per_second(atm, args.users, args.users, args.threads)
+        warm = logins_per_second(atm, args.users, args.logins, args.threads)
+        rows.append((name, f"{cold:,.0f}/s", f"{warm:,.0f}/s"))
+        hasher.close()
+    print(f"{args.users:,} users, {args.logins:,} logins, {args.threads} threads, {args.kdf_workers} KDF workers")
+    print_table(("", "first login", "repeated logins"), rows)
+
+
+if __name__ == '__main__':
+    main()
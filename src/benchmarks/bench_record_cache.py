@@ -0,0 +1,60 @@
+import argparse
+import os
+import random
+import tempfile
+import time
+from typing import Callable, List
+
+from atm_handler.atm_sqlite_handler import AtmSqliteHandler
+from benchmarks.common import print_table
+from benchmarks.datasets import skewed_index
+from dao import Account, Password, User
+from lazy_mapping import CachedMapping
+
+
+def make_backend(directory: str, accounts: int) -> AtmSqliteHandler:
+    backend = AtmSqliteHandler(db_file=os.path.join(directory, "data.db"))
+    backend.save_data({"user": User(user_id="user", name="user")},
+                      {"user": Password(user_id="user", password="password")},
+                      {str(i): Account(account_id=str(i), owner_id="user", balance_cents=i) for i in range(accounts)})
+    return backend
+
+
+def lookups_per_second(lookup: Callable[[str], object], keys: List[str]) -> float:
+    start = time.perf_counter()
+    for key in keys:
+        lookup(key)
+    return len(keys) / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Account lookups over sqlite with and without the record cache")
+    parser.add_argument('--accounts', type=int, default=200_000)
+    parser.add_argument('--lookups', type=int, default=200_000)
+    parser.add_argument('--skew', type=float, default=1.1, help="zipf-like skew of the looked up accounts")
+    parser.add_argument('--max-entries', type=int, nargs='+', default=[1_000, 10_000, 100_000])
+    parser.add_argument('--unknown', type=int, default=100, help="distinct unknown ids in the negative lookups")
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    keys = [str(skewed_index(rng, args.accounts, args.skew)) for _ in range(args.lookups)]
+    unknown = [f"missing {rng.randrange(args.unknown)}" for _ in range(args.lookups)]
+    with tempfile.TemporaryDirectory() as directory:
+        backend = make_backend(directory, args.accounts)
+        table = backend.get_accounts()
+        # a query per lookup - what every cold row costs
+        rows = [("no cache (query per lookup)", f"{lookups_per_second(table.loader, keys):,.0f}", "-", "-",
+                 f"{lookups_per_second(table.__contains__, unknown):,.0f}")]
+        for max_entries in args.max_entries:
+            cache = CachedMapping(table, max_entries=max_entries, negative_entries=args.unknown)
+            rate = lookups_per_second(cache.__getitem__, keys)
+            negative = lookups_per_second(cache.__contains__, unknown)
+            rows.append((f"LRU {max_entries:,} rows", f"{rate:,.0f}", f"{cache.stats.hit_ratio:.1%}",
+                         f"{cache.cached:,}", f"{negative:,.0f}"))
+        backend.close()
+    print(f"{args.lookups:,} lookups over {args.accounts:,} accounts, skew {args.skew}")
+    print_table(("", "lookups/s", "hit ratio", "rows held", "unknown ids/s"), rows)
+
+
+if __name__ == '__main__':
+    main()
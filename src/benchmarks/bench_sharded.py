@@ -0,0 +1,47 @@
+import argparse
+import os
+import tempfile
+import time
+
+from atm_handler.atm_file_handler import AtmFileHandler
+from atm_handler.atm_sharded_handler import AtmShardedHandler
+from benchmarks.bench_file_handler import write_dataset
+from benchmarks.common import print_table
+
+
+def timed(func) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Sharded load / save vs a single data.json")
+    parser.add_argument('--accounts', type=int, default=1_000_000)
+    parser.add_argument('--shards', type=int, default=4)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        data_file = os.path.join(directory, "data.json")
+        write_dataset(data_file, args.accounts)
+        single = AtmFileHandler(data_file=data_file)
+        rows = [("single file", "-", f"{timed(single.load_data):.2f}s",
+                 f"{timed(lambda: single.save_data(single.users, single.passwords, single.accounts)):.2f}s")]
+
+        AtmShardedHandler(data_file=data_file, shard_count=args.shards, workers=1).save_data(
+            single.users, single.passwords, single.accounts)
+        single = None
+        for workers in args.workers:
+            handler = AtmShardedHandler(data_file=data_file, shard_count=args.shards, workers=workers)
+            load_seconds = timed(handler.load_data)
+            save_seconds = timed(handler.compact)
+            rows.append((f"{args.shards} shards", workers, f"{load_seconds:.2f}s", f"{save_seconds:.2f}s"))
+            del handler
+
+    print(f"{args.accounts:,} accounts, {os.cpu_count()} cores")
+    print_table(("", "workers", "load", "save"), rows)
+
+
+if __name__ == '__main__':
+    main()
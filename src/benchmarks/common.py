@@ -0,0 +1,38 @@
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Tuple
+
+
+# Shared helpers for the benchmark scripts, run them from src/: python -m benchmarks.<name>
+
+def make_raw_accounts(count: int, accounts_per_owner: int = 2) -> Dict[str, Dict]:
+    # the data.json "accounts" section
+    return {str(i): {"owner_id": str(i // accounts_per_owner), "balance_cents": (i % 10000) * 100 + 50, "account_id": str(i)}
+            for i in range(count)}
+
+
+def measure(func: Callable[[], object]) -> Tuple[object, float, int]:
+    # returns (result, seconds, bytes allocated and still alive when func returned)
+    # func runs twice - tracemalloc slows allocations down too much to time the same run
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    result = func()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, current
+
+
+@contextmanager
+def timer(label: str) -> Iterator[None]:
+    start = time.perf_counter()
+    yield
+    print(f"{label}: {time.perf_counter() - start:.3f}s")
+
+
+def print_table(headers, rows) -> None:
+    widths = [max(len(str(cell)) for cell in column) for column in zip(headers, *rows)]
+    for row in [headers] + list(rows):
+        print("  ".join(str(cell).ljust(width) for cell, width in zip(row, widths)))
@@ -0,0 +1,62 @@
+import random
+from array import array
+from dataclasses import dataclass
+from typing import Iterator, Tuple
+
+from atm_handler.json_stream import write_sections
+from password_hasher import PasswordHasher
+
+# every generated user has this password, stored under one shared hash (hashing millions of salts would take hours)
+PASSWORD = "password"
+
+
+def skewed_index(rng: random.Random, n: int, skew: float) -> int:
+    # 0..n-1, skew 0 is uniform, the larger the skew the more the low indexes are favoured (zipf-like, s = skew).
+    # inverse CDF of the continuous power law, O(1) time and memory whatever n is
+    if skew <= 0:
+        return rng.randrange(n)
+    u = rng.random()
+    if skew == 1:
+        x = n ** u
+    else:
+        x = ((n ** (1 - skew) - 1) * u + 1) ** (1 / (1 - skew))
+    return min(int(x) - 1, n - 1)
+
+
+# A synthetic bank: users "0".."users-1", accounts "0".."accounts-1", every user owns at least one account,
+# the remaining accounts go to owners drawn with owner_skew (a few users with many accounts).
+@dataclass
+class Dataset:
+    users: int
+    accounts: int
+    owner_skew: float = 0.0
+    seed: int = 1
+    # owner of every account, filled by generate()
+    owners: array = None
+
+    def generate(self) -> "Dataset":
+        if self.accounts < self.users:
+            raise ValueError("Every user needs an account, accounts must be >= users.")
+        rng = random.Random(self.seed)
+        self.owners = array('l', range(self.users))
+        self.owners.extend(skewed_index(rng, self.users, self.owner_skew) for _ in range(self.accounts - self.users))
+        return self
+
+    def balance_of(self, account: int) -> int:
+        return (account * 7919 % 100000) * 100
+
+    def account_entries(self) -> Iterator[Tuple[str, dict]]:
+        for account, owner in enumerate(self.owners):
+            yield str(account), {"owner_id": str(owner), "balance_cents": self.balance_of(account),
+                                 "account_id": str(account)}
+
+    def write(self, path: str, hasher: PasswordHasher) -> None:
+        # the data.json layout, streamed - the whole file is never built in memory
+        stored = hasher.hash(PASSWORD)
+        with open(path, 'w', encoding='utf-8') as f:
+            write_sections(f, [
+                ("users", ((str(u), {"user_id": str(u), "name": f"user {u}", "email": f"user{u}@example.com"})
+                           for u in range(self.users))),
+                ("passwords", ((str(u), {"user_id": str(u), "password": stored}) for u in range(self.users))),
+                ("accounts", self.account_entries()),
+            ])
@@ -0,0 +1,162 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+from atm import ATM
+from atm_cli import ATMCLI
+from atm_handler.atm_file_handler import AtmFileHandler
+from atm_handler.atm_handler import AtmHandler
+from atm_handler.atm_journal_handler import AtmJournalHandler
+from atm_handler.atm_sqlite_handler import AtmSqliteHandler
+from benchmarks.common import print_table
+from benchmarks.datasets import Dataset
+from benchmarks.workload import WorkloadDriver, generate_operations, run_cli, run_headless
+from metrics import ATM_OPERATIONS, HANDLER_OPERATIONS, MetricsRegistry
+from password_hasher import PasswordHasher
+
+MODES = ("file", "columnar", "journal", "sqlite")
+
+
+# End to end suite: synthetic dataset -> handler load -> mixed workload on ATM (and optionally through ATMCLI)
+# -> handler save, with throughput and p50 / p99 per operation written as JSON. Run it from src/:
+#   python -m benchmarks.run_suite --accounts 1000000 --output results.json
+#   python -m benchmarks.run_suite --accounts 1000000 --baseline results.json   (exit code 1 on a regression)
+def make_handler(mode: str, directory: str, data_file: str) -> AtmHandler:
+    if mode == "journal":
+        return AtmJournalHandler(data_file=data_file, journal_file=os.path.join(directory, "data.journal"))
+    if mode == "sqlite":
+        handler = AtmSqliteHandler(db_file=os.path.join(directory, "data.db"))
+        source = AtmFileHandler(data_file=data_file)
+        handler.save_data(source.get_users(), source.get_passwords(), source.get_accounts())
+        return handler
+    return AtmFileHandler(data_file=data_file, columnar=mode == "columnar")
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args: argparse.Namespace) -> Dict:
+    hasher = PasswordHasher(iterations=args.kdf_iterations)
+    dataset = Dataset(args.users or max(1, args.accounts // 2), args.accounts, args.owner_skew, args.seed).generate()
+    operations = list(generate_operations(dataset, args.operations, account_skew=args.account_skew,
+                                          seed=args.seed + 1))
+    results: Dict = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "params": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        "throughput": {},
+    }
+    with tempfile.TemporaryDirectory(dir=args.workdir) as directory:
+        data_file = os.path.join(directory, "data.json")
+        start = time.perf_counter()
+        dataset.write(data_file, hasher)
+        results["generate_seconds"] = time.perf_counter() - start
+        results["data_file_bytes"] = os.path.getsize(data_file)
+
+        metrics = MetricsRegistry()
+        handler = make_handler(args.mode, directory, data_file)
+        metrics.instrument(handler, HANDLER_OPERATIONS, "atm_storage")
+        handler.load_data()
+        atm = ATM.from_handler(handler, password_hasher=hasher)
+        metrics.instrument(atm, ATM_OPERATIONS, "atm_operation")
+        driver = WorkloadDriver(atm)
+        results["throughput"]["atm"] = driver.run(operations, args.threads)
+        results["failures"] = driver.failures
+        handler.save_data(atm.get_users(), atm.get_passwords(), atm.get_accounts())
+        if hasattr(handler, "close"):
+            handler.close()
+
+        if args.cli_operations:
+            cli_handler = make_handler(args.mode, directory, data_file)
+            cli = ATMCLI(atm_handler=cli_handler, flush_interval=None)
+            cli.atm.password_hasher = hasher
+            results["throughput"]["cli"] = run_cli(cli, operations[:args.cli_operations])
+            headless_handler = make_handler(args.mode, directory, data_file)
+            headless = ATMCLI(atm_handler=headless_handler, flush_interval=None)
+            headless.atm.password_hasher = hasher
+            results["throughput"]["cli_headless"] = run_headless(headless, operations[:args.cli_operations])
+        results["latency"] = metrics.to_dict()
+    return results
+
+
+def regressions(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    # slower percentiles / lower throughput than the baseline by more than tolerance (0.2 = 20%)
+    found = []
+    for name, value in results["throughput"].items():
+        previous = baseline.get("throughput", {}).get(name)
+        if previous and value < previous * (1 - tolerance):
+            found.append(f"throughput {name}: {previous:,.0f}/s -> {value:,.0f}/s")
+    for metric, operations in results["latency"].items():
+        for operation, summary in operations.items():
+            previous = baseline.get("latency", {}).get(metric, {}).get(operation)
+            if previous is None:
+                continue
+            for percentile in ("p50", "p99"):
+                if previous[percentile] and summary[percentile] > previous[percentile] * (1 + tolerance):
+                    found.append(f"{metric} {operation} {percentile}: {previous[percentile] * 1e6:,.1f} us -> "
+                                 f"{summary[percentile] * 1e6:,.1f} us")
+    return found
+
+
+def print_results(results: Dict) -> None:
+    print(f"{results['params']['accounts']:,} accounts, {results['params']['operations']:,} operations, "
+          f"mode {results['params']['mode']}, {results['data_file_bytes'] / 2 ** 20:,.1f} MiB data file")
+    for name, value in results["throughput"].items():
+        print(f"throughput {name}: {value:,.0f} ops/s")
+    rows = [(f"{metric}.{operation}", f"{summary['count']:,}", f"{summary['errors']:,}",
+             f"{summary['p50'] * 1e6:,.1f} us", f"{summary['p99'] * 1e6:,.1f} us", f"{summary['max'] * 1e6:,.1f} us")
+            for metric, operations in results["latency"].items() for operation, summary in operations.items()]
+    print_table(("", "count", "errors", "p50", "p99", "max"), rows)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="ATM engine and handler benchmark suite")
+    parser.add_argument('--mode', default="file", choices=MODES)
+    parser.add_argument('--accounts', type=int, default=100_000)
+    parser.add_argument('--users', type=int, default=None, help="default: accounts / 2")
+    parser.add_argument('--owner-skew', type=float, default=0.0, help="zipf exponent of accounts per user")
+    parser.add_argument('--account-skew', type=float, default=0.0, help="zipf exponent of the accounts operated on")
+    parser.add_argument('--operations', type=int, default=100_000)
+    parser.add_argument('--cli-operations', type=int, default=0,
+                        help="also replay this many through ATMCLI, interactive and headless")
+    parser.add_argument('--threads', type=int, default=1)
+    parser.add_argument('--kdf-iterations', type=int, default=1000,
+                        help="PBKDF2 iterations of the generated passwords, low so logins don't dominate the run")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--workdir', default=None, help="where the temporary data files go")
+    parser.add_argument('--output', help="write the results as JSON")
+    parser.add_argument('--baseline', help="results JSON of an earlier run to compare with")
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args()
+
+    # every login logs at INFO, that would be measured too
+    logging.getLogger().setLevel(logging.WARNING)
+    results = run(args)
+    print_results(results)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            found = regressions(results, json.load(f), args.tolerance)
+        for line in found:
+            print(f"REGRESSION {line}")
+        if found:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+import io
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional
+
+from atm import ATM
+from atm_cli import ATMCLI, BufferedIOInterface, IOInterface
+from benchmarks.datasets import PASSWORD, Dataset, skewed_index
+from exceptions import ATMError
+from money import format_cents
+from session import Session
+
+# share of every operation in the generated stream, authenticate is a fresh login
+DEFAULT_MIX = {"balance": 40, "withdraw": 20, "deposit": 20, "transfer": 15, "authenticate": 5}
+
+
+def generate_operations(dataset: Dataset, count: int, mix: Optional[Dict[str, int]] = None,
+                        account_skew: float = 0.0, seed: int = 2) -> Iterator[Dict]:
+    # operations in the protocol request format plus the user running them, the account an operation runs on is
+    # drawn with account_skew (hot accounts), the transfer counterparty uniformly
+    rng = random.Random(seed)
+    mix = mix or DEFAULT_MIX
+    kinds = list(mix)
+    weights = [mix[kind] for kind in kinds]
+    for kind in rng.choices(kinds, weights, k=count):
+        account = skewed_index(rng, dataset.accounts, account_skew)
+        user_id = str(dataset.owners[account])
+        amount = rng.randrange(1, 100) * 100
+        if kind == "transfer":
+            yield {"op": kind, "user_id": user_id, "from_account": str(account),
+                   "to_account": str(rng.randrange(dataset.accounts)), "amount": amount}
+        elif kind in ("withdraw", "deposit"):
+            yield {"op": kind, "user_id": user_id, "account_id": str(account), "amount": amount}
+        else:
+            yield {"op": kind, "user_id": user_id}
+
+
+# Replays an operation stream against an ATM, one session per user kept between operations.
+# Latencies are taken by the ATM's metrics instrumentation, the driver only counts and times the whole run.
+class WorkloadDriver:
+    def __init__(self, atm: ATM) -> None:
+        self.atm = atm
+        self.sessions: Dict[str, Session] = {}
+        self.failures = 0
+
+    def session_of(self, user_id: str) -> Session:
+        session = self.sessions.get(user_id)
+        if session is None:
+            session = self.sessions[user_id] = self.atm.login(user_id, PASSWORD)
+        return session
+
+    def run_one(self, operation: Dict) -> None:
+        kind, user_id = operation["op"], operation["user_id"]
+        try:
+            if kind == "authenticate":
+                self.sessions[user_id] = self.atm.login(user_id, PASSWORD)
+                return
+            session = self.session_of(user_id)
+            if kind == "balance":
+                session.get_balance()
+            elif kind == "withdraw":
+                session.withdraw(operation["account_id"], operation["amount"])
+            elif kind == "deposit":
+                session.deposit(operation["account_id"], operation["amount"])
+            elif kind == "transfer":
+                session.transfer(operation["from_account"], operation["to_account"], operation["amount"])
+        except ATMError:
+            self.failures += 1
+
+    def run(self, operations: List[Dict], threads: int = 1) -> float:
+        # returns operations per second
+        start = time.perf_counter()
+        if threads <= 1:
+            for operation in operations:
+                self.run_one(operation)
+        else:
+            # every thread gets its own slice, sessions of one user may be created twice, that is harmless
+            with ThreadPoolExecutor(max_workers=threads) as pool:
+                list(pool.map(lambda part: [self.run_one(op) for op in part],
+                              [operations[i::threads] for i in range(threads)]))
+        return len(operations) / (time.perf_counter() - start)
+
+
+class ScriptedIO(IOInterface):
+    # feeds ATMCLI a prepared list of answers, the printed output is only counted
+    def __init__(self, answers: List[str]) -> None:
+        self.answers = iter(answers)
+        self.printed = 0
+
+    def input(self, prompt: str) -> str:
+        return next(self.answers)
+
+    def print(self, message: str) -> None:
+        self.printed += 1
+
+    def flush(self) -> None:
+        pass
+
+
+def cli_script(operations: List[Dict]) -> List[str]:
+    # every operation is a login, one menu action and a logout, the way a customer uses the terminal
+    menu = {"balance": "1", "withdraw": "2", "deposit": "3", "transfer": "5"}
+    answers = []
+    for operation in operations:
+        kind = operation["op"]
+        answers += [operation["user_id"], PASSWORD]
+        if kind == "withdraw" or kind == "deposit":
+            answers += [menu[kind], operation["account_id"], format_cents(operation["amount"])]
+        elif kind == "transfer":
+            answers += [menu[kind], operation["from_account"], operation["to_account"],
+                        format_cents(operation["amount"])]
+        elif kind == "balance":
+            answers.append(menu[kind])
+        answers.append("7")
+    return answers + ["-1"]
+
+
+def run_cli(cli: ATMCLI, operations: List[Dict]) -> float:
+    # operations per second through the interactive menu, including the final save on exit
+    cli.io_interface = ScriptedIO(cli_script(operations))
+    start = time.perf_counter()
+    cli.run()
+    return len(operations) / (time.perf_counter() - start)
+
+
+def headless_script(operations: List[Dict]) -> str:
+    # the operations as ATMCLI.run_script input, a login whenever the user changes
+    lines = []
+    current = None
+    for operation in operations:
+        kind, user_id = operation["op"], operation["user_id"]
+        if kind == "authenticate" or user_id != current:
+            lines.append(json.dumps({"op": "login", "user_id": user_id, "password": PASSWORD}))
+            current = user_id
+        if kind != "authenticate":
+            lines.append(json.dumps({key: value for key, value in operation.items() if key != "user_id"}))
+    return "\n".join(lines) + "\n"
+
+
+def run_headless(cli: ATMCLI, operations: List[Dict]) -> float:
+    # operations per second through the headless JSONL mode, including the final save
+    cli.io_interface = BufferedIOInterface(io.StringIO(headless_script(operations)), io.StringIO())
+    start = time.perf_counter()
+    cli.run_script()
+    return len(operations) / (time.perf_counter() - start)
@@ -0,0 +1,75 @@
+import threading
+from functools import lru_cache, reduce
+from math import gcd
+from typing import Dict, MutableMapping, Optional, Tuple
+
+from config import DISPENSE_CACHE_SIZE, MAX_NOTES_PER_WITHDRAWAL
+
+
+@lru_cache(maxsize=DISPENSE_CACHE_SIZE)
+def solve_notes(amount: int, denominations: Tuple[int, ...], counts: Tuple[int, ...],
+                max_notes: int) -> Optional[Tuple[int, ...]]:
+    # bounded change-making: notes per denomination (denominations descending) summing to amount with the fewest
+    # notes, None if there is no way to pay it. Depth first from the largest note, a branch is cut as soon as
+    # it can't beat the best solution found so far (it needs at least ceil(remaining / note) more notes).
+    best: Optional[Tuple[int, ...]] = None
+    best_notes = max_notes + 1
+    chosen = [0] * len(denominations)
+
+    def search(index: int, remaining: int, notes: int) -> None:
+        nonlocal best, best_notes
+        if remaining == 0:
+            if notes < best_notes:
+                best, best_notes = tuple(chosen), notes
+            return
+        if index == len(denominations):
+            return
+        note = denominations[index]
+        if notes - (-remaining // note) >= best_notes:
+            return
+        for count in range(min(counts[index], remaining // note), -1, -1):
+            chosen[index] = count
+            search(index + 1, remaining - count * note, notes + count)
+        chosen[index] = 0
+
+    search(0, amount, 0)
+    return best
+
+
+# Note inventory of the machine: denomination (cents) -> notes left in its cassette.
+# counts is adopted, not copied - handlers that persist the inventory hand out the mapping they save (get_inventory).
+# plan() answers from the solver cache whenever the same amount was planned with enough notes of every kind: the
+# solver only sees each count capped at what the amount could use, so the cache key changes only when a cassette
+# runs low, not on every withdrawal.
+class CashDispenser:
+    def __init__(self, counts: MutableMapping[int, int], max_notes: int = MAX_NOTES_PER_WITHDRAWAL) -> None:
+        self.counts = counts
+        self.max_notes = max_notes
+        # held from planning a withdrawal until its commit, the machine dispenses one withdrawal at a time
+        self.lock = threading.Lock()
+
+    def plan(self, amount: int) -> Optional[Dict[int, int]]:
+        denominations = tuple(sorted((note for note, count in self.counts.items() if count > 0), reverse=True))
+        if not denominations or amount % reduce(gcd, denominations) != 0:
+            return None
+        counts = tuple(min(self.counts[note], amount // note, self.max_notes) for note in denominations)
+        notes = solve_notes(amount, denominations, counts, self.max_notes)
+        if notes is None:
+            return None
+        return {note: count for note, count in zip(denominations, notes) if count}
+
+    def take(self, plan: Dict[int, int]) -> Dict[str, int]:
+        # returns the after-image of the touched cassettes, in the journal record format
+        for note, count in plan.items():
+            self.counts[note] -= count
+        return {str(note): self.counts[note] for note in plan}
+
+    def put_back(self, plan: Dict[int, int]) -> None:
+        for note, count in plan.items():
+            self.counts[note] += count
+
+    def inventory(self) -> Dict[str, int]:
+        return {str(note): count for note, count in self.counts.items()}
+
+    def total_cents(self) -> int:
+        return sum(note * count for note, count in self.counts.items())
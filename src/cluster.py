@@ -0,0 +1,314 @@
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import queue
+import signal
+import sys
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+import exceptions
+from atm import ATM
+from atm_handler.atm_handler import AtmHandler
+from atm_server import ATMServer
+from cash_dispenser import CashDispenser
+from config import CLUSTER_WORKERS, LEDGER_BATCH_SIZE, LEDGER_TIMEOUT_SECONDS
+from dao import Password, User
+from exceptions import ATMError, InvalidAmountError, OutcomeUnknownError
+from flusher import BackgroundFlusher
+from limits import WithdrawalLimits
+from money import is_cents
+from password_hasher import PasswordHasher
+from transaction_history import StatementPage, TransactionHistory
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# request:  (worker, request_id, operation, args) on the shared request queue, STOP ends the ledger
+# response: ("acks", [(request_id, ok, result or (error type, message)), ...]) once per worker per batch,
+#           ("snapshot", users, passwords) first, ("passwords", {user_id: hash}) after a password change
+STOP = None
+
+# a timed out read failed, anything else may still be applied by the ledger after the worker gave up on it
+READ_OPERATIONS = {"balance", "statement", "login_counters"}
+
+
+def error_of(name: str, message: str) -> ATMError:
+    # the ledger's exception, rebuilt from its type name (exception objects don't always survive pickling)
+    error_class = getattr(exceptions, name, None)
+    if not (isinstance(error_class, type) and issubclass(error_class, ATMError)):
+        error_class = ATMError
+    return error_class(message)
+
+
+# Single writer of the cluster: owns the accounts (a plain ATM over the handler) and runs every balance read and
+# mutation in arrival order, so the serial consistency of ATM.transfer holds across all the worker processes.
+# Requests are drained in batches of up to batch_size, each worker gets one message with its acknowledgements
+# per batch instead of one per request.
+class Ledger:
+    def __init__(self, atm: ATM, responses: List[Any]) -> None:
+        self.atm = atm
+        self.responses = responses
+        self.password_updates: Dict[str, str] = {}
+        self.operations: Dict[str, Callable[..., Any]] = {
+            "balance": atm._get_balance,
+            "withdraw": atm._withdraw,
+            "deposit": atm._deposit,
+            "transfer": atm._transfer,
+            "statement": atm._get_statement,
+            "store_password": self.store_password,
+            # one login limiter for the whole cluster, per worker counters would give N x the allowed failures
+            "login_check": atm.login_limiter.check,
+            "login_failure": atm.login_limiter.record_failure,
+            "login_success": atm.login_limiter.record_success,
+            "login_counters": atm.login_limiter.counters,
+        }
+
+    def store_password(self, user_id: str, hashed: str) -> None:
+        self.atm._store_password(user_id, hashed)
+        self.password_updates[user_id] = hashed
+
+    def execute(self, operation: str, args: Tuple) -> Tuple[bool, Any]:
+        try:
+            return True, self.operations[operation](*args)
+        except ATMError as e:
+            return False, (type(e).__name__, str(e))
+        except Exception as e:
+            logging.error("Ledger operation '%s' failed: %s", operation, e)
+            return False, ("ATMError", f"{operation.capitalize()} failed due to an unexpected error.")
+
+    def send_snapshot(self) -> None:
+        # workers authenticate locally, they get the users and password hashes once and every change afterwards
+        users = dict(self.atm.get_users())
+        passwords = dict(self.atm.get_passwords())
+        for responses in self.responses:
+            responses.put(("snapshot", users, passwords))
+
+    def run(self, requests: Any, batch_size: int = LEDGER_BATCH_SIZE) -> None:
+        self.send_snapshot()
+        while True:
+            batch = [requests.get()]
+            while len(batch) < batch_size and batch[-1] is not STOP:
+                try:
+                    batch.append(requests.get_nowait())
+                except queue.Empty:
+                    break
+            acks: Dict[int, List[Tuple[int, bool, Any]]] = {}
+            for request in batch:
+                if request is STOP:
+                    break
+                worker, request_id, operation, args = request
+                ok, value = self.execute(operation, args)
+                acks.setdefault(worker, []).append((request_id, ok, value))
+            # the new hashes reach every worker before the change is acknowledged
+            if self.password_updates:
+                updates, self.password_updates = self.password_updates, {}
+                for responses in self.responses:
+                    responses.put(("passwords", updates))
+            for worker, items in acks.items():
+                self.responses[worker].put(("acks", items))
+            if batch[-1] is STOP:
+                return
+
+
+# Worker side of the request / response queues, safe to call from many threads of the worker.
+class LedgerClient:
+    def __init__(self, worker: int, requests: Any, responses: Any, passwords: Mapping[str, Password],
+                 timeout: float = LEDGER_TIMEOUT_SECONDS) -> None:
+        self.worker = worker
+        self.requests = requests
+        self.responses = responses
+        self.passwords = passwords
+        self.timeout = timeout
+        self._ids = itertools.count()
+        self._pending: Dict[int, Future] = {}
+        self._reader = threading.Thread(target=self._read, name="atm-ledger-client", daemon=True)
+        self._reader.start()
+
+    def call(self, operation: str, *args: Any) -> Any:
+        request_id = next(self._ids)
+        future: Future = Future()
+        self._pending[request_id] = future
+        self.requests.put((self.worker, request_id, operation, args))
+        try:
+            return future.result(self.timeout)
+        except FutureTimeoutError:
+            self._pending.pop(request_id, None)
+            if operation in READ_OPERATIONS:
+                raise ATMError(f"{operation.capitalize()} failed: The ledger did not answer.")
+            raise OutcomeUnknownError(f"{operation.capitalize()} outcome unknown: The ledger did not answer in time, "
+                                      f"it may still apply the request.")
+
+    def _read(self) -> None:
+        while True:
+            kind, payload = self.responses.get()
+            if kind == "acks":
+                for request_id, ok, value in payload:
+                    future = self._pending.pop(request_id, None)
+                    if future is None:
+                        continue
+                    if ok:
+                        future.set_result(value)
+                    else:
+                        future.set_exception(error_of(*value))
+            elif kind == "passwords":
+                for user_id, hashed in payload.items():
+                    password = self.passwords.get(user_id)
+                    if password is not None:
+                        password.password = hashed
+
+
+# LoginLimiter of a worker process, the buckets are the ledger's.
+class LedgerLoginLimiter:
+    def __init__(self, ledger: LedgerClient) -> None:
+        self.ledger = ledger
+
+    def check(self, user_id: str, client_id: Optional[str] = None) -> None:
+        self.ledger.call("login_check", user_id, client_id)
+
+    def record_failure(self, user_id: str, client_id: Optional[str] = None) -> None:
+        self.ledger.call("login_failure", user_id, client_id)
+
+    def record_success(self, user_id: str, client_id: Optional[str] = None) -> None:
+        self.ledger.call("login_success", user_id, client_id)
+
+    def counters(self) -> Dict[str, int]:
+        return self.ledger.call("login_counters")
+
+
+# ATM of a worker process: logins (the KDF), sessions and argument checks run here, on the worker's core,
+# balances and every mutation are the ledger's. the worker holds no accounts, so ownership is checked there.
+class ClusterATM(ATM):
+    def __init__(self, users: Mapping[str, User], passwords: Mapping[str, Password], ledger: LedgerClient,
+                 password_hasher: Optional[PasswordHasher] = None) -> None:
+        super().__init__(users, passwords, {}, accounts_by_owner={}, password_hasher=password_hasher,
+                         login_limiter=LedgerLoginLimiter(ledger))
+        self.ledger = ledger
+
+    @staticmethod
+    def _check_amount(operation: str, amount: int) -> None:
+        if not is_cents(amount):
+            raise InvalidAmountError(f"{operation} failed: Amount must be a whole number of cents.")
+        if amount <= 0:
+            raise InvalidAmountError(f"{operation} failed: Amount must be positive.")
+
+    def _get_balance(self, user_id: str) -> Dict[str, int]:
+        return self.ledger.call("balance", user_id)
+
+    def _withdraw(self, user_id: str, account_id: str, amount: int) -> None:
+        self._check_amount("Withdrawal", amount)
+        self.ledger.call("withdraw", user_id, account_id, amount)
+
+    def _deposit(self, user_id: str, account_id: str, amount: int) -> None:
+        self._check_amount("Deposit", amount)
+        self.ledger.call("deposit", user_id, account_id, amount)
+
+    def _transfer(self, user_id: str, from_account: str, to_account: str, amount: int) -> None:
+        self._check_amount("Transfer", amount)
+        self.ledger.call("transfer", user_id, from_account, to_account, amount)
+
+    def _get_statement(self, user_id: str, account_id: str, since: int = 0, limit: int = 50) -> StatementPage:
+        return self.ledger.call("statement", user_id, account_id, since, limit)
+
+    def _store_password(self, user_id: str, hashed: str) -> None:
+        # hashed here (ATM._change_password), stored and broadcast by the ledger
+        self.ledger.call("store_password", user_id, hashed)
+        self.passwords[user_id].password = hashed
+
+
+def run_ledger(atm_handler: AtmHandler, requests: Any, responses: List[Any], batch_size: int,
+               flush_interval: Optional[float], flush_threshold: int, history: Optional[TransactionHistory],
+               limits: Optional[WithdrawalLimits], cash: Optional[CashDispenser]) -> None:
+    # ledger process entry point, exit code 0 when the final save succeeded.
+    # Ctrl-C reaches the whole process group, the ledger waits for STOP and the final save instead
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    atm = ATM.from_handler(atm_handler, history=history, limits=limits, cash=cash)
+    flusher = BackgroundFlusher.attach(atm, atm_handler, flush_interval, flush_threshold)
+    Ledger(atm, responses).run(requests, batch_size)
+    try:
+        if flusher is not None:
+            saved = flusher.stop()
+        else:
+            saved = atm_handler.save_data(atm.get_users(), atm.get_passwords(), atm.get_accounts())
+    except Exception as e:
+        logging.error("Ledger failed to save customer data: %s", e)
+        saved = False
+    if history is not None:
+        history.close()
+    sys.exit(0 if saved else 1)
+
+
+# N worker processes in front of one ledger process. The processes are forked, the handler, history, limits and
+# dispenser are handed to the ledger as they are (they are never used by the parent afterwards).
+#   cluster = ATMCluster(atm_handler, workers=4); cluster.start()
+#   cluster.run_workers(serve_worker, host, port); cluster.join(); cluster.stop()
+class ATMCluster:
+    def __init__(self, atm_handler: AtmHandler, workers: int = CLUSTER_WORKERS,
+                 flush_interval: Optional[float] = None, flush_threshold: int = 100,
+                 history: Optional[TransactionHistory] = None, limits: Optional[WithdrawalLimits] = None,
+                 cash: Optional[CashDispenser] = None, batch_size: int = LEDGER_BATCH_SIZE,
+                 timeout: float = LEDGER_TIMEOUT_SECONDS) -> None:
+        self.context = multiprocessing.get_context("fork")
+        self.workers = workers
+        self.timeout = timeout
+        self.requests = self.context.Queue()
+        self.responses = [self.context.Queue() for _ in range(workers)]
+        self.ledger = self.context.Process(
+            target=run_ledger, name="atm-ledger",
+            args=(atm_handler, self.requests, self.responses, batch_size, flush_interval, flush_threshold,
+                  history, limits, cash))
+        self.processes: List[multiprocessing.process.BaseProcess] = []
+
+    def start(self) -> None:
+        self.ledger.start()
+
+    def connect(self, worker: int, password_hasher: Optional[PasswordHasher] = None) -> ClusterATM:
+        # in the process that acts as worker `worker` - the worker processes, or the caller itself in tests
+        kind, users, passwords = self.responses[worker].get(timeout=self.timeout)
+        client = LedgerClient(worker, self.requests, self.responses[worker], passwords, self.timeout)
+        return ClusterATM(users, passwords, client, password_hasher)
+
+    def run_workers(self, target: Callable[..., None], *args: Any) -> None:
+        # target(atm, *args) in every worker process
+        for worker in range(self.workers):
+            process = self.context.Process(target=self._worker_main, name=f"atm-worker-{worker}",
+                                           args=(worker, target, args))
+            process.start()
+            self.processes.append(process)
+
+    def _worker_main(self, worker: int, target: Callable[..., None], args: Tuple) -> None:
+        try:
+            target(self.connect(worker), *args)
+        except KeyboardInterrupt:
+            pass
+
+    def join(self) -> None:
+        for process in self.processes:
+            process.join()
+
+    def stop(self, timeout: float = 10.0) -> bool:
+        # workers first (no request may arrive after STOP), then the ledger's final save
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        self.requests.put(STOP)
+        self.ledger.join()
+        return self.ledger.exitcode == 0
+
+
+def serve_worker(atm: ClusterATM, host: str, port: int) -> None:
+    # every worker listens on the same port (SO_REUSEPORT), the kernel spreads the connections
+    asyncio.run(_serve_worker(atm, host, port))
+
+
+async def _serve_worker(atm: ClusterATM, host: str, port: int) -> None:
+    server = ATMServer(atm)
+    await server.start(host, port, reuse_port=True)
+    try:
+        await server.serve_forever()
+    finally:
+        await server.close()
@@ -1 +1,40 @@
 DATA_FILE_PATH = "./data/data.json"
+JOURNAL_FILE_PATH = "./data/data.journal"
+JOURNAL_COMPACT_EVERY = 1000
+SQLITE_FILE_PATH = "./data/data.db"
+LEDGER_FILE_PATH = "./data/data.ledger"
+SHARD_COUNT = 4
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 8765
+FLUSH_INTERVAL_SECONDS = 5.0
+FLUSH_DIRTY_THRESHOLD = 100
+PBKDF2_ITERATIONS = 600_000
+KDF_WORKERS = 4
+AUTH_CACHE_SIZE = 10_000
+AUTH_CACHE_TTL_SECONDS = 300.0
+LOGIN_FAILURES_PER_USER = 5
+LOGIN_FAILURES_PER_CLIENT = 50
+LOGIN_REFILL_SECONDS = 60.0
+LOGIN_LIMITER_MAX_KEYS = 100_000
+HISTORY_DIR = "./data/history"
+HISTORY_SEGMENT_SIZE = 10_000
+DAILY_WITHDRAWAL_LIMIT_CENTS = 200_000
+VELOCITY_MAX_OPERATIONS = 10
+VELOCITY_WINDOW_SECONDS = 600.0
+LIMITS_MAX_KEYS = 100_000
+# denomination (cents) -> notes, loaded into empty cassettes on the first run
+CASSETTES = {2000: 1000, 5000: 1000, 10000: 500}
+MAX_NOTES_PER_WITHDRAWAL = 40
+DISPENSE_CACHE_SIZE = 4096
+METRICS_ENABLED = True
+METRICS_PORT = 9108
+METRICS_BUCKETS_SECONDS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+CLUSTER_WORKERS = 4
+LEDGER_BATCH_SIZE = 256
+LEDGER_TIMEOUT_SECONDS = 30.0
+GROUP_COMMIT_ENABLED = True
+GROUP_COMMIT_MAX_BATCH = 128
+GROUP_COMMIT_MAX_WAIT_SECONDS = 0.001
+RECORD_CACHE_MAX_ENTRIES = 100_000
+RECORD_CACHE_MAX_BYTES = 64 * 2 ** 20
+NEGATIVE_CACHE_ENTRIES = 10_000
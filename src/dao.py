@@ -1,8 +1,11 @@
-from dataclasses import dataclass, asdict
-from typing import Dict, Any
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
 
+from money import to_cents
 
-@dataclass
+
+# slots=True drops the per-instance __dict__, to_dict is written by hand (dataclasses.asdict is recursive and slow)
+@dataclass(slots=True)
 class User:
     user_id: str
     name: str
@@ -13,10 +16,10 @@ class User:
         return User(user_id=data.get("user_id", ""), name=data.get("name", ""), email=data.get("email", ""))
 
     def to_dict(self) -> Dict[str, Any]:
-        return asdict(self)
+        return {"user_id": self.user_id, "name": self.name, "email": self.email}
 
 
-@dataclass
+@dataclass(slots=True)
 class Password:
     user_id: str
     password: str
@@ -26,22 +29,52 @@ class Password:
         return Password(user_id=data["user_id"], password=data["password"])
 
     def to_dict(self) -> Dict[str, Any]:
-        return asdict(self)
+        return {"user_id": self.user_id, "password": self.password}
 
 
-@dataclass
+# balance is an int number of cents, files written before that hold a float "balance" and are converted on load
+@dataclass(slots=True)
 class Account:
     owner_id: str
-    balance: float
+    balance_cents: int
     account_id: str
 
     @staticmethod
     def from_dict(data: Dict[str, Any]) -> "Account":
         return Account(
             owner_id=data["owner_id"],
-            balance=float(data["balance"]),
+            balance_cents=balance_cents_of(data),
             account_id=data["account_id"]
         )
 
     def to_dict(self) -> Dict[str, Any]:
-        return asdict(self)
+        return {"owner_id": self.owner_id, "balance_cents": self.balance_cents, "account_id": self.account_id}
+
+
+def balance_cents_of(data: Dict[str, Any]) -> int:
+    if "balance_cents" in data:
+        return int(data["balance_cents"])
+    return to_cents(data["balance"])
+
+
+# one leg of a balance change in the transaction history (transaction_history.py), amounts are signed cents
+@dataclass(slots=True)
+class Transaction:
+    seq: int
+    timestamp: float
+    operation: str
+    account_id: str
+    amount_cents: int
+    balance_cents: int
+    counterparty: Optional[str] = None
+
+    @staticmethod
+    def from_dict(data: Dict[str, Any]) -> "Transaction":
+        return Transaction(seq=data["seq"], timestamp=data["timestamp"], operation=data["operation"],
+                           account_id=data["account_id"], amount_cents=data["amount_cents"],
+                           balance_cents=data["balance_cents"], counterparty=data.get("counterparty"))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"seq": self.seq, "timestamp": self.timestamp, "operation": self.operation,
+                "account_id": self.account_id, "amount_cents": self.amount_cents,
+                "balance_cents": self.balance_cents, "counterparty": self.counterparty}
@@ -12,3 +12,30 @@ class AccountNotFoundError(ATMError):
 
 class InvalidAmountError(ATMError):
     pass
+
+
+class DataFileCorruptedError(ATMError):
+    pass
+
+
+class BatchError(ATMError):
+    def __init__(self, failures) -> None:
+        super().__init__(f"Batch rejected: {len(failures)} invalid operation(s).")
+        self.failures = failures
+
+
+class TooManyAttemptsError(UnauthorizedAccessError):
+    pass
+
+
+class LimitExceededError(ATMError):
+    pass
+
+
+class UndispensableAmountError(InvalidAmountError):
+    pass
+
+
+# the request may still be applied (e.g. a cluster worker timed out waiting for the ledger), a retry could repeat it
+class OutcomeUnknownError(ATMError):
+    pass
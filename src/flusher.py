@@ -0,0 +1,100 @@
+import logging
+import threading
+from typing import TYPE_CHECKING, Dict, Optional
+
+from atm_handler.atm_handler import AtmHandler
+
+if TYPE_CHECKING:
+    from atm import ATM
+
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+# Background writer for handlers without a journal (file / ephemeral).
+# ATM appends its records here (it acts as the ATM journal), every record marks the state dirty and
+# a thread persists the changed accounts / passwords (ATM.collect_changes -> save_changes) every `interval`
+# seconds or once `dirty_threshold` records piled up - customers never wait on the disk write.
+# stop() is the final flush.
+class BackgroundFlusher:
+    def __init__(self, atm_handler: AtmHandler, atm: "ATM", downstream: Optional[AtmHandler] = None,
+                 interval: Optional[float] = 5.0, dirty_threshold: int = 100) -> None:
+        self.atm_handler = atm_handler
+        self.atm = atm
+        self.downstream = downstream
+        self.interval = interval
+        self.dirty_threshold = dirty_threshold
+        self.dirty = 0
+        # a delta that failed to save, retried with the next flush
+        self._pending: Optional[Dict] = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def attach(atm: "ATM", atm_handler: AtmHandler, interval: Optional[float],
+               dirty_threshold: int) -> Optional["BackgroundFlusher"]:
+        # handlers with a journal already persist every operation, they don't need a flusher
+        if atm.journal is not None:
+            return None
+        flusher = BackgroundFlusher(atm_handler, atm, interval=interval, dirty_threshold=dirty_threshold)
+        atm.journal = flusher
+        if interval is not None:
+            flusher.start()
+        return flusher
+
+    def append(self, record: Dict) -> None:
+        if self.downstream is not None:
+            self.downstream.append(record)
+        with self._lock:
+            self.dirty += 1
+            if self.dirty >= self.dirty_threshold:
+                self._wakeup.set()
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="atm-flusher", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            if self._stopped.is_set():
+                break
+            self.flush()
+
+    def flush(self) -> bool:
+        with self._flush_lock:
+            with self._lock:
+                flushed = self.dirty
+            if not flushed and self._pending is None:
+                return True
+            delta = self._merge(self._pending, self.atm.collect_changes())
+            if not self.atm_handler.save_changes(delta):
+                logging.error("Background flush failed, the changes stay dirty.")
+                self._pending = delta
+                return False
+            self._pending = None
+            with self._lock:
+                self.dirty -= flushed
+            if self.atm_handler.compaction_due():
+                # the snapshot is of the live objects, commits are held off so none is half-applied in it
+                with self.atm.commit_gate.exclusive():
+                    self.atm_handler.compact()
+            return True
+
+    @staticmethod
+    def _merge(older: Optional[Dict], newer: Dict) -> Dict:
+        if older is None:
+            return newer
+        return {section: {**older.get(section, {}), **newer.get(section, {})} for section in {*older, *newer}}
+
+    def stop(self) -> bool:
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.flush()
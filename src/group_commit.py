@@ -0,0 +1,101 @@
+import threading
+from typing import Any, Dict, List, Optional
+
+from config import GROUP_COMMIT_MAX_BATCH, GROUP_COMMIT_MAX_WAIT_SECONDS
+
+
+class _PendingRecord:
+    __slots__ = ("record", "done", "error")
+
+    def __init__(self, record: Dict) -> None:
+        self.record = record
+        self.done = False
+        self.error: Optional[BaseException] = None
+
+
+# Group commit in front of an ATM journal (a handler's get_journal()): concurrent appends are gathered and made
+# durable together, one write + fsync (append_many) per batch instead of one per operation.
+# The first caller that finds no write in progress leads the next batch - under load it waits up to max_wait for
+# more records (less once max_batch are queued), writes them and wakes the others. Every caller returns only after
+# its own record is durable and gets the batch's error if the write failed, so ATM rolls it back as before.
+# Journals without append_many get the records one by one, still in order.
+class GroupCommitter:
+    def __init__(self, journal: Any, max_batch: int = GROUP_COMMIT_MAX_BATCH,
+                 max_wait: float = GROUP_COMMIT_MAX_WAIT_SECONDS) -> None:
+        self.journal = journal
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.batches = 0
+        self.records = 0
+        self._pending: List[_PendingRecord] = []
+        self._writing = False
+        self._last_batch = 0
+        self._condition = threading.Condition()
+
+    def append(self, record: Dict) -> None:
+        self.wait(self.submit(record))
+
+    # append in two steps: submit queues the record (records are written in submit order) and returns at once,
+    # wait returns when it is durable. ATM submits under a lock that orders its records and waits outside it.
+    def submit(self, record: Dict) -> _PendingRecord:
+        entry = _PendingRecord(record)
+        with self._condition:
+            self._pending.append(entry)
+            if len(self._pending) >= self.max_batch:
+                self._condition.notify_all()
+        return entry
+
+    def wait(self, entry: _PendingRecord) -> None:
+        with self._condition:
+            while not entry.done:
+                if self._writing:
+                    self._condition.wait()
+                else:
+                    self._lead()
+        if entry.error is not None:
+            raise entry.error
+
+    def _lead(self) -> None:
+        # called and returns with the condition held, it is released for the wait and the write
+        self._writing = True
+        # a lone caller doesn't wait, there is only something to gather when commits overlap
+        if self.max_wait > 0 and len(self._pending) < self.max_batch and (len(self._pending) > 1 or
+                                                                            self._last_batch > 1):
+            self._condition.wait_for(lambda: len(self._pending) >= self.max_batch, self.max_wait)
+        batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+        self._last_batch = len(batch)
+        self._condition.release()
+        try:
+            self._write(batch)
+        except BaseException as e:
+            for entry in batch:
+                entry.error = entry.error or e
+            raise
+        finally:
+            self._condition.acquire()
+            for entry in batch:
+                entry.done = True
+            self.batches += 1
+            self.records += len(batch)
+            self._writing = False
+            self._condition.notify_all()
+
+    def _write(self, batch: List[_PendingRecord]) -> None:
+        append_many = getattr(self.journal, "append_many", None)
+        if append_many is None:
+            # one by one, a failed record fails only its own operation
+            for entry in batch:
+                try:
+                    self.journal.append(entry.record)
+                except Exception as e:
+                    entry.error = e
+            return
+        try:
+            append_many([entry.record for entry in batch])
+        except Exception as e:
+            for entry in batch:
+                entry.error = e
+
+    @property
+    def average_batch(self) -> float:
+        return self.records / self.batches if self.batches else 0.0
@@ -0,0 +1,223 @@
+import heapq
+import threading
+from bisect import bisect_left, insort
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+from dao import Account, User
+
+BalanceEntry = Tuple[int, str]
+
+
+# Sorted (balance_cents, account_id) entries split into buckets of about `load` entries, with the last entry of every
+# bucket kept in `maxes` for bisecting. An update shifts one bucket instead of the whole list.
+class SortedBalanceIndex:
+    def __init__(self, entries: Iterable[BalanceEntry] = (), presorted: bool = False, load: int = 1000) -> None:
+        self.load = load
+        entries = list(entries) if presorted else sorted(entries)
+        self._buckets: List[List[BalanceEntry]] = [entries[i:i + load] for i in range(0, len(entries), load)]
+        self._maxes: List[BalanceEntry] = [bucket[-1] for bucket in self._buckets]
+        self._length = len(entries)
+
+    def add(self, balance_cents: int, account_id: str) -> None:
+        entry = (balance_cents, account_id)
+        self._length += 1
+        if not self._buckets:
+            self._buckets.append([entry])
+            self._maxes.append(entry)
+            return
+        index = min(bisect_left(self._maxes, entry), len(self._buckets) - 1)
+        bucket = self._buckets[index]
+        insort(bucket, entry)
+        self._maxes[index] = bucket[-1]
+        if len(bucket) > 2 * self.load:
+            self._buckets[index:index + 1] = [bucket[:self.load], bucket[self.load:]]
+            self._maxes[index:index + 1] = [bucket[self.load - 1], bucket[-1]]
+
+    def remove(self, balance_cents: int, account_id: str) -> None:
+        entry = (balance_cents, account_id)
+        index = bisect_left(self._maxes, entry)
+        if index == len(self._buckets):
+            raise KeyError(entry)
+        bucket = self._buckets[index]
+        position = bisect_left(bucket, entry)
+        if position == len(bucket) or bucket[position] != entry:
+            raise KeyError(entry)
+        del bucket[position]
+        self._length -= 1
+        if bucket:
+            self._maxes[index] = bucket[-1]
+        else:
+            del self._buckets[index]
+            del self._maxes[index]
+
+    def range(self, low: int, high: int) -> Iterator[BalanceEntry]:
+        # ascending, low <= balance <= high; (low,) sorts before every (low, account_id)
+        index = bisect_left(self._maxes, (low,))
+        if index == len(self._buckets):
+            return
+        position = bisect_left(self._buckets[index], (low,))
+        for bucket in self._buckets[index:]:
+            for entry in bucket[position:]:
+                if entry[0] > high:
+                    return
+                yield entry
+            position = 0
+
+    def top(self, n: int) -> List[BalanceEntry]:
+        # highest balances first
+        result: List[BalanceEntry] = []
+        for bucket in reversed(self._buckets):
+            for entry in reversed(bucket):
+                if len(result) == n:
+                    return result
+                result.append(entry)
+        return result
+
+    def __len__(self) -> int:
+        return self._length
+
+
+# Secondary indexes of ATM, kept up to date on every mutation instead of rebuilt:
+# owner_id -> accounts (built up front, get_balance needs it), email -> user_id and the sorted balance index
+# (built on first query, a lazy handler doesn't load every row until a report asks for it).
+# Handlers that answer owner lookups themselves pass accounts_by_owner, it is used as is.
+class IndexManager:
+    def __init__(self, users: Mapping[str, User], accounts: Mapping[str, Account],
+                 accounts_by_owner: Optional[Mapping[str, List[Account]]] = None, commit_gate=None) -> None:
+        self.users = users
+        self.accounts = accounts
+        # lazily built indexes are built with commits held off, so no update can fall between the scan and the index
+        self.commit_gate = commit_gate
+        self.maintains_owners = accounts_by_owner is None
+        self.accounts_by_owner: Mapping[str, List[Account]] = (
+            accounts_by_owner if accounts_by_owner is not None else self._build_owner_index())
+        self._users_by_email: Optional[Dict[str, str]] = None
+        # normalized email -> user_id of an update_email in flight, see reserve_email
+        self._reserved_emails: Dict[str, str] = {}
+        self._balances: Optional[SortedBalanceIndex] = None
+        self._lock = threading.Lock()
+
+    def rebuild(self, workers: int = 1) -> None:
+        # full rebuild, with workers > 1 the balance entries are sorted in chunks by a process pool and merged
+        with self._lazy(), self._lock:
+            if self.maintains_owners:
+                self.accounts_by_owner = self._build_owner_index()
+            self._users_by_email = self._build_email_index()
+            self._balances = self._build_balance_index(workers)
+
+    def _build_owner_index(self) -> Dict[str, List[Account]]:
+        accounts_by_owner: Dict[str, List[Account]] = {}
+        for account in self.accounts.values():
+            owner_id = account.owner_id
+            if owner_id not in accounts_by_owner:
+                accounts_by_owner[owner_id] = []
+            accounts_by_owner[owner_id].append(account)
+        return accounts_by_owner
+
+    def _build_email_index(self) -> Dict[str, str]:
+        users_by_email: Dict[str, str] = {}
+        for user_id, user in self.users.items():
+            if user.email:
+                users_by_email.setdefault(normalize_email(user.email), user_id)
+        return users_by_email
+
+    def _build_balance_index(self, workers: int = 1) -> SortedBalanceIndex:
+        entries = [(account.balance_cents, account_id) for account_id, account in self.accounts.items()]
+        if workers <= 1 or len(entries) < 2 * workers:
+            return SortedBalanceIndex(entries)
+        size = -(-len(entries) // workers)
+        chunks = [entries[i:i + size] for i in range(0, len(entries), size)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            merged = list(heapq.merge(*pool.map(sorted, chunks)))
+        return SortedBalanceIndex(merged, presorted=True)
+
+    def _lazy(self):
+        return self.commit_gate.exclusive() if self.commit_gate is not None else nullcontext()
+
+    def _balance_index(self) -> SortedBalanceIndex:
+        if self._balances is None:
+            with self._lazy(), self._lock:
+                if self._balances is None:
+                    self._balances = self._build_balance_index()
+        return self._balances
+
+    def _email_index(self) -> Dict[str, str]:
+        if self._users_by_email is None:
+            with self._lazy(), self._lock:
+                if self._users_by_email is None:
+                    self._users_by_email = self._build_email_index()
+        return self._users_by_email
+
+    # mutations - ATM calls them inside the commit gate, after the change was journaled
+
+    def balance_changed(self, account_id: str, previous: int, balance: int) -> None:
+        with self._lock:
+            if self._balances is not None and previous != balance:
+                self._balances.remove(previous, account_id)
+                self._balances.add(balance, account_id)
+
+    def account_added(self, account: Account) -> None:
+        with self._lock:
+            if self.maintains_owners:
+                self.accounts_by_owner.setdefault(account.owner_id, []).append(account)
+            if self._balances is not None:
+                self._balances.add(account.balance_cents, account.account_id)
+
+    def owner_changed(self, account: Account, previous_owner: str) -> None:
+        if not self.maintains_owners:
+            return
+        with self._lock:
+            previous_accounts = self.accounts_by_owner.get(previous_owner, [])
+            previous_accounts[:] = [a for a in previous_accounts if a.account_id != account.account_id]
+            if not previous_accounts:
+                self.accounts_by_owner.pop(previous_owner, None)
+            self.accounts_by_owner.setdefault(account.owner_id, []).append(account)
+
+    def email_changed(self, user_id: str, previous: str, email: str) -> None:
+        with self._lock:
+            if self._users_by_email is None:
+                return
+            if previous and self._users_by_email.get(normalize_email(previous)) == user_id:
+                del self._users_by_email[normalize_email(previous)]
+            if email:
+                self._users_by_email[normalize_email(email)] = user_id
+
+    def reserve_email(self, user_id: str, email: str) -> bool:
+        # the uniqueness check and the claim in one step - a reserved email is taken for everyone else until
+        # release_email, so two concurrent updates can't both pass the check
+        self._email_index()
+        key = normalize_email(email)
+        with self._lock:
+            if self._users_by_email.get(key, user_id) != user_id or self._reserved_emails.get(key, user_id) != user_id:
+                return False
+            self._reserved_emails[key] = user_id
+            return True
+
+    def release_email(self, email: str) -> None:
+        with self._lock:
+            self._reserved_emails.pop(normalize_email(email), None)
+
+    # queries
+
+    def user_id_by_email(self, email: str) -> Optional[str]:
+        return self._email_index().get(normalize_email(email))
+
+    def user_by_email(self, email: str) -> Optional[User]:
+        user_id = self.user_id_by_email(email)
+        return None if user_id is None else self.users[user_id]
+
+    def accounts_in_balance_range(self, low: int, high: int) -> List[BalanceEntry]:
+        index = self._balance_index()
+        with self._lock:
+            return list(index.range(low, high))
+
+    def top_balances(self, n: int) -> List[BalanceEntry]:
+        index = self._balance_index()
+        with self._lock:
+            return index.top(n)
+
+
+def normalize_email(email: str) -> str:
+    return email.strip().lower()
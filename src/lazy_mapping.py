@@ -0,0 +1,271 @@
+import sys
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, Generic, Iterable, Iterator, List, Mapping, MutableMapping, Optional, Tuple, \
+    TypeVar
+
+K = TypeVar("K")
+V = TypeVar("V")
+
+
+# Mapping proxy that loads a value on first access and keeps it,
+# so every caller mutates the same object and untouched keys cost nothing.
+class LazyMapping(MutableMapping, Generic[K, V]):
+    def __init__(self,
+                 loader: Callable[[K], Optional[V]],
+                 keys: Optional[Callable[[], Iterable[K]]] = None,
+                 length: Optional[Callable[[], int]] = None,
+                 contains: Optional[Callable[[K], bool]] = None) -> None:
+        self.loader = loader
+        self.keys_loader = keys
+        self.length_loader = length
+        self.contains_loader = contains
+        self.loaded: Dict[K, V] = {}
+
+    def __getitem__(self, key: K) -> V:
+        if key in self.loaded:
+            return self.loaded[key]
+        value = self.loader(key)
+        if value is None:
+            raise KeyError(key)
+        # two threads may load the same key at once, setdefault keeps a single winner
+        return self.loaded.setdefault(key, value)
+
+    def __contains__(self, key: object) -> bool:
+        if key in self.loaded:
+            return True
+        if self.contains_loader is not None:
+            return self.contains_loader(key)
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
+
+    def __setitem__(self, key: K, value: V) -> None:
+        self.loaded[key] = value
+
+    def __delitem__(self, key: K) -> None:
+        del self.loaded[key]
+
+    def __iter__(self) -> Iterator[K]:
+        if self.keys_loader is None:
+            return iter(list(self.loaded))
+        return iter(self.keys_loader())
+
+    def __len__(self) -> int:
+        if self.length_loader is not None:
+            return self.length_loader()
+        return sum(1 for _ in self)
+
+
+# owner_id -> accounts, resolved through a pluggable lookup of account ids and the (lazy) accounts mapping
+class LazyOwnerIndex(Mapping, Generic[K, V]):
+    def __init__(self,
+                 lookup: Callable[[K], Iterable[str]],
+                 accounts: Mapping[str, V],
+                 owners: Optional[Callable[[], Iterable[K]]] = None) -> None:
+        self.lookup = lookup
+        self.accounts = accounts
+        self.owners = owners
+
+    def __getitem__(self, owner_id: K) -> List[V]:
+        return [self.accounts[account_id] for account_id in self.lookup(owner_id)]
+
+    def __iter__(self) -> Iterator[K]:
+        if self.owners is None:
+            return iter(())
+        return iter(self.owners())
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+
+def record_size(value: object) -> int:
+    # shallow size of a dao object and its fields, what the byte budget of CachedMapping counts
+    fields = getattr(type(value), "__slots__", None)
+    if fields is None:
+        members = vars(value).values() if hasattr(value, "__dict__") else ()
+    else:
+        members = (getattr(value, field, None) for field in fields)
+    return sys.getsizeof(value) + sum(sys.getsizeof(member) for member in members)
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    negative_hits: int = 0
+    evictions: int = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.hits + self.negative_hits + self.misses
+        return (self.hits + self.negative_hits) / lookups if lookups else 0.0
+
+
+# Bounded read-through cache over a (slow) mapping: an LRU of loaded values, limited by max_entries and / or
+# max_bytes, plus an LRU of keys the source doesn't have, so a lookup of an unknown id doesn't reach the source again.
+# A LazyMapping source is read through its loader - it would otherwise keep its own unbounded copy of every value -
+# and is never written to, its store gets the changes through the handler's journal. Other sources are written
+# through, the next read returns the source's own entry.
+class CachedMapping(MutableMapping, Generic[K, V]):
+    def __init__(self, source: Mapping[K, V], max_entries: Optional[int] = None, max_bytes: Optional[int] = None,
+                 negative_entries: int = 0, sizeof: Callable[[V], int] = record_size) -> None:
+        self.source = source
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.negative_entries = negative_entries
+        self.sizeof = sizeof
+        self.stats = CacheStats()
+        self.bytes = 0
+        self._lazy_source = isinstance(source, LazyMapping)
+        self._load: Callable[[K], Optional[V]] = source.loader if self._lazy_source else source.get
+        self._entries: "OrderedDict[K, Tuple[V, int]]" = OrderedDict()
+        self._missing: "OrderedDict[K, None]" = OrderedDict()
+        # bumped by every write / invalidation
+        self._writes = 0
+        # key -> number of pins, see pin()
+        self._pins: Dict[K, int] = {}
+        self._lock = threading.Lock()
+
+    def _lookup(self, key: K) -> Optional[V]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.stats.hits += 1
+                return entry[0]
+            if key in self._missing:
+                self._missing.move_to_end(key)
+                self.stats.negative_hits += 1
+                return None
+            self.stats.misses += 1
+            writes = self._writes
+        # loaded without the lock, two threads may load the same key at once - the first one stored wins,
+        # so every caller mutates the same object
+        value = self._load(key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                return entry[0]
+            # a write since the load started may have made the loaded value stale, it is returned but not kept
+            if writes == self._writes:
+                if value is None:
+                    self._remember_missing(key)
+                else:
+                    self._store(key, value)
+            return value
+
+    def _store(self, key: K, value: V) -> None:
+        size = self.sizeof(value) if self.max_bytes is not None else 0
+        self._entries[key] = (value, size)
+        self.bytes += size
+        self._evict()
+
+    def _evict(self) -> None:
+        # pinned entries are passed over (and count as recently used), the cache runs over its bounds while
+        # there is nothing else left to evict
+        passed = 0
+        while passed < len(self._entries) and (
+                (self.max_entries is not None and len(self._entries) > self.max_entries) or
+                (self.max_bytes is not None and self.bytes > self.max_bytes)):
+            key = next(iter(self._entries))
+            if key in self._pins:
+                self._entries.move_to_end(key)
+                passed += 1
+                continue
+            _, evicted_size = self._entries.pop(key)
+            self.bytes -= evicted_size
+            self.stats.evictions += 1
+
+    def _remember_missing(self, key: K) -> None:
+        if self.negative_entries <= 0:
+            return
+        self._missing[key] = None
+        if len(self._missing) > self.negative_entries:
+            self._missing.popitem(last=False)
+
+    def _drop(self, key: K) -> None:
+        self._writes += 1
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[1]
+        self._missing.pop(key, None)
+
+    def pin(self, keys: Iterable[K]) -> None:
+        # ATM changes the cached objects in place and journals them afterwards - until the record is durable the
+        # store has the old row, so a changed object must not be evicted and reloaded. pinned first, then loaded,
+        # so the object the caller is about to change is the one kept
+        keys = list(keys)
+        with self._lock:
+            for key in keys:
+                self._pins[key] = self._pins.get(key, 0) + 1
+        for key in keys:
+            self._lookup(key)
+
+    def unpin(self, keys: Iterable[K]) -> None:
+        with self._lock:
+            for key in keys:
+                if self._pins[key] == 1:
+                    del self._pins[key]
+                else:
+                    self._pins[key] -= 1
+            self._evict()
+
+    def __getitem__(self, key: K) -> V:
+        value = self._lookup(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key: object) -> bool:
+        # one load answers the membership test and the lookup that usually follows it
+        return self._lookup(key) is not None
+
+    def __setitem__(self, key: K, value: V) -> None:
+        with self._lock:
+            self._drop(key)
+            if self._lazy_source:
+                self._store(key, value)
+        if not self._lazy_source:
+            self.source[key] = value
+
+    def __delitem__(self, key: K) -> None:
+        with self._lock:
+            self._drop(key)
+        if not self._lazy_source:
+            del self.source[key]
+
+    def __iter__(self) -> Iterator[K]:
+        return iter(self.source)
+
+    def __len__(self) -> int:
+        return len(self.source)
+
+    def invalidate(self, key: Optional[K] = None) -> None:
+        # a value changed behind the cache's back, the next read goes to the source. no key - everything
+        with self._lock:
+            # pinned entries are kept, they hold a change that is on its way to the store
+            if key is None:
+                self._writes += 1
+                self._entries = OrderedDict((k, entry) for k, entry in self._entries.items() if k in self._pins)
+                self._missing.clear()
+                self.bytes = sum(size for _, size in self._entries.values())
+            elif key not in self._pins:
+                self._drop(key)
+
+    def forget_missing(self, key: K) -> None:
+        # the key was just created, a cached "not found" must not hide it
+        with self._lock:
+            self._writes += 1
+            self._missing.pop(key, None)
+
+    @property
+    def cached(self) -> int:
+        return len(self._entries)
+
+    def cached_items(self) -> Dict[K, V]:
+        with self._lock:
+            return {key: value for key, (value, _) in self._entries.items()}
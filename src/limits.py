@@ -0,0 +1,182 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from config import DAILY_WITHDRAWAL_LIMIT_CENTS, LIMITS_MAX_KEYS, VELOCITY_MAX_OPERATIONS, VELOCITY_WINDOW_SECONDS
+from dao import Transaction
+from exceptions import LimitExceededError
+
+
+# Rolling sums of amount / count per key over the last window_seconds, split into fixed time buckets.
+# Totals are kept up to date as buckets expire, so reading them costs at most `buckets` steps (a constant),
+# never a scan of past operations. Keys whose window is empty are dropped in LRU order, like RateLimiter. A live window
+# is never dropped (that would reset its limit), a new key is refused while all max_keys windows are live.
+class RollingWindow:
+    def __init__(self, window_seconds: float, buckets: int, max_keys: int = LIMITS_MAX_KEYS) -> None:
+        self.window_seconds = window_seconds
+        self.buckets = buckets
+        self.bucket_seconds = window_seconds / buckets
+        self.max_keys = max_keys
+        # per key: [newest bucket number, total amount, total count, amounts ring, counts ring]
+        self._windows: "OrderedDict[str, list]" = OrderedDict()
+
+    def totals(self, key: str, now: float) -> Tuple[int, int]:
+        state = self._windows.get(key)
+        if state is None:
+            return 0, 0
+        self._advance(state, self._bucket_of(now))
+        return state[1], state[2]
+
+    def admits(self, key: str, now: float) -> bool:
+        if key in self._windows:
+            return True
+        self._evict(self._bucket_of(now))
+        return len(self._windows) < self.max_keys
+
+    def add(self, key: str, amount: int, count: int, now: float) -> int:
+        # returns the bucket it was added to, remove() takes it back out of the same bucket
+        bucket = self._bucket_of(now)
+        state = self._windows.get(key)
+        if state is None:
+            state = self._windows[key] = [bucket, 0, 0, [0] * self.buckets, [0] * self.buckets]
+        else:
+            self._windows.move_to_end(key)
+            self._advance(state, bucket)
+        slot = bucket % self.buckets
+        state[1] += amount
+        state[2] += count
+        state[3][slot] += amount
+        state[4][slot] += count
+        self._evict(bucket)
+        return bucket
+
+    def remove(self, key: str, amount: int, count: int, bucket: int) -> None:
+        state = self._windows.get(key)
+        if state is None or state[0] - bucket >= self.buckets:
+            # the bucket already expired, nothing left to take back
+            return
+        slot = bucket % self.buckets
+        state[1] -= amount
+        state[2] -= count
+        state[3][slot] -= amount
+        state[4][slot] -= count
+
+    def _bucket_of(self, now: float) -> int:
+        return int(now // self.bucket_seconds)
+
+    def _advance(self, state: list, bucket: int) -> None:
+        newest = state[0]
+        if bucket <= newest:
+            return
+        if bucket - newest >= self.buckets:
+            state[1] = state[2] = 0
+            state[3] = [0] * self.buckets
+            state[4] = [0] * self.buckets
+        else:
+            for expired in range(newest + 1, bucket + 1):
+                slot = expired % self.buckets
+                state[1] -= state[3][slot]
+                state[2] -= state[4][slot]
+                state[3][slot] = state[4][slot] = 0
+        state[0] = bucket
+
+    def _evict(self, bucket: int) -> None:
+        while self._windows:
+            key, state = next(iter(self._windows.items()))
+            self._advance(state, bucket)
+            if state[2]:
+                break
+            del self._windows[key]
+
+    def __len__(self) -> int:
+        return len(self._windows)
+
+
+# scope - "account" (daily limit of an account) or "user" (velocity of the card / session user)
+@dataclass
+class LimitRule:
+    name: str
+    scope: str
+    window_seconds: float
+    buckets: int
+    max_amount_cents: Optional[int] = None
+    max_count: Optional[int] = None
+
+
+def default_rules() -> List[LimitRule]:
+    return [
+        LimitRule("daily withdrawal limit", "account", 24 * 3600, 24, max_amount_cents=DAILY_WITHDRAWAL_LIMIT_CENTS),
+        LimitRule("velocity", "user", VELOCITY_WINDOW_SECONDS, 10, max_count=VELOCITY_MAX_OPERATIONS),
+    ]
+
+
+# operations counted against the limits, their outgoing legs are replayed from the history on startup
+LIMITED_OPERATIONS = ("withdraw", "transfer")
+
+
+# Withdrawal / outgoing transfer rules checked by ATM before a commit. reserve() checks every rule and counts the
+# operation in one step under one lock, so two concurrent withdrawals can't both pass the last remaining allowance,
+# release() takes a reservation back when the commit fails. The windows live in memory, rebuild() refills them from
+# the transaction history after a restart.
+class WithdrawalLimits:
+    def __init__(self, rules: Optional[List[LimitRule]] = None, max_keys: int = LIMITS_MAX_KEYS,
+                 clock: Callable[[], float] = time.time) -> None:
+        self.rules = default_rules() if rules is None else rules
+        self.windows = [RollingWindow(rule.window_seconds, rule.buckets, max_keys) for rule in self.rules]
+        self.clock = clock
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def reserve(self, user_id: str, account_id: str, amount: int) -> List[Tuple[str, int]]:
+        with self._lock:
+            now = self.clock()
+            keys = [account_id if rule.scope == "account" else user_id for rule in self.rules]
+            if not all(window.admits(key, now) for window, key in zip(self.windows, keys)):
+                self.rejected += 1
+                raise LimitExceededError("Operation failed: Too many limits in use, try again later.")
+            for rule, window, key in zip(self.rules, self.windows, keys):
+                total_amount, total_count = window.totals(key, now)
+                if ((rule.max_amount_cents is not None and total_amount + amount > rule.max_amount_cents) or
+                        (rule.max_count is not None and total_count + 1 > rule.max_count)):
+                    self.rejected += 1
+                    raise LimitExceededError(f"Operation failed: {rule.name.capitalize()} exceeded.")
+            return [(key, window.add(key, amount, 1, now)) for window, key in zip(self.windows, keys)]
+
+    def release(self, reservation: List[Tuple[str, int]], amount: int) -> None:
+        with self._lock:
+            for window, (key, bucket) in zip(self.windows, reservation):
+                window.remove(key, amount, 1, bucket)
+
+    @property
+    def window_seconds(self) -> float:
+        return max((rule.window_seconds for rule in self.rules), default=0.0)
+
+    def rebuild(self, transactions: Iterable[Transaction], owner_of: Callable[[str], Optional[str]]) -> int:
+        # counts the outgoing legs of past withdrawals / transfers again (oldest first), the user of the velocity
+        # rule is the account's owner - the only user allowed to move money out of it. returns how many were counted
+        counted = 0
+        with self._lock:
+            for transaction in transactions:
+                if transaction.operation not in LIMITED_OPERATIONS or transaction.amount_cents >= 0:
+                    continue
+                user_id = owner_of(transaction.account_id)
+                for rule, window in zip(self.rules, self.windows):
+                    key = transaction.account_id if rule.scope == "account" else user_id
+                    if key is not None:
+                        window.add(key, -transaction.amount_cents, 1, transaction.timestamp)
+                counted += 1
+        return counted
+
+    def remaining(self, user_id: str, account_id: str) -> List[Tuple[str, Optional[int], Optional[int]]]:
+        # (rule name, amount left, operations left) - None where the rule doesn't limit it
+        with self._lock:
+            now = self.clock()
+            result = []
+            for rule, window in zip(self.rules, self.windows):
+                total_amount, total_count = window.totals(account_id if rule.scope == "account" else user_id, now)
+                result.append((rule.name,
+                               None if rule.max_amount_cents is None else rule.max_amount_cents - total_amount,
+                               None if rule.max_count is None else rule.max_count - total_count))
+            return result
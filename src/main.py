@@ -1,16 +1,58 @@
-from atm_cli import ATMCLI
+import asyncio
+import sys
+from atm_cli import ATMCLI, BufferedIOInterface
+from atm_server import serve
+from cluster import ATMCluster, serve_worker
 from atm_handler.atm_file_handler import AtmFileHandler
 import argparse
+import os
 from atm_handler.atm_ephemeral_handler import AtmEphemeralHandler
-from config import DATA_FILE_PATH
+from atm_handler.atm_journal_handler import AtmJournalHandler
+from atm_handler.atm_sqlite_handler import AtmSqliteHandler
+from atm_handler.atm_caching_handler import AtmCachingHandler
+from atm_handler.atm_ledger_handler import AtmLedgerHandler
+from atm_handler.atm_sharded_handler import AtmShardedHandler
+from atm_handler.ledger_file import convert_json_to_ledger
+from password_hasher import PasswordHasher, migrate_passwords
+from transaction_history import TransactionHistory
+from limits import WithdrawalLimits
+from cash_dispenser import CashDispenser
+from metrics import HANDLER_OPERATIONS, MetricsRegistry
+from config import (DATA_FILE_PATH, JOURNAL_FILE_PATH, JOURNAL_COMPACT_EVERY, SQLITE_FILE_PATH, LEDGER_FILE_PATH,
+                    SHARD_COUNT, SERVER_HOST, SERVER_PORT, FLUSH_INTERVAL_SECONDS, FLUSH_DIRTY_THRESHOLD, HISTORY_DIR,
+                    HISTORY_SEGMENT_SIZE, CASSETTES, METRICS_ENABLED, METRICS_PORT, GROUP_COMMIT_ENABLED)
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description="ATM CLI Application")
     parser.add_argument('--mode',
                          default='file',
-                         choices=['ephemeral', 'file'],
+                         choices=['ephemeral', 'file', 'journal', 'sqlite', 'ledger', 'sharded'],
                          required=False,
-                         help="Mode of operation: 'ephemeral' or 'file'")
+                         help="Mode of operation: 'ephemeral', 'file', 'journal', 'sqlite', 'ledger' or 'sharded'")
+    parser.add_argument('--columnar',
+                         action='store_true',
+                         help="Keep accounts in a columnar store (file / journal modes)")
+    parser.add_argument('--serve',
+                         action='store_true',
+                         help="Serve the line-delimited JSON protocol over TCP instead of the interactive CLI")
+    parser.add_argument('--cluster', type=int, default=0, metavar='WORKERS',
+                         help="With --serve: this many worker processes for the sessions, balances are kept by "
+                              "one ledger process")
+    parser.add_argument('--host', default=SERVER_HOST, help="Server host (with --serve)")
+    parser.add_argument('--port', default=SERVER_PORT, type=int, help="Server port (with --serve)")
+    parser.add_argument('--script',
+                         help="Run headless: JSONL protocol requests from this file ('-' for stdin), "
+                              "one JSON response per line")
+    parser.add_argument('--output', help="Where the --script responses go (default stdout)")
+    parser.add_argument('--no-metrics',
+                         action='store_true',
+                         help="Don't instrument the ATM operations and the data store")
+    parser.add_argument('--metrics-port', default=METRICS_PORT, type=int,
+                         help="Prometheus scrape endpoint port (with --serve)")
+    parser.add_argument('--metrics-dump', help="Write the metrics as JSON to this file on exit")
+    parser.add_argument('--migrate-passwords',
+                         action='store_true',
+                         help="Hash every plaintext password in the data store and exit")
 
     args = parser.parse_args()
 
@@ -18,7 +60,109 @@ if __name__ == '__main__':
         atm_handler = AtmEphemeralHandler()
 
     elif args.mode == 'file':
-        atm_handler = AtmFileHandler(data_file=DATA_FILE_PATH)
+        atm_handler = AtmFileHandler(data_file=DATA_FILE_PATH, columnar=args.columnar)
 
-    cli = ATMCLI(atm_handler=atm_handler)
-    cli.run()
+    elif args.mode == 'journal':
+        atm_handler = AtmJournalHandler(data_file=DATA_FILE_PATH,
+                                        journal_file=JOURNAL_FILE_PATH,
+                                        compact_every=JOURNAL_COMPACT_EVERY,
+                                        columnar=args.columnar)
+
+    elif args.mode == 'sqlite':
+        atm_handler = AtmSqliteHandler(db_file=SQLITE_FILE_PATH)
+        # first run - import the existing data.json
+        if len(atm_handler.get_users()) == 0:
+            file_handler = AtmFileHandler(data_file=DATA_FILE_PATH)
+            atm_handler.save_data(file_handler.get_users(), file_handler.get_passwords(), file_handler.get_accounts())
+        # bounded record cache in front of the queries, the password migration below writes without the journal
+        if not args.migrate_passwords:
+            atm_handler = AtmCachingHandler(atm_handler)
+
+    elif args.mode == 'ledger':
+        # first run - convert the existing data.json
+        if not os.path.exists(LEDGER_FILE_PATH):
+            convert_json_to_ledger(DATA_FILE_PATH, LEDGER_FILE_PATH, f"{LEDGER_FILE_PATH}.users.json")
+        atm_handler = AtmLedgerHandler(ledger_file=LEDGER_FILE_PATH, compact_every=JOURNAL_COMPACT_EVERY)
+
+    elif args.mode == 'sharded':
+        atm_handler = AtmShardedHandler(data_file=DATA_FILE_PATH, shard_count=SHARD_COUNT,
+                                        compact_every=JOURNAL_COMPACT_EVERY)
+        # first run - split the existing data.json
+        if not all(os.path.exists(path) for path in atm_handler.shard_files):
+            file_handler = AtmFileHandler(data_file=DATA_FILE_PATH)
+            atm_handler.save_data(file_handler.get_users(), file_handler.get_passwords(), file_handler.get_accounts())
+
+    metrics = MetricsRegistry(enabled=METRICS_ENABLED and not args.no_metrics)
+    metrics.instrument(atm_handler, HANDLER_OPERATIONS, "atm_storage")
+
+    # the note inventory lives in the data store, handlers that can't keep it run without one
+    cash = None
+    inventory = atm_handler.get_inventory()
+    if inventory is not None:
+        if not inventory:
+            inventory.update(CASSETTES)
+            atm_handler.save_changes({"cassettes": {str(note): count for note, count in inventory.items()}})
+        cash = CashDispenser(inventory)
+
+    if args.migrate_passwords:
+        hasher = PasswordHasher()
+        migrated = migrate_passwords(atm_handler.get_passwords(), hasher)
+        hasher.close()
+        if atm_handler.save_data(atm_handler.get_users(), atm_handler.get_passwords(), atm_handler.get_accounts()):
+            print(f"{migrated} plaintext passwords hashed.")
+        else:
+            print("Failed to save the migrated passwords.")
+    elif args.serve and args.cluster:
+        # the ledger process owns the handler, history, limits and dispenser from here on (and saves on exit)
+        cluster = ATMCluster(atm_handler, workers=args.cluster,
+                             flush_interval=FLUSH_INTERVAL_SECONDS,
+                             flush_threshold=FLUSH_DIRTY_THRESHOLD,
+                             history=TransactionHistory(HISTORY_DIR, segment_size=HISTORY_SEGMENT_SIZE),
+                             limits=WithdrawalLimits(),
+                             cash=cash)
+        cluster.start()
+        cluster.run_workers(serve_worker, args.host, args.port)
+        try:
+            cluster.join()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if not cluster.stop():
+                print("Failed to save customer data.")
+    elif args.serve:
+        history = TransactionHistory(HISTORY_DIR, segment_size=HISTORY_SEGMENT_SIZE)
+        try:
+            asyncio.run(serve(atm_handler, args.host, args.port, FLUSH_INTERVAL_SECONDS, FLUSH_DIRTY_THRESHOLD,
+                              history=history, limits=WithdrawalLimits(), cash=cash,
+                              metrics=metrics, metrics_port=args.metrics_port,
+                              group_commit=GROUP_COMMIT_ENABLED))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            history.close()
+    else:
+        history = TransactionHistory(HISTORY_DIR, segment_size=HISTORY_SEGMENT_SIZE)
+        cli = ATMCLI(atm_handler=atm_handler,
+                     flush_interval=FLUSH_INTERVAL_SECONDS,
+                     flush_threshold=FLUSH_DIRTY_THRESHOLD,
+                     history=history,
+                     limits=WithdrawalLimits(),
+                     cash=cash,
+                     metrics=metrics)
+        if args.script:
+            source = sys.stdin if args.script == '-' else open(args.script, 'r', encoding='utf-8')
+            sink = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+            cli.io_interface = BufferedIOInterface(source, sink)
+            try:
+                cli.run_script()
+            finally:
+                for stream in (source, sink):
+                    if stream not in (sys.stdin, sys.stdout):
+                        stream.close()
+        else:
+            cli.run()
+        history.close()
+
+    if args.metrics_dump and metrics.enabled:
+        with open(args.metrics_dump, 'w', encoding='utf-8') as f:
+            f.write(metrics.to_json())
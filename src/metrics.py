@@ -0,0 +1,193 @@
+import functools
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, List, Mapping, Tuple
+
+from config import METRICS_BUCKETS_SECONDS
+
+# HDR-style log-linear buckets over nanoseconds: values below 2 * SUB_BUCKETS get a bucket each, above that every
+# power of two is split into SUB_BUCKETS linear sub-buckets, so a bucket is never wider than 1 / SUB_BUCKETS of its
+# value (~6% with 16) and a recording is a bit_length and a shift.
+SUB_BUCKET_BITS = 4
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+
+# operation label -> ATM method. the private methods are the ones every entry point (ATM, Session, protocol) ends in
+ATM_OPERATIONS = {
+    "authenticate": "_verify_credentials",
+    "get_balance": "_get_balance",
+    "withdraw": "_withdraw",
+    "deposit": "_deposit",
+    "transfer": "_transfer",
+}
+HANDLER_OPERATIONS = {
+    "load_data": "load_data",
+    "save_data": "save_data",
+    "save_changes": "save_changes",
+    "append": "append",
+    "append_many": "append_many",
+}
+
+
+def bucket_of(nanoseconds: int) -> int:
+    if nanoseconds < 2 * SUB_BUCKETS:
+        return max(nanoseconds, 0)
+    shift = nanoseconds.bit_length() - SUB_BUCKET_BITS - 1
+    return shift * SUB_BUCKETS + (nanoseconds >> shift)
+
+
+def bucket_upper_bound(bucket: int) -> int:
+    # the largest value (nanoseconds) recorded into bucket
+    if bucket < 2 * SUB_BUCKETS:
+        return bucket
+    shift = bucket // SUB_BUCKETS - 1
+    return ((bucket - shift * SUB_BUCKETS + 1) << shift) - 1
+
+
+# Per (metric, operation) latency histogram of one thread: [bucket -> count, count, total nanoseconds, errors]
+Series = List[Any]
+
+
+# Counters and latency histograms for the hot path. Every thread records into its own dicts (a threading.local),
+# there is no lock and no shared write on the hot path, the threads' series are only merged by the exporters.
+# Instrumentation replaces methods on an instance - with metrics disabled nothing is wrapped, so the cost is zero.
+class MetricsRegistry:
+    def __init__(self, enabled: bool = True, clock: Callable[[], int] = time.perf_counter_ns) -> None:
+        self.enabled = enabled
+        self.clock = clock
+        self._local = threading.local()
+        self._shards: List[Dict[Tuple[str, str], Series]] = []
+        self._lock = threading.Lock()
+
+    def _shard(self) -> Dict[Tuple[str, str], Series]:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+
+    def record(self, metric: str, operation: str, nanoseconds: int, error: bool = False) -> None:
+        shard = self._shard()
+        series = shard.get((metric, operation))
+        if series is None:
+            series = shard[(metric, operation)] = [{}, 0, 0, 0]
+        buckets = series[0]
+        bucket = bucket_of(nanoseconds)
+        buckets[bucket] = buckets.get(bucket, 0) + 1
+        series[1] += 1
+        series[2] += nanoseconds
+        if error:
+            series[3] += 1
+
+    def timed(self, metric: str, operation: str, func: Callable) -> Callable:
+        clock = self.clock
+        record = self.record
+        local = self._local
+        key = (metric, operation)
+        small = 2 * SUB_BUCKETS
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = clock()
+            try:
+                result = func(*args, **kwargs)
+            except BaseException:
+                record(metric, operation, clock() - start, True)
+                raise
+            elapsed = clock() - start
+            # record() inlined for the success path, it runs on every call
+            try:
+                series = local.shard[key]
+            except (AttributeError, KeyError):
+                record(metric, operation, elapsed)
+                return result
+            if elapsed < small:
+                bucket = elapsed if elapsed > 0 else 0
+            else:
+                shift = elapsed.bit_length() - SUB_BUCKET_BITS - 1
+                bucket = shift * SUB_BUCKETS + (elapsed >> shift)
+            buckets = series[0]
+            buckets[bucket] = buckets.get(bucket, 0) + 1
+            series[1] += 1
+            series[2] += elapsed
+            return result
+        return wrapper
+
+    def instrument(self, target: Any, operations: Mapping[str, str], metric: str) -> None:
+        # operations - operation label -> method name, the wrapper is set on this instance only,
+        # methods the target doesn't have (e.g. append of a handler without a journal) are skipped
+        if not self.enabled:
+            return
+        for operation, method in operations.items():
+            if hasattr(target, method):
+                setattr(target, method, self.timed(metric, operation, getattr(target, method)))
+
+    def snapshot(self) -> Dict[Tuple[str, str], Series]:
+        # the threads' series merged, the owning threads keep recording while this runs
+        with self._lock:
+            shards = list(self._shards)
+        merged: Dict[Tuple[str, str], Series] = {}
+        for shard in shards:
+            for key, (buckets, _, total, errors) in list(shard.items()):
+                series = merged.setdefault(key, [{}, 0, 0, 0])
+                # the count comes from the copied buckets, not the series - the owner may record between the two
+                # reads, and a bucket above +Inf / _count is not a valid histogram
+                for bucket, bucket_count in dict(buckets).items():
+                    series[0][bucket] = series[0].get(bucket, 0) + bucket_count
+                    series[1] += bucket_count
+                series[2] += total
+                series[3] += errors
+        return merged
+
+    def prometheus_text(self, bounds_seconds: Tuple[float, ...] = METRICS_BUCKETS_SECONDS) -> str:
+        lines: List[str] = []
+        by_metric: Dict[str, List[Tuple[str, Series]]] = {}
+        for (metric, operation), series in sorted(self.snapshot().items()):
+            by_metric.setdefault(metric, []).append((operation, series))
+        for metric, entries in by_metric.items():
+            lines.append(f"# TYPE {metric}_seconds histogram")
+            for operation, (buckets, count, total, _) in entries:
+                ordered = sorted(buckets.items())
+                cumulative, position = 0, 0
+                for bound in bounds_seconds:
+                    while position < len(ordered) and bucket_upper_bound(ordered[position][0]) <= bound * 1e9:
+                        cumulative += ordered[position][1]
+                        position += 1
+                    lines.append(f'{metric}_seconds_bucket{{operation="{operation}",le="{bound:g}"}} {cumulative}')
+                lines.append(f'{metric}_seconds_bucket{{operation="{operation}",le="+Inf"}} {count}')
+                lines.append(f'{metric}_seconds_sum{{operation="{operation}"}} {total / 1e9:.9f}')
+                lines.append(f'{metric}_seconds_count{{operation="{operation}"}} {count}')
+            lines.append(f"# TYPE {metric}_errors_total counter")
+            for operation, series in entries:
+                lines.append(f'{metric}_errors_total{{operation="{operation}"}} {series[3]}')
+        return "\n".join(lines) + "\n"
+
+    def to_dict(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        # metric -> operation -> count / errors / mean and percentiles in seconds
+        result: Dict[str, Dict[str, Dict[str, float]]] = {}
+        for (metric, operation), (buckets, count, total, errors) in sorted(self.snapshot().items()):
+            summary: Dict[str, float] = {"count": count, "errors": errors, "mean": total / count / 1e9 if count else 0.0}
+            summary.update(percentiles(buckets, count, (("p50", 0.5), ("p90", 0.9), ("p99", 0.99), ("max", 1.0))))
+            result.setdefault(metric, {})[operation] = summary
+        return result
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=2)
+
+
+def percentiles(buckets: Dict[int, int], count: int, quantiles) -> Dict[str, float]:
+    # upper bound of the bucket holding each rank, in seconds
+    result = {}
+    ordered = sorted(buckets.items())
+    for name, quantile in quantiles:
+        rank = max(1, int(quantile * count + 0.5))
+        seen = 0
+        for bucket, bucket_count in ordered:
+            seen += bucket_count
+            if seen >= rank:
+                result[name] = bucket_upper_bound(bucket) / 1e9
+                break
+        else:
+            result[name] = 0.0
+    return result
@@ -0,0 +1,36 @@
+from decimal import Decimal, InvalidOperation
+from typing import Any
+
+from exceptions import InvalidAmountError
+
+# Money is an int number of minor units (cents) everywhere inside the ATM,
+# conversion from / to major units only happens at the edges (CLI input / output, legacy data files).
+CENTS_PER_UNIT = 100
+
+
+def to_cents(amount: Any) -> int:
+    # exact conversion of a major unit amount ("10.5", 10.5, 10) to cents, str(float) keeps 0.1 as "0.1"
+    if isinstance(amount, bool):
+        raise InvalidAmountError(f"Invalid amount: {amount!r}.")
+    if isinstance(amount, int):
+        return amount * CENTS_PER_UNIT
+    try:
+        value = Decimal(str(amount).strip())
+    except InvalidOperation:
+        raise InvalidAmountError(f"Invalid amount: {amount!r}.")
+    if not value.is_finite():
+        raise InvalidAmountError(f"Invalid amount: {amount!r}.")
+    cents = value * CENTS_PER_UNIT
+    if cents != cents.to_integral_value():
+        raise InvalidAmountError(f"Invalid amount: {amount!r} has more than 2 decimal places.")
+    return int(cents)
+
+
+def format_cents(cents: int) -> str:
+    sign = "-" if cents < 0 else ""
+    units, remainder = divmod(abs(cents), CENTS_PER_UNIT)
+    return f"{sign}{units}.{remainder:02d}"
+
+
+def is_cents(amount: Any) -> bool:
+    return isinstance(amount, int) and not isinstance(amount, bool)
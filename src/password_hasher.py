@@ -0,0 +1,143 @@
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, MutableMapping, Optional, Tuple
+
+from config import AUTH_CACHE_SIZE, AUTH_CACHE_TTL_SECONDS, KDF_WORKERS, PBKDF2_ITERATIONS
+from dao import Password
+
+# Salted PBKDF2 password hashes, stored in Password.password as "pbkdf2_sha256$<iterations>$<salt>$<hash>".
+# Entries without the prefix are plaintext from older data.json files, they still verify and are re-hashed on the
+# next successful login (or all at once with main.py --migrate-passwords).
+
+ALGORITHM = "pbkdf2_sha256"
+
+
+def is_hashed(stored: str) -> bool:
+    return stored.startswith(ALGORITHM + "$")
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.b64encode(data).decode("ascii")
+
+
+def _derive(password: str, salt: bytes, iterations: int) -> bytes:
+    # hashlib releases the GIL while deriving, KDF workers really run in parallel
+    return hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, iterations)
+
+
+# Bounded LRU of recent successful verifications, entries expire ttl seconds after they were added.
+class VerificationCache:
+    def __init__(self, max_size: int = AUTH_CACHE_SIZE, ttl: float = AUTH_CACHE_TTL_SECONDS,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[bytes, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[str, str]) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= self.clock():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: Tuple[str, str], value: bytes) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, self.clock() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class PasswordHasher:
+    def __init__(self, iterations: Optional[int] = None, max_workers: int = KDF_WORKERS,
+                 cache: Optional[VerificationCache] = None) -> None:
+        self.iterations = iterations or PBKDF2_ITERATIONS
+        # KDF work runs on a bounded pool - a login storm queues here instead of taking every server thread / core
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="kdf")
+        self.cache = cache if cache is not None else VerificationCache()
+        # the cache holds keyed fingerprints of the passwords, never the passwords themselves
+        self._fingerprint_key = secrets.token_bytes(32)
+
+    def hash(self, password: str) -> str:
+        return self.executor.submit(self._hash, password).result()
+
+    def _hash(self, password: str) -> str:
+        salt = secrets.token_bytes(16)
+        derived = _derive(password, salt, self.iterations)
+        return f"{ALGORITHM}${self.iterations}${_b64encode(salt)}${_b64encode(derived)}"
+
+    def verify(self, user_id: str, password: str, stored: str) -> bool:
+        if not is_hashed(stored):
+            return hmac.compare_digest(password.encode("utf-8"), stored.encode("utf-8"))
+        # the stored hash is part of the key, a password change makes the old entry unreachable
+        key = (user_id, stored)
+        fingerprint = hmac.new(self._fingerprint_key, password.encode("utf-8"), hashlib.sha256).digest()
+        cached = self.cache.get(key)
+        if cached is not None and hmac.compare_digest(cached, fingerprint):
+            return True
+        try:
+            # a malformed stored hash fails the login (binascii.Error is a ValueError), it never raises out of here
+            _, iterations, salt, expected = stored.split("$")
+            expected_bytes = base64.b64decode(expected)
+            derived = self.executor.submit(_derive, password, base64.b64decode(salt), int(iterations)).result()
+        except ValueError:
+            return False
+        if not hmac.compare_digest(derived, expected_bytes):
+            return False
+        self.cache.put(key, fingerprint)
+        return True
+
+    def needs_rehash(self, stored: str) -> bool:
+        return not is_hashed(stored) or stored.split("$")[1] != str(self.iterations)
+
+    def close(self) -> None:
+        self.executor.shutdown()
+
+
+# shared by every ATM that isn't given a hasher, one KDF pool and verification cache per process.
+# created on first use and forgotten in a forked child, the parent's pool threads don't exist there
+_default_hasher: Optional[PasswordHasher] = None
+_default_hasher_lock = threading.Lock()
+
+
+def default_password_hasher() -> PasswordHasher:
+    global _default_hasher
+    with _default_hasher_lock:
+        if _default_hasher is None:
+            _default_hasher = PasswordHasher()
+        return _default_hasher
+
+
+def _forget_default_hasher() -> None:
+    global _default_hasher, _default_hasher_lock
+    _default_hasher, _default_hasher_lock = None, threading.Lock()
+
+
+os.register_at_fork(after_in_child=_forget_default_hasher)
+
+
+def migrate_passwords(passwords: MutableMapping[str, Password], hasher: PasswordHasher) -> int:
+    # hashes every plaintext entry in place, returns how many were migrated
+    plaintext = [password for password in passwords.values() if not is_hashed(password.password)]
+    for password, hashed in zip(plaintext, hasher.executor.map(lambda p: hasher._hash(p.password), plaintext)):
+        password.password = hashed
+    return len(plaintext)
@@ -0,0 +1,134 @@
+import threading
+import time
+from collections import OrderedDict
+from itertools import islice
+from typing import Callable, Dict, List, Optional
+
+from config import LOGIN_FAILURES_PER_CLIENT, LOGIN_FAILURES_PER_USER, LOGIN_LIMITER_MAX_KEYS, LOGIN_REFILL_SECONDS
+from exceptions import TooManyAttemptsError
+
+# over max_keys, how many of the least recently used keys are searched for a refilled bucket before the oldest goes
+EVICTION_SCAN = 64
+
+# Token buckets keyed by an arbitrary string, one [tokens, updated_at] pair per key.
+# A bucket that refilled completely is the same as no bucket at all, so keys are kept in LRU order and the idle
+# ones are dropped from the front - memory follows the number of recently active keys, max_keys caps it.
+class RateLimiter:
+    def __init__(self, capacity: int, refill_seconds: float, max_keys: int = LOGIN_LIMITER_MAX_KEYS,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self.capacity = capacity
+        # seconds to earn back one token
+        self.refill_seconds = refill_seconds
+        self.max_keys = max_keys
+        self.clock = clock
+        self.idle_after = capacity * refill_seconds
+        self._buckets: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evicted = 0
+
+    def available(self, key: str) -> bool:
+        with self._lock:
+            bucket = self._buckets.get(key)
+            return bucket is None or self._refill(bucket, self.clock()) >= 1
+
+    def consume(self, key: str) -> bool:
+        # takes one token, False if there was none
+        with self._lock:
+            now = self.clock()
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [float(self.capacity), now]
+            else:
+                self._buckets.move_to_end(key)
+            allowed = self._refill(bucket, now) >= 1
+            if allowed:
+                bucket[0] -= 1
+            self._evict(now)
+            return allowed
+
+    def refund(self, key: str) -> None:
+        # gives back a token taken by consume()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket[0] = min(float(self.capacity), bucket[0] + 1)
+
+    def reset(self, key: str) -> None:
+        with self._lock:
+            self._buckets.pop(key, None)
+
+    def _refill(self, bucket: List[float], now: float) -> float:
+        tokens, updated_at = bucket
+        bucket[0] = min(float(self.capacity), tokens + (now - updated_at) / self.refill_seconds)
+        bucket[1] = now
+        return bucket[0]
+
+    def _evict(self, now: float) -> None:
+        while self._buckets:
+            key, (_, updated_at) = next(iter(self._buckets.items()))
+            if now - updated_at < self.idle_after:
+                break
+            del self._buckets[key]
+            self.evicted += 1
+        while len(self._buckets) > self.max_keys:
+            del self._buckets[self._victim(now)]
+            self.evicted += 1
+
+    def _victim(self, now: float) -> str:
+        # a bucket that is full again costs nothing to forget, dropping a locked out key would unlock it
+        for key, (tokens, updated_at) in islice(self._buckets.items(), EVICTION_SCAN):
+            if tokens + (now - updated_at) / self.refill_seconds >= self.capacity:
+                return key
+        return next(iter(self._buckets))
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+# Brute-force protection for ATM.authenticate: every login attempt takes a token from the user's bucket and from the
+# client's bucket before any password work is done, an empty bucket rejects it. The tokens are taken up front so a
+# burst of concurrent guesses can't all pass the check before the first failure is counted.
+# A successful login clears the user's bucket and gives the client's token back.
+class LoginLimiter:
+    def __init__(self, per_user: int = LOGIN_FAILURES_PER_USER, per_client: int = LOGIN_FAILURES_PER_CLIENT,
+                 refill_seconds: float = LOGIN_REFILL_SECONDS, max_keys: int = LOGIN_LIMITER_MAX_KEYS,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self.users = RateLimiter(per_user, refill_seconds, max_keys, clock)
+        self.clients = RateLimiter(per_client, refill_seconds, max_keys, clock)
+        self.allowed = 0
+        self.rejected = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def check(self, user_id: str, client_id: Optional[str] = None) -> None:
+        allowed = self.users.consume(user_id)
+        if allowed and client_id is not None and not self.clients.consume(client_id):
+            self.users.refund(user_id)
+            allowed = False
+        with self._lock:
+            if allowed:
+                self.allowed += 1
+            else:
+                self.rejected += 1
+        if not allowed:
+            raise TooManyAttemptsError("Authentication failed: Too many failed attempts, try again later.")
+
+    def record_failure(self, user_id: str, client_id: Optional[str] = None) -> None:
+        # the tokens were taken by check()
+        with self._lock:
+            self.failures += 1
+
+    def record_success(self, user_id: str, client_id: Optional[str] = None) -> None:
+        self.users.reset(user_id)
+        if client_id is not None:
+            self.clients.refund(client_id)
+
+    def counters(self) -> Dict[str, int]:
+        return {
+            "allowed": self.allowed,
+            "rejected": self.rejected,
+            "failures": self.failures,
+            "tracked_users": len(self.users),
+            "tracked_clients": len(self.clients),
+            "evicted": self.users.evicted + self.clients.evicted,
+        }
@@ -0,0 +1,114 @@
+import threading
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Dict, Iterator
+
+from exceptions import UnauthorizedAccessError
+
+if TYPE_CHECKING:
+    from atm import ATM
+    from transaction_history import StatementPage
+
+
+# One lock per key (account id / user id), created on first use.
+# hold() takes several locks in sorted order, so two transfers in opposite directions can't deadlock.
+class LockTable:
+    def __init__(self) -> None:
+        self._locks: Dict[str, threading.Lock] = {}
+        self._guard = threading.Lock()
+
+    def get(self, key: str) -> threading.Lock:
+        lock = self._locks.get(key)
+        if lock is None:
+            with self._guard:
+                lock = self._locks.setdefault(key, threading.Lock())
+        return lock
+
+    @contextmanager
+    def hold(self, *keys: str) -> Iterator[None]:
+        locks = [self.get(key) for key in sorted(set(keys))]
+        for lock in locks:
+            lock.acquire()
+        try:
+            yield
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+
+# Authenticated session returned by ATM.login, every operation runs as this session's user.
+# Sessions are independent of each other and of ATM.specific_user, so one ATM can serve many terminals.
+class Session:
+    def __init__(self, atm: "ATM", user_id: str, name: str) -> None:
+        self.atm = atm
+        self.user_id = user_id
+        self.name = name
+        self.active = True
+
+    def _check_active(self) -> None:
+        if not self.active:
+            raise UnauthorizedAccessError("Operation not allowed: User must be authenticated.")
+
+    def get_balance(self) -> Dict[str, int]:
+        self._check_active()
+        return self.atm._get_balance(self.user_id)
+
+    def withdraw(self, account_id: str, amount: int) -> None:
+        self._check_active()
+        self.atm._withdraw(self.user_id, account_id, amount)
+
+    def deposit(self, account_id: str, amount: int) -> None:
+        self._check_active()
+        self.atm._deposit(self.user_id, account_id, amount)
+
+    def transfer(self, from_account: str, to_account: str, amount: int) -> None:
+        self._check_active()
+        self.atm._transfer(self.user_id, from_account, to_account, amount)
+
+    def get_statement(self, account_id: str, since: int = 0, limit: int = 50) -> "StatementPage":
+        self._check_active()
+        return self.atm._get_statement(self.user_id, account_id, since, limit)
+
+    def change_password(self, new_password: str) -> None:
+        self._check_active()
+        self.atm._change_password(self.user_id, new_password)
+
+    def logout(self) -> None:
+        self.active = False
+
+
+# Shared / exclusive gate around commits. Commits enter shared (they never block each other),
+# a snapshot enters exclusive to see a state where no commit is half applied.
+class CommitGate:
+    def __init__(self) -> None:
+        self._condition = threading.Condition()
+        self._active = 0
+        self._closed = False
+
+    @contextmanager
+    def shared(self) -> Iterator[None]:
+        with self._condition:
+            while self._closed:
+                self._condition.wait()
+            self._active += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._active -= 1
+                if self._active == 0:
+                    self._condition.notify_all()
+
+    @contextmanager
+    def exclusive(self) -> Iterator[None]:
+        with self._condition:
+            while self._closed:
+                self._condition.wait()
+            self._closed = True
+            while self._active:
+                self._condition.wait()
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._closed = False
+                self._condition.notify_all()
@@ -0,0 +1,238 @@
+import bisect
+import gzip
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from atm_handler.atomic_file import atomic_write
+from dao import Transaction
+
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+ACTIVE_FILE = "active.jsonl"
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".jsonl.gz"
+INDEX_SUFFIX = ".idx.json"
+
+
+@dataclass
+class StatementPage:
+    transactions: List[Transaction] = field(default_factory=list)
+    # pass it as since to get the next page, None when there is nothing after this page
+    next_since: Optional[int] = None
+
+
+# Append-only history of every balance change, one entry per account leg (a transfer writes two).
+# Entries get a global sequence number, a per-account index keeps the sequence numbers of each account,
+# so a statement page is a bisect plus `limit` lookups whatever the size of the history.
+# The newest entries are appended to active.jsonl, every segment_size entries it is sealed into an immutable
+# gzip segment (segment-<first seq>.jsonl.gz) with a per-account index next to it (.idx.json).
+class TransactionHistory:
+    def __init__(self, directory: str, segment_size: int = 10000, cached_segments: int = 4,
+                 fsync: bool = True) -> None:
+        self.directory = directory
+        self.segment_size = segment_size
+        self.cached_segments = cached_segments
+        # record() returns once its entries are fsync'd, so an acknowledged operation is in the history as it is in
+        # the journal. concurrent records share one fsync (the first one in _sync covers everything written so far)
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        # statements only hand out entries up to here - a next_since token never names an entry a crash could lose,
+        # so the sequence numbers given out again after a crash were never seen by a client
+        self.durable_seq = 0
+        self._index: Dict[str, array] = {}
+        # first sequence number of every sealed segment, ascending
+        self._segment_starts: List[int] = []
+        self._segment_cache: "OrderedDict[int, List[Transaction]]" = OrderedDict()
+        self._active: List[Transaction] = []
+        self._active_file = None
+        self.next_seq = 1
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    @property
+    def active_path(self) -> str:
+        return os.path.join(self.directory, ACTIVE_FILE)
+
+    def segment_path(self, first_seq: int) -> str:
+        return os.path.join(self.directory, f"{SEGMENT_PREFIX}{first_seq:012d}{SEGMENT_SUFFIX}")
+
+    def _load(self) -> None:
+        starts = sorted(int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]) for name in os.listdir(self.directory)
+                        if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX))
+        for first_seq in starts:
+            last_seq = self._load_segment_index(first_seq)
+            self._segment_starts.append(first_seq)
+            self.next_seq = max(self.next_seq, last_seq + 1)
+        sealed_until = self.next_seq
+        for transaction in self._read_active():
+            # a crash between sealing a segment and truncating active.jsonl leaves sealed entries behind
+            if transaction.seq < sealed_until:
+                continue
+            self._active.append(transaction)
+            self._index_entry(transaction)
+            self.next_seq = transaction.seq + 1
+        self._active_file = open(self.active_path, 'a', encoding='utf-8')
+        self.durable_seq = self.next_seq - 1
+
+    def _load_segment_index(self, first_seq: int) -> int:
+        index_path = self.segment_path(first_seq) + INDEX_SUFFIX
+        try:
+            with open(index_path, 'r', encoding='utf-8') as f:
+                segment_index = json.load(f)
+        except (FileNotFoundError, ValueError):
+            # crash between writing the segment and its index - rebuild the index from the segment
+            segment_index = self._write_segment_index(first_seq, self._read_segment(first_seq))
+        for account_id, seqs in segment_index["accounts"].items():
+            self._index.setdefault(account_id, array('q')).extend(seqs)
+        return segment_index["last_seq"]
+
+    def _write_segment_index(self, first_seq: int, transactions: List[Transaction]) -> Dict:
+        accounts: Dict[str, List[int]] = {}
+        for transaction in transactions:
+            accounts.setdefault(transaction.account_id, []).append(transaction.seq)
+        segment_index = {"last_seq": transactions[-1].seq if transactions else first_seq - 1, "accounts": accounts}
+        with atomic_write(self.segment_path(first_seq) + INDEX_SUFFIX) as f:
+            json.dump(segment_index, f, separators=(",", ":"))
+        return segment_index
+
+    def _read_active(self) -> List[Transaction]:
+        transactions = []
+        valid_length = 0
+        try:
+            with open(self.active_path, 'rb') as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    try:
+                        transactions.append(Transaction.from_dict(json.loads(line)))
+                    except (ValueError, KeyError):
+                        break
+                    valid_length += len(line)
+                torn = f.seek(0, os.SEEK_END) > valid_length
+        except FileNotFoundError:
+            return transactions
+        if torn:
+            logging.warning("Ignoring torn entry at the end of '%s'.", self.active_path)
+            os.truncate(self.active_path, valid_length)
+        return transactions
+
+    def _read_segment(self, first_seq: int) -> List[Transaction]:
+        with gzip.open(self.segment_path(first_seq), 'rt', encoding='utf-8') as f:
+            return [Transaction.from_dict(json.loads(line)) for line in f]
+
+    def _index_entry(self, transaction: Transaction) -> None:
+        self._index.setdefault(transaction.account_id, array('q')).append(transaction.seq)
+
+    def record(self, operation: str, legs: Iterable[Tuple[str, int, int, Optional[str]]]) -> List[Transaction]:
+        # legs - (account_id, amount_cents, balance_cents after the change, counterparty account or None)
+        with self._lock:
+            timestamp = time.time()
+            transactions = []
+            for account_id, amount_cents, balance_cents, counterparty in legs:
+                transactions.append(Transaction(seq=self.next_seq, timestamp=timestamp, operation=operation,
+                                                account_id=account_id, amount_cents=amount_cents,
+                                                balance_cents=balance_cents, counterparty=counterparty))
+                self.next_seq += 1
+            self._active_file.write("".join(json.dumps(t.to_dict(), separators=(",", ":")) + "\n"
+                                            for t in transactions))
+            self._active_file.flush()
+            for transaction in transactions:
+                self._active.append(transaction)
+                self._index_entry(transaction)
+            if len(self._active) >= self.segment_size:
+                self._seal()
+            last_seq = self.next_seq - 1
+            if not self.fsync:
+                self.durable_seq = last_seq
+        if self.fsync:
+            self._sync(last_seq)
+        return transactions
+
+    def _sync(self, seq: int) -> None:
+        with self._sync_lock:
+            if self.durable_seq >= seq:
+                return
+            with self._lock:
+                # every entry below next_seq is flushed, a sealed segment is fsync'd when it is written
+                last_seq, fileno = self.next_seq - 1, self._active_file.fileno()
+            os.fsync(fileno)
+            self.durable_seq = last_seq
+
+    def _seal(self) -> None:
+        # the caller holds _lock
+        transactions, first_seq = self._active, self._active[0].seq
+        with atomic_write(self.segment_path(first_seq), binary=True) as f:
+            f.write(gzip.compress("".join(json.dumps(t.to_dict(), separators=(",", ":")) + "\n"
+                                          for t in transactions).encode('utf-8')))
+        self._write_segment_index(first_seq, transactions)
+        self._segment_starts.append(first_seq)
+        self._active_file.truncate(0)
+        self._active_file.seek(0)
+        self._active = []
+        logging.info("Sealed %s transactions into '%s'.", len(transactions), self.segment_path(first_seq))
+
+    def get_statement(self, account_id: str, since: int = 0, limit: int = 50) -> StatementPage:
+        # oldest first, the entries of account_id with a sequence number greater than since
+        if limit <= 0:
+            raise ValueError("Statement limit must be positive.")
+        with self._lock:
+            seqs = self._index.get(account_id)
+            if not seqs:
+                return StatementPage()
+            start = bisect.bisect_right(seqs, since)
+            end = bisect.bisect_right(seqs, self.durable_seq)
+            page = seqs[start:min(start + limit, end)]
+            transactions = [self._lookup(seq) for seq in page]
+            more = start + limit < end
+            return StatementPage(transactions, page[-1] if more else None)
+
+    def entries_since(self, timestamp: float) -> List[Transaction]:
+        # oldest first, walked back from the newest entry, so only the segments the time range spans are read
+        with self._lock:
+            entries: List[Transaction] = []
+            chunks = itertools.chain([self._active],
+                                     (self._segment(first_seq) for first_seq in reversed(self._segment_starts)))
+            for transactions in chunks:
+                for transaction in reversed(transactions):
+                    if transaction.timestamp < timestamp:
+                        entries.reverse()
+                        return entries
+                    entries.append(transaction)
+            entries.reverse()
+            return entries
+
+    def _lookup(self, seq: int) -> Transaction:
+        if self._active and seq >= self._active[0].seq:
+            return self._active[seq - self._active[0].seq]
+        first_seq = self._segment_starts[bisect.bisect_right(self._segment_starts, seq) - 1]
+        return self._segment(first_seq)[seq - first_seq]
+
+    def _segment(self, first_seq: int) -> List[Transaction]:
+        transactions = self._segment_cache.get(first_seq)
+        if transactions is None:
+            transactions = self._read_segment(first_seq)
+            self._segment_cache[first_seq] = transactions
+            if len(self._segment_cache) > self.cached_segments:
+                self._segment_cache.popitem(last=False)
+        else:
+            self._segment_cache.move_to_end(first_seq)
+        return transactions
+
+    def close(self) -> None:
+        with self._lock:
+            if self._active_file is not None:
+                self._active_file.flush()
+                os.fsync(self._active_file.fileno())
+                self._active_file.close()
+                self._active_file = None
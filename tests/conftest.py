@@ -0,0 +1,49 @@
+from typing import Callable, Dict, Optional, Tuple
+import pytest
+import password_hasher
+from atm import ATM
+from dao import User, Password, Account
+
+# the customers most tests start from: user1 owns acc1, user2 owns acc2
+CUSTOMERS = {"user1": ("John Doe", "password123"), "user2": ("Jane Smith", "securepass")}
+CustomerData = Tuple[Dict[str, User], Dict[str, Password], Dict[str, Account]]
+
+
+@pytest.fixture(autouse=True)
+def fast_password_hashing(monkeypatch) -> None:
+    # production iteration counts take a noticeable fraction of a second per hash
+    monkeypatch.setattr(password_hasher, "PBKDF2_ITERATIONS", 1000)
+
+
+@pytest.fixture
+def customer_data() -> Callable[..., CustomerData]:
+    # accounts - account_id -> owner_id, every account starts with balance_cents.
+    # hashed - store PBKDF2 hashes instead of plaintext (which a handler-backed ATM rehashes on the first login)
+    def make(balance_cents: int = 100000, accounts: Optional[Dict[str, str]] = None,
+             hashed: bool = False) -> CustomerData:
+        hasher = password_hasher.default_password_hasher()
+        users = {user_id: User(user_id=user_id, name=name) for user_id, (name, _) in CUSTOMERS.items()}
+        passwords = {user_id: Password(user_id=user_id, password=hasher.hash(password) if hashed else password)
+                     for user_id, (_, password) in CUSTOMERS.items()}
+        owners = {"acc1": "user1", "acc2": "user2"} if accounts is None else accounts
+        return users, passwords, {account_id: Account(account_id=account_id, owner_id=owner_id,
+                                                      balance_cents=balance_cents)
+                                  for account_id, owner_id in owners.items()}
+    return make
+
+
+@pytest.fixture
+def make_atm(customer_data: Callable[..., CustomerData]) -> Callable[..., ATM]:
+    # ATM over customer_data(...), the remaining keyword arguments go to ATM (limits, history, login_limiter...)
+    def make(balance_cents: int = 100000, accounts: Optional[Dict[str, str]] = None, **atm_kwargs) -> ATM:
+        return ATM(*customer_data(balance_cents, accounts), **atm_kwargs)
+    return make
+
+
+@pytest.fixture
+def customer_json(customer_data: Callable[..., CustomerData]) -> Callable[..., Dict[str, Dict[str, dict]]]:
+    # customer_data(...) in the data.json layout the file handlers load
+    def make(*args, **kwargs) -> Dict[str, Dict[str, dict]]:
+        return {name: {key: value.to_dict() for key, value in table.items()}
+                for name, table in zip(("users", "passwords", "accounts"), customer_data(*args, **kwargs))}
+    return make
@@ -0,0 +1,63 @@
+import json
+from atm import ATM
+from account_store import ColumnarAccountStore, StringIndex
+from atm_handler.atm_file_handler import AtmFileHandler
+from dao import User, Password
+
+
+RAW_ACCOUNTS = {
+    "acc1": {"owner_id": "user1", "balance_cents": 10000, "account_id": "acc1"},
+    "acc2": {"owner_id": "user2", "balance_cents": 20000, "account_id": "acc2"},
+    "acc3": {"owner_id": "user1", "balance_cents": 30000, "account_id": "acc3"},
+}
+
+
+def test_string_index_grows() -> None:
+    index = StringIndex()
+    rows = [index.add(f"key{i}") for i in range(1000)]
+    assert rows == list(range(1000))
+    assert index.get("key567") == 567
+    assert index.get("missing") == -1
+    assert index.add("key5") == 5
+
+
+def test_columnar_store_round_trip() -> None:
+    store = ColumnarAccountStore.from_dict(RAW_ACCOUNTS)
+    assert store.to_dict() == RAW_ACCOUNTS
+    assert "acc2" in store and "acc4" not in store
+    assert [account.account_id for account in store.accounts_by_owner()["user1"]] == ["acc1", "acc3"]
+
+
+def test_atm_runs_on_columnar_store() -> None:
+    store = ColumnarAccountStore.from_dict(RAW_ACCOUNTS)
+    atm = ATM({"user1": User(user_id="user1", name="John Doe")},
+              {"user1": Password(user_id="user1", password="password123")},
+              store, accounts_by_owner=store.accounts_by_owner())
+    atm.authenticate("user1", "password123")
+    atm.withdraw("acc1", 5000)
+    atm.transfer("acc3", "acc2", 10000)
+    assert atm.get_balance() == {"acc1": 5000, "acc3": 20000}
+    assert store.balances.tolist() == [5000, 30000, 20000]
+
+
+def test_file_handler_columnar_mode(tmp_path) -> None:
+    path = tmp_path / "data.json"
+    path.write_text(json.dumps({"users": {}, "passwords": {}, "accounts": RAW_ACCOUNTS}))
+    handler = AtmFileHandler(data_file=str(path), columnar=True)
+    accounts = handler.get_accounts()
+    accounts["acc2"].balance_cents = 25000
+    assert handler.save_data({}, {}, accounts)
+    assert json.loads(path.read_text())["accounts"]["acc2"]["balance_cents"] == 25000
+
+
+def test_owner_lookup_is_updated_row_by_row() -> None:
+    store = ColumnarAccountStore.from_dict(RAW_ACCOUNTS)
+    owners = store.accounts_by_owner()
+    assert [account.account_id for account in owners["user1"]] == ["acc1", "acc3"]
+    rows_by_owner = store._rows_by_owner
+    store.add("acc4", "user2", 0)
+    store["acc1"].owner_id = "user2"
+    # no rebuild of the whole map per opened / reassigned account
+    assert store._rows_by_owner is rows_by_owner
+    assert [account.account_id for account in owners["user1"]] == ["acc3"]
+    assert sorted(account.account_id for account in owners["user2"]) == ["acc1", "acc2", "acc4"]
@@ -16,8 +16,8 @@ def atm() -> ATM:
         "user2": Password(user_id="user2", password="securepass"),
     }
     accounts: Dict[str, Account] = {
-        "acc1": Account(account_id="acc1", owner_id="user1", balance=100.0),
-        "acc2": Account(account_id="acc2", owner_id="user2", balance=200.0),
+        "acc1": Account(account_id="acc1", owner_id="user1", balance_cents=10000),
+        "acc2": Account(account_id="acc2", owner_id="user2", balance_cents=20000),
     }
     return ATM(users, passwords, accounts)
 
@@ -38,7 +38,7 @@ def test_authenticate_nonexistent_user(atm: ATM) -> None:
 
 def test_get_balance_success(atm: ATM) -> None:
     atm.authenticate("user1", "password123")
-    assert atm.get_balance() == {"acc1": 100.0}
+    assert atm.get_balance() == {"acc1": 10000}
 
 
 def test_get_balance_without_authentication(atm: ATM) -> None:
@@ -48,74 +48,80 @@ def test_get_balance_without_authentication(atm: ATM) -> None:
 
 def test_withdraw_success(atm: ATM) -> None:
     atm.authenticate("user1", "password123")
-    atm.withdraw("acc1", 50.0)
-    assert atm.accounts["acc1"].balance == 50.0
+    atm.withdraw("acc1", 5000)
+    assert atm.accounts["acc1"].balance_cents == 5000
 
 
 def test_withdraw_invalid_amount(atm: ATM) -> None:
     atm.authenticate("user1", "password123")
     with pytest.raises(InvalidAmountError):
-        atm.withdraw("acc1", -50.0)
+        atm.withdraw("acc1", -5000)
 
 
 def test_withdraw_without_authentication(atm: ATM) -> None:
     with pytest.raises(UnauthorizedAccessError):
-        atm.withdraw("acc1", 50.0)
+        atm.withdraw("acc1", 5000)
 
 
 def test_transfer_success(atm: ATM) -> None:
     atm.authenticate("user1", "password123")
-    atm.transfer("acc1", "acc2", 50.0)
-    assert atm.accounts["acc1"].balance == 50.0
-    assert atm.accounts["acc2"].balance == 250.0
+    atm.transfer("acc1", "acc2", 5000)
+    assert atm.accounts["acc1"].balance_cents == 5000
+    assert atm.accounts["acc2"].balance_cents == 25000
 
 
 def test_transfer_to_nonexistent_account(atm: ATM) -> None:
     atm.authenticate("user1", "password123")
     with pytest.raises(AccountNotFoundError):
-        atm.transfer("acc1", "nonexistent_acc", 50.0)
+        atm.transfer("acc1", "nonexistent_acc", 5000)
 
 
 def test_transfer_without_authentication(atm: ATM) -> None:
     with pytest.raises(UnauthorizedAccessError):
-        atm.transfer("acc1", "acc2", 50.0)
+        atm.transfer("acc1", "acc2", 5000)
 
 
 def test_deposit_success(atm: ATM) -> None:
     atm.authenticate("user1", "password123")
-    atm.deposit("acc1", 50.0)
-    assert atm.accounts["acc1"].balance == 150.0
+    atm.deposit("acc1", 5000)
+    assert atm.accounts["acc1"].balance_cents == 15000
 
 
 def test_deposit_negative_amount(atm: ATM) -> None:
     atm.authenticate("user1", "password123")
     with pytest.raises(InvalidAmountError):
-        atm.deposit("acc1", -50.0)
+        atm.deposit("acc1", -5000)
 
 
 def test_deposit_to_nonexistent_account(atm: ATM) -> None:
     atm.authenticate("user1", "password123")
     with pytest.raises(AccountNotFoundError):
-        atm.deposit("nonexistent_acc", 50.0)
+        atm.deposit("nonexistent_acc", 5000)
 
 
 def test_deposit_unauthorized_access(atm: ATM) -> None:
     atm.authenticate("user1", "password123")
     with pytest.raises(UnauthorizedAccessError):
-        atm.deposit("acc2", 50.0)
+        atm.deposit("acc2", 5000)
 
 
 def test_deposit_without_authentication(atm: ATM) -> None:
     with pytest.raises(UnauthorizedAccessError):
-        atm.deposit("acc1", 50.0)
+        atm.deposit("acc1", 5000)
 
 
 def test_change_password_success(atm: ATM) -> None:
     atm.authenticate("user1", "password123")
     atm.change_password("newpassword123")
-    assert atm.passwords["user1"].password == "newpassword123"
+    assert atm.password_hasher.verify("user1", "newpassword123", atm.passwords["user1"].password)
 
 
 def test_change_password_without_authentication(atm: ATM) -> None:
     with pytest.raises(UnauthorizedAccessError):
         atm.change_password("newpassword123")
+
+
+def test_withdraw_fractional_amount_rejected(atm: ATM) -> None:
+    atm.authenticate("user1", "password123")
+    with pytest.raises(InvalidAmountError):
+        atm.withdraw("acc1", 50.5)
@@ -0,0 +1,148 @@
+import json
+import random
+import threading
+import pytest
+from atm import ATM
+from atm_handler.atm_caching_handler import AtmCachingHandler
+from atm_handler.atm_file_handler import AtmFileHandler
+from atm_handler.atm_sqlite_handler import AtmSqliteHandler
+from group_commit import GroupCommitter
+from exceptions import AccountNotFoundError
+from lazy_mapping import CachedMapping, LazyMapping
+
+
+@pytest.fixture
+def backend(tmp_path, customer_data) -> AtmSqliteHandler:
+    backend = AtmSqliteHandler(db_file=str(tmp_path / "data.db"))
+    owners = {f"acc{i}": "user1" if i < 3 else "user2" for i in range(20)}
+    backend.save_data(*customer_data(10000, owners, hashed=True))
+    yield backend
+    backend.close()
+
+
+def test_lru_by_entries_and_bytes() -> None:
+    loads = []
+    source = LazyMapping(lambda key: loads.append(key) or (f"value {key}" if key < 100 else None))
+    cache = CachedMapping(source, max_entries=3, negative_entries=2)
+    for key in (1, 2, 3, 1, 4):
+        assert cache[key] == f"value {key}"
+    # 2 was the least recently used
+    assert cache.cached_items() == {3: "value 3", 1: "value 1", 4: "value 4"}
+    assert cache.stats.evictions == 1 and cache.stats.hits == 1
+    assert 500 not in cache and 500 not in cache
+    assert loads == [1, 2, 3, 4, 500]
+    assert cache.stats.negative_hits == 1
+    # the source's own cache stays empty
+    assert source.loaded == {}
+
+    sized = CachedMapping({key: "x" * 100 for key in range(10)}, max_bytes=500, sizeof=len)
+    for key in range(10):
+        sized[key]
+    assert sized.cached == 5 and sized.bytes == 500
+
+
+def test_unknown_account_is_answered_from_the_negative_cache(backend: AtmSqliteHandler) -> None:
+    handler = AtmCachingHandler(backend, max_entries=100)
+    session = ATM.from_handler(handler).login("user1", "password123")
+    for _ in range(3):
+        with pytest.raises(AccountNotFoundError):
+            session.withdraw("nope", 100)
+    # every failed withdrawal looks the account up twice (the check and the error), one query in total
+    stats = handler.cache_stats()["accounts"]
+    assert stats["misses"] == 1 and stats["negative_hits"] == 5
+
+
+def test_evicted_accounts_stay_consistent(backend: AtmSqliteHandler, tmp_path) -> None:
+    handler = AtmCachingHandler(backend, max_entries=2)
+    atm = ATM.from_handler(handler)
+    session = atm.login("user1", "password123")
+    for i in range(10):
+        session.transfer(f"acc{i % 3}", f"acc{3 + i}", 100)
+    assert session.get_balance() == {"acc0": 9600, "acc1": 9700, "acc2": 9700}
+    assert handler.cache_stats()["accounts"]["evictions"] > 0
+    # an id remembered as unknown can still be opened
+    assert "acc99" not in atm.accounts
+    atm.open_account("user1", "acc99", 500)
+    assert atm.accounts["acc99"].balance_cents == 500
+    session.deposit("acc99", 100)
+    assert handler.save_data(atm.get_users(), atm.get_passwords(), atm.get_accounts())
+    handler.close()
+
+    reloaded = AtmSqliteHandler(db_file=str(tmp_path / "data.db"))
+    balances = {f"acc{i}": reloaded.get_accounts()[f"acc{i}"].balance_cents for i in (0, 3, 12)}
+    assert balances == {"acc0": 9600, "acc3": 10100, "acc12": 10100}
+    assert reloaded.get_accounts()["acc99"].balance_cents == 600
+    reloaded.close()
+
+
+def test_changed_account_is_not_reloaded_before_its_commit(backend: AtmSqliteHandler) -> None:
+    handler = AtmCachingHandler(backend, max_entries=1)
+    atm = ATM.from_handler(handler)
+
+    class ReadingJournal:
+        # another reader evicts acc0 and looks it up again between the change and the write
+        def __init__(self) -> None:
+            self.reads = 1
+
+        def append(self, record) -> None:
+            if self.reads:
+                self.reads -= 1
+                assert atm.accounts["acc1"].balance_cents == 10000
+                assert atm.accounts["acc0"].balance_cents == 9000
+            handler.append(record)
+
+    atm.journal = ReadingJournal()
+    session = atm.login("user1", "password123")
+    session.withdraw("acc0", 1000)
+    session.withdraw("acc0", 1000)
+    assert atm.accounts["acc0"].balance_cents == 8000
+    assert backend.query_one("SELECT balance_cents FROM accounts WHERE account_id = 'acc0'") == (8000,)
+
+
+def test_concurrent_withdrawals_through_a_tiny_cache(backend: AtmSqliteHandler) -> None:
+    handler = AtmCachingHandler(backend, max_entries=1)
+    atm = ATM.from_handler(handler)
+    atm.journal = GroupCommitter(atm.journal, max_wait=0.001)
+    session = atm.login("user2", "securepass")
+    done = threading.Event()
+
+    def withdraw(account_id: str) -> None:
+        for _ in range(20):
+            session.withdraw(account_id, 100)
+
+    def read() -> None:
+        rng = random.Random(1)
+        while not done.is_set():
+            atm.accounts[f"acc{rng.randrange(20)}"].balance_cents
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    threads = [threading.Thread(target=withdraw, args=(f"acc{i}",)) for i in range(3, 11)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    done.set()
+    reader.join()
+    assert [atm.accounts[f"acc{i}"].balance_cents for i in range(3, 11)] == [8000] * 8
+    assert backend.query_all("SELECT DISTINCT balance_cents FROM accounts WHERE owner_id = 'user2' "
+                             "AND account_id IN ('acc3', 'acc4', 'acc5', 'acc6', 'acc7', 'acc8', 'acc9', 'acc10')") \
+        == [(8000,)]
+
+
+def test_in_memory_backend_is_written_through(tmp_path) -> None:
+    data_file = tmp_path / "data.json"
+    data_file.write_text(json.dumps({
+        "users": {"user1": {"user_id": "user1", "name": "John Doe", "email": ""}},
+        "passwords": {"user1": {"user_id": "user1", "password": "password123"}},
+        "accounts": {"acc1": {"owner_id": "user1", "balance_cents": 10000, "account_id": "acc1"}},
+    }))
+    handler = AtmCachingHandler(AtmFileHandler(data_file=str(data_file)), max_entries=1)
+    atm = ATM.from_handler(handler)
+    atm.authenticate("user1", "password123")
+    atm.withdraw("acc1", 2000)
+    atm.open_account("user1", "acc2", 300)
+    assert handler.save_data(atm.get_users(), atm.get_passwords(), atm.get_accounts())
+    accounts = AtmFileHandler(data_file=str(data_file)).get_accounts()
+    assert accounts["acc1"].balance_cents == 8000
+    assert accounts["acc2"].balance_cents == 300
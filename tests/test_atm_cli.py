@@ -0,0 +1,41 @@
+import io
+import json
+from atm_cli import ATMCLI, BufferedIOInterface
+from atm_handler.atm_ephemeral_handler import AtmEphemeralHandler
+
+
+def run_script(lines) -> list:
+    cli = ATMCLI(atm_handler=AtmEphemeralHandler())
+    sink = io.StringIO()
+    cli.io_interface = BufferedIOInterface(io.StringIO("\n".join(lines) + "\n"), sink, buffer_lines=2)
+    cli.run_script()
+    return [json.loads(line) for line in sink.getvalue().splitlines()]
+
+
+def test_headless_script() -> None:
+    responses = run_script([
+        json.dumps({"op": "balance", "id": 1}),
+        json.dumps({"op": "login", "user_id": "1", "password": "111"}),
+        json.dumps({"op": "withdraw", "account_id": "1", "amount": 5000}),
+        "",
+        json.dumps({"op": "transfer", "from_account": "2", "to_account": "3", "amount": 100}),
+        "not json",
+        json.dumps({"op": "balance", "id": "last"}),
+    ])
+    assert [response["ok"] for response in responses] == [False, True, True, True, False, True]
+    assert responses[0]["error"] == "UnauthorizedAccessError"
+    assert responses[1]["result"] == {"name": "John Doe"}
+    assert responses[4]["error"] == "BadRequest"
+    assert responses[5] == {"ok": True, "result": {"1": 95000, "2": 199900}, "id": "last"}
+
+
+def test_interactive_run_with_buffered_io() -> None:
+    cli = ATMCLI(atm_handler=AtmEphemeralHandler())
+    sink = io.StringIO()
+    cli.io_interface = BufferedIOInterface(io.StringIO("1\n111\n1\n7\n-1\n"), sink)
+    cli.run()
+    output = sink.getvalue()
+    assert "Hello, John Doe!" in output
+    assert output.count("--- ATM Menu ---") == 2
+    assert "Your balance is: {'1': '1000.00', '2': '2000.00'}" in output
+    assert output.endswith("Customer data saved. Goodbye!\n")
@@ -0,0 +1,71 @@
+import json
+import os
+import pytest
+from atm import ATM
+from flusher import BackgroundFlusher
+from atm_handler.atm_file_handler import AtmFileHandler
+from password_hasher import PasswordHasher
+
+
+@pytest.fixture
+def data_file(tmp_path) -> str:
+    path = tmp_path / "data.json"
+    path.write_text(json.dumps({
+        "users": {"user1": {"user_id": "user1", "name": "John Doe", "email": ""}},
+        "passwords": {"user1": {"user_id": "user1", "password": PasswordHasher().hash("password123")}},
+        "accounts": {
+            "acc1": {"owner_id": "user1", "balance_cents": 10000, "account_id": "acc1"},
+            "acc2": {"owner_id": "user1", "balance_cents": 20000, "account_id": "acc2"},
+            "acc3": {"owner_id": "user1", "balance_cents": 30000, "account_id": "acc3"},
+        },
+    }))
+    return str(path)
+
+
+def test_collect_changes_holds_only_touched_objects(data_file: str) -> None:
+    atm = ATM.from_handler(AtmFileHandler(data_file=data_file))
+    atm.authenticate("user1", "password123")
+    atm.withdraw("acc1", 1000)
+    atm.transfer("acc1", "acc2", 500)
+    atm.change_password("newpassword")
+    changes = atm.collect_changes()
+    assert changes["balances"] == {"acc1": 8500, "acc2": 20500}
+    assert changes["passwords"] == {"user1": atm.passwords["user1"].password}
+    assert atm.collect_changes() == {"balances": {}, "passwords": {}}
+
+
+def test_save_changes_appends_to_delta_file(data_file: str) -> None:
+    handler = AtmFileHandler(data_file=data_file)
+    atm = ATM.from_handler(handler)
+    atm.authenticate("user1", "password123")
+    atm.deposit("acc3", 700)
+    assert handler.save_changes(atm.collect_changes())
+    handler.close()
+
+    # snapshot untouched, the change lives in the delta file
+    assert json.load(open(data_file))["accounts"]["acc3"]["balance_cents"] == 30000
+    with open(handler.delta_file) as f:
+        assert [json.loads(line) for line in f] == [{"balances": {"acc3": 30700}, "passwords": {}}]
+
+    reloaded = AtmFileHandler(data_file=data_file)
+    assert reloaded.get_accounts()["acc3"].balance_cents == 30700
+    # a full snapshot makes the delta records obsolete
+    assert reloaded.compact()
+    assert os.path.getsize(handler.delta_file) == 0
+    assert AtmFileHandler(data_file=data_file).get_accounts()["acc3"].balance_cents == 30700
+
+
+def test_delta_file_compacts_after_threshold(data_file: str) -> None:
+    handler = AtmFileHandler(data_file=data_file, compact_every=2)
+    atm = ATM.from_handler(handler)
+    flusher = BackgroundFlusher.attach(atm, handler, None, 100)
+    atm.authenticate("user1", "password123")
+    atm.deposit("acc1", 1)
+    assert flusher.flush()
+    atm.deposit("acc2", 2)
+    # the second delta record makes the flusher compact
+    assert flusher.flush()
+    handler.close()
+    assert os.path.getsize(handler.delta_file) == 0
+    accounts = json.load(open(data_file))["accounts"]
+    assert (accounts["acc1"]["balance_cents"], accounts["acc2"]["balance_cents"]) == (10001, 20002)
@@ -0,0 +1,124 @@
+import json
+import threading
+import time
+import pytest
+from atm import ATM
+from exceptions import ATMError
+from atm_handler.atm_journal_handler import AtmJournalHandler
+from password_hasher import PasswordHasher
+
+
+@pytest.fixture
+def data_file(tmp_path) -> str:
+    path = tmp_path / "data.json"
+    path.write_text(json.dumps({
+        "users": {"user1": {"user_id": "user1", "name": "John Doe", "email": ""}},
+        "passwords": {"user1": {"user_id": "user1", "password": PasswordHasher().hash("password123")}},
+        "accounts": {
+            "acc1": {"owner_id": "user1", "balance_cents": 10000, "account_id": "acc1"},
+            "acc2": {"owner_id": "user1", "balance_cents": 20000, "account_id": "acc2"},
+        },
+    }))
+    return str(path)
+
+
+def make_atm(handler: AtmJournalHandler) -> ATM:
+    return ATM(handler.get_users(), handler.get_passwords(), handler.get_accounts(), journal=handler.get_journal())
+
+
+def test_journal_is_replayed_on_startup(data_file: str) -> None:
+    handler = AtmJournalHandler(data_file=data_file)
+    atm = make_atm(handler)
+    atm.authenticate("user1", "password123")
+    atm.withdraw("acc1", 3000)
+    atm.transfer("acc1", "acc2", 2000)
+    atm.change_password("newpassword")
+    handler.close()
+
+    # snapshot untouched, the operations only live in the journal
+    assert json.load(open(data_file))["accounts"]["acc1"]["balance_cents"] == 10000
+
+    reloaded = AtmJournalHandler(data_file=data_file)
+    assert reloaded.get_accounts()["acc1"].balance_cents == 5000
+    assert reloaded.get_accounts()["acc2"].balance_cents == 22000
+    assert PasswordHasher().verify("user1", "newpassword", reloaded.get_passwords()["user1"].password)
+
+
+def test_journaled_changes_are_not_tracked(data_file: str) -> None:
+    handler = AtmJournalHandler(data_file=data_file)
+    atm = make_atm(handler)
+    atm.authenticate("user1", "password123")
+    atm.transfer("acc1", "acc2", 2000)
+    atm.open_account("user1", "acc3", 0)
+    atm.update_email("user1", "john@example.com")
+    # nothing drains them with a journal, they would hold every touched object for the life of the process
+    assert not atm.changed_accounts and not atm.changed_account_entries and not atm.changed_users
+    handler.close()
+
+
+def test_compaction_rewrites_snapshot_and_truncates_journal(data_file: str) -> None:
+    handler = AtmJournalHandler(data_file=data_file, compact_every=2)
+    atm = make_atm(handler)
+    atm.authenticate("user1", "password123")
+    atm.deposit("acc1", 1000)
+    atm.deposit("acc1", 1000)
+    handler.close()
+
+    assert json.load(open(data_file))["accounts"]["acc1"]["balance_cents"] == 12000
+    assert open(handler.journal_file).read() == ""
+
+
+def test_compaction_waits_for_a_failing_commit(data_file: str) -> None:
+    handler = AtmJournalHandler(data_file=data_file, compact_every=1)
+    atm = make_atm(handler)
+    session = atm.login("user1", "password123")
+    inside, release = threading.Event(), threading.Event()
+
+    class Journal:
+        # the acc2 record fails, after the acc1 commit made the journal due for compaction
+        def append(self, record) -> None:
+            if "acc2" in record.get("balances", {}):
+                inside.set()
+                release.wait(5)
+                raise OSError("disk full")
+            handler.append(record)
+
+    atm.journal = Journal()
+    errors = []
+
+    def failing() -> None:
+        try:
+            session.deposit("acc2", 5000)
+        except ATMError as e:
+            errors.append(e)
+
+    first = threading.Thread(target=failing)
+    first.start()
+    inside.wait(5)
+    second = threading.Thread(target=session.deposit, args=("acc1", 1000))
+    second.start()
+    time.sleep(0.1)
+    release.set()
+    first.join()
+    second.join()
+    handler.close()
+
+    assert len(errors) == 1
+    # the snapshot was taken after the rollback, the failed deposit is not in it
+    accounts = json.load(open(data_file))["accounts"]
+    assert (accounts["acc1"]["balance_cents"], accounts["acc2"]["balance_cents"]) == (11000, 20000)
+    assert open(handler.journal_file).read() == ""
+
+
+def test_torn_record_is_ignored(data_file: str) -> None:
+    handler = AtmJournalHandler(data_file=data_file)
+    atm = make_atm(handler)
+    atm.authenticate("user1", "password123")
+    atm.deposit("acc1", 1000)
+    handler.close()
+    with open(handler.journal_file, 'a') as f:
+        f.write('{"op": "deposit", "balan')
+
+    reloaded = AtmJournalHandler(data_file=data_file)
+    assert reloaded.get_accounts()["acc1"].balance_cents == 11000
+    assert open(handler.journal_file).read().count("\n") == 1
@@ -0,0 +1,89 @@
+import json
+import os
+import pytest
+from atm import ATM
+from atm_handler.atm_ledger_handler import AtmLedgerHandler
+from atm_handler.ledger_file import AccountLedger, convert_json_to_ledger, write_ledger
+from exceptions import ATMError
+
+
+@pytest.fixture
+def ledger_file(tmp_path, customer_json) -> str:
+    data_file = tmp_path / "data.json"
+    data = customer_json(10000, hashed=True)
+    data["accounts"]["acc2"]["balance_cents"] = 20000
+    # written before balances were cents
+    data["accounts"]["acc3"] = {"owner_id": "user1", "balance": 300.5, "account_id": "acc3"}
+    data_file.write_text(json.dumps(data))
+    path = str(tmp_path / "data.ledger")
+    assert convert_json_to_ledger(str(data_file), path, f"{path}.users.json") == 3
+    return path
+
+
+def test_lookups_match_what_was_written(tmp_path) -> None:
+    path = str(tmp_path / "big.ledger")
+    accounts = [(f"acc{i}", f"owner{i % 97}", i * 100) for i in range(2000)]
+    write_ledger(path, accounts)
+    ledger = AccountLedger(path)
+    for account_id, owner_id, balance in accounts:
+        row = ledger.row_of(account_id)
+        assert (ledger.account_id(row), ledger.owner_id(row), ledger.balance(row)) == (account_id, owner_id, balance)
+    assert ledger.row_of("missing") == -1
+    assert sorted(ledger.account_ids_of("owner5")) == sorted(a for a, o, _ in accounts if o == "owner5")
+    assert ledger.rows_of("nobody") == range(0)
+    ledger.close()
+
+
+def test_operations_update_the_ledger_in_place(ledger_file: str) -> None:
+    handler = AtmLedgerHandler(ledger_file=ledger_file)
+    atm = ATM.from_handler(handler)
+    atm.authenticate("user1", "password123")
+    assert atm.get_balance() == {"acc1": 10000, "acc3": 30050}
+    atm.transfer("acc1", "acc2", 2500)
+    handler.close()
+
+    # the journal is not compacted yet, the balances are already in the mapped file
+    ledger = AccountLedger(ledger_file)
+    assert ledger.balance(ledger.row_of("acc1")) == 7500
+    ledger.close()
+    reloaded = AtmLedgerHandler(ledger_file=ledger_file)
+    assert reloaded.get_accounts()["acc2"].balance_cents == 22500
+    reloaded.close()
+
+
+def test_failed_journal_write_leaves_the_ledger_untouched(ledger_file: str, monkeypatch) -> None:
+    handler = AtmLedgerHandler(ledger_file=ledger_file)
+    atm = ATM.from_handler(handler)
+    atm.authenticate("user1", "password123")
+
+    def fail(record):
+        raise OSError("disk full")
+    monkeypatch.setattr(handler, "_write_record", fail)
+    with pytest.raises(ATMError):
+        atm.withdraw("acc1", 1000)
+    assert handler.ledger.balance(handler.ledger.row_of("acc1")) == 10000
+    assert atm.get_balance()["acc1"] == 10000
+    handler.close()
+
+
+def test_compaction_flushes_and_empties_the_journal(ledger_file: str) -> None:
+    handler = AtmLedgerHandler(ledger_file=ledger_file, compact_every=2)
+    atm = ATM.from_handler(handler)
+    atm.authenticate("user1", "password123")
+    atm.deposit("acc1", 100)
+    atm.deposit("acc1", 100)
+    handler.close()
+    assert os.path.getsize(handler.delta_file) == 0
+    assert AtmLedgerHandler(ledger_file=ledger_file).get_accounts()["acc1"].balance_cents == 10200
+
+
+def test_accounts_cant_be_added(ledger_file: str) -> None:
+    handler = AtmLedgerHandler(ledger_file=ledger_file)
+    atm = ATM.from_handler(handler)
+    with pytest.raises(ATMError):
+        atm.open_account("user1", "acc9")
+    with pytest.raises(ATMError):
+        atm.reassign_account("acc1", "user2")
+    assert atm.accounts["acc1"].owner_id == "user1"
+    assert "acc9" not in atm.accounts
+    handler.close()
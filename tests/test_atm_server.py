@@ -0,0 +1,126 @@
+import asyncio
+import json
+import threading
+from typing import Dict, List
+from atm_server import ATMServer
+from metrics import ATM_OPERATIONS, MetricsRegistry
+from rate_limiter import LoginLimiter
+
+
+async def send(host: str, port: int, requests: List[Dict]) -> List[Dict]:
+    reader, writer = await asyncio.open_connection(host, port)
+    responses = []
+    for request in requests:
+        writer.write(json.dumps(request).encode() + b"\n")
+        await writer.drain()
+        responses.append(json.loads(await reader.readline()))
+    writer.close()
+    await writer.wait_closed()
+    return responses
+
+
+def test_protocol_round_trip(make_atm) -> None:
+    async def scenario() -> List[Dict]:
+        server = ATMServer(make_atm())
+        await server.start()
+        host, port = server.address
+        responses = await send(host, port, [
+            {"op": "balance"},
+            {"op": "authenticate", "user_id": "user1", "password": "password123"},
+            {"op": "withdraw", "account_id": "acc1", "amount": 10000, "id": 3},
+            {"op": "transfer", "from_account": "acc1", "to_account": "acc2", "amount": 5000},
+            {"op": "withdraw", "account_id": "acc1", "amount": -1},
+            {"op": "balance"},
+        ])
+        await server.close()
+        return responses
+
+    responses = asyncio.run(scenario())
+    assert responses[0]["error"] == "UnauthorizedAccessError"
+    assert responses[1] == {"ok": True, "result": {"name": "John Doe"}}
+    assert responses[2] == {"ok": True, "result": None, "id": 3}
+    assert responses[3]["ok"]
+    assert responses[4]["error"] == "InvalidAmountError"
+    assert responses[5]["result"] == {"acc1": 85000}
+
+
+def test_balance_runs_off_the_event_loop(make_atm) -> None:
+    # a sqlite / caching handler may query for it
+    threads = []
+
+    async def scenario() -> None:
+        server = ATMServer(make_atm())
+        handle = server.protocol.handle
+
+        def recording(state, request):
+            threads.append(threading.current_thread().name)
+            return handle(state, request)
+        server.protocol.handle = recording
+        await server.start()
+        host, port = server.address
+        await send(host, port, [{"op": "balance"}])
+        await server.close()
+
+    asyncio.run(scenario())
+    assert threads[0].startswith("atm-io")
+
+
+def test_many_concurrent_connections(make_atm) -> None:
+    # every login in flight holds one of the user's tokens until it succeeds
+    atm = make_atm(login_limiter=LoginLimiter(per_user=200))
+
+    async def scenario() -> None:
+        server = ATMServer(atm)
+        await server.start()
+        host, port = server.address
+        login = {"op": "authenticate", "user_id": "user1", "password": "password123"}
+        await asyncio.gather(*[send(host, port, [login, {"op": "deposit", "account_id": "acc1", "amount": 100}])
+                               for _ in range(200)])
+        await server.close()
+
+    asyncio.run(scenario())
+    assert atm.accounts["acc1"].balance_cents == 120000
+
+
+def test_oversized_line_is_rejected(make_atm) -> None:
+    async def scenario() -> List[Dict]:
+        server = ATMServer(make_atm())
+        await server.start()
+        host, port = server.address
+        reader, writer = await asyncio.open_connection(host, port)
+        writer.write(b"x" * (2 ** 18) + b"\n" + json.dumps({"op": "balance"}).encode() + b"\n")
+        await writer.drain()
+        responses = [json.loads(await reader.readline()), json.loads(await reader.readline())]
+        writer.close()
+        await writer.wait_closed()
+        await server.close()
+        return responses
+
+    too_long, next_request = asyncio.run(scenario())
+    assert too_long["message"] == "Request line too long."
+    # the connection is still usable
+    assert next_request["error"] == "UnauthorizedAccessError"
+
+
+def test_metrics_endpoint(make_atm) -> None:
+    metrics = MetricsRegistry()
+    atm = make_atm()
+    metrics.instrument(atm, ATM_OPERATIONS, "atm_operation")
+
+    async def scenario() -> bytes:
+        server = ATMServer(atm, metrics=metrics)
+        await server.start()
+        host, port = server.address
+        await send(host, port, [{"op": "authenticate", "user_id": "user1", "password": "password123"}])
+        metrics_server = await server.start_metrics(host)
+        reader, writer = await asyncio.open_connection(*metrics_server.sockets[0].getsockname()[:2])
+        writer.write(b"GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n")
+        await writer.drain()
+        response = await reader.read()
+        writer.close()
+        await server.close()
+        return response
+
+    response = asyncio.run(scenario())
+    assert response.startswith(b"HTTP/1.1 200 OK")
+    assert b'atm_operation_seconds_count{operation="authenticate"} 1' in response
@@ -0,0 +1,104 @@
+import os
+import pytest
+from atm import ATM
+from atm_handler.atm_sharded_handler import CASSETTE_SHARD, AtmShardedHandler, shard_of
+from cash_dispenser import CashDispenser
+from dao import User, Password, Account
+from exceptions import ATMError
+from password_hasher import PasswordHasher
+
+SHARDS = 3
+
+
+def account_ids() -> list:
+    # two accounts on the same shard and one on another
+    ids = [f"acc{i}" for i in range(50)]
+    first = ids[0]
+    same = next(aid for aid in ids[1:] if shard_of(aid, SHARDS) == shard_of(first, SHARDS))
+    other = next(aid for aid in ids[1:] if shard_of(aid, SHARDS) != shard_of(first, SHARDS))
+    return [first, same, other]
+
+
+@pytest.fixture
+def data_file(tmp_path) -> str:
+    path = str(tmp_path / "data.json")
+    handler = AtmShardedHandler(data_file=path, shard_count=SHARDS, workers=1)
+    users = {f"user{i}": User(user_id=f"user{i}", name=f"User {i}") for i in range(10)}
+    passwords = {uid: Password(user_id=uid, password=PasswordHasher().hash("password123")) for uid in users}
+    accounts = {aid: Account(owner_id="user1", balance_cents=10000, account_id=aid) for aid in account_ids()}
+    assert handler.save_data(users, passwords, accounts)
+    return path
+
+
+def test_data_is_partitioned_and_loaded_in_parallel(data_file: str) -> None:
+    handler = AtmShardedHandler(data_file=data_file, shard_count=SHARDS, workers=2)
+    assert all(os.path.exists(path) for path in handler.shard_files)
+    assert len(handler.get_users()) == 10
+    assert set(handler.get_accounts()) == set(account_ids())
+    assert handler.save_data(handler.get_users(), handler.get_passwords(), handler.get_accounts())
+
+
+def test_cross_shard_transfer_is_committed_with_two_phases(data_file: str) -> None:
+    first, same, other = account_ids()
+    handler = AtmShardedHandler(data_file=data_file, shard_count=SHARDS, workers=1)
+    atm = ATM.from_handler(handler)
+    atm.authenticate("user1", "password123")
+    atm.transfer(first, same, 1000)
+    assert not os.path.exists(handler.coordinator_log)
+    atm.transfer(first, other, 2000)
+    handler.close()
+    assert open(handler.coordinator_log).read().count("\n") == 1
+
+    reloaded = AtmShardedHandler(data_file=data_file, shard_count=SHARDS, workers=1)
+    accounts = reloaded.get_accounts()
+    assert (accounts[first].balance_cents, accounts[same].balance_cents, accounts[other].balance_cents) == \
+           (7000, 11000, 12000)
+
+
+def test_transaction_without_decision_is_aborted(data_file: str, monkeypatch) -> None:
+    first, _, other = account_ids()
+    handler = AtmShardedHandler(data_file=data_file, shard_count=SHARDS, workers=1)
+    atm = ATM.from_handler(handler)
+    atm.authenticate("user1", "password123")
+
+    def crash(txid):
+        raise OSError("crashed before the decision")
+    monkeypatch.setattr(handler, "_write_decision", crash)
+    with pytest.raises(ATMError):
+        atm.transfer(first, other, 2000)
+    handler.close()
+
+    # both parts are prepared in the shard journals, neither is applied
+    reloaded = AtmShardedHandler(data_file=data_file, shard_count=SHARDS, workers=1)
+    assert reloaded.get_accounts()[first].balance_cents == 10000
+    assert reloaded.get_accounts()[other].balance_cents == 10000
+
+
+def test_compaction_empties_journals_and_coordinator_log(data_file: str) -> None:
+    first, _, other = account_ids()
+    handler = AtmShardedHandler(data_file=data_file, shard_count=SHARDS, workers=1, compact_every=2)
+    atm = ATM.from_handler(handler)
+    atm.authenticate("user1", "password123")
+    atm.transfer(first, other, 500)
+    atm.transfer(other, first, 200)
+    handler.close()
+    assert os.path.getsize(handler.coordinator_log) == 0
+    assert all(os.path.getsize(shard.delta_file) == 0 for shard in handler.shards if os.path.exists(shard.delta_file))
+    reloaded = AtmShardedHandler(data_file=data_file, shard_count=SHARDS, workers=1)
+    assert reloaded.get_accounts()[other].balance_cents == 10300
+
+
+def test_cassettes_are_kept_in_one_shard(data_file: str) -> None:
+    first = account_ids()[0]
+    handler = AtmShardedHandler(data_file=data_file, shard_count=SHARDS, workers=1)
+    atm = ATM.from_handler(handler, cash=CashDispenser(handler.get_inventory()))
+    atm.load_cassettes({5000: 4})
+    atm.authenticate("user1", "password123")
+    atm.withdraw(first, 5000)
+    handler.close()
+    assert '"cassettes"' in open(handler.shards[CASSETTE_SHARD].delta_file).read()
+
+    reloaded = AtmShardedHandler(data_file=data_file, shard_count=SHARDS, workers=2)
+    assert reloaded.get_inventory() == {5000: 3}
+    assert reloaded.compact()
+    assert AtmShardedHandler(data_file=data_file, shard_count=SHARDS, workers=2).get_inventory() == {5000: 3}
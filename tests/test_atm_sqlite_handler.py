@@ -0,0 +1,60 @@
+import pytest
+from atm import ATM
+from atm_handler.atm_sqlite_handler import AtmSqliteHandler
+from cash_dispenser import CashDispenser
+from password_hasher import PasswordHasher
+
+
+@pytest.fixture
+def handler(tmp_path, customer_data) -> AtmSqliteHandler:
+    handler = AtmSqliteHandler(db_file=str(tmp_path / "data.db"))
+    handler.save_data(*customer_data(10000, {f"acc{i}": "user1" if i < 2 else "user2" for i in range(100)}))
+    yield handler
+    handler.close()
+
+
+def make_atm(handler: AtmSqliteHandler) -> ATM:
+    return ATM(handler.get_users(), handler.get_passwords(), handler.get_accounts(),
+               journal=handler.get_journal(), accounts_by_owner=handler.get_accounts_by_owner())
+
+
+def test_only_touched_accounts_are_loaded(handler: AtmSqliteHandler) -> None:
+    atm = make_atm(handler)
+    assert atm.authenticate("user1", "password123") == "John Doe"
+    assert atm.get_balance() == {"acc0": 10000, "acc1": 10000}
+    atm.transfer("acc0", "acc50", 2500)
+    assert set(handler.get_accounts().loaded) == {"acc0", "acc1", "acc50"}
+
+
+def test_operations_are_persisted(handler: AtmSqliteHandler, tmp_path) -> None:
+    atm = make_atm(handler)
+    atm.authenticate("user1", "password123")
+    atm.withdraw("acc1", 4000)
+    atm.change_password("newpassword")
+    handler.close()
+
+    reloaded = AtmSqliteHandler(db_file=str(tmp_path / "data.db"))
+    assert reloaded.get_accounts()["acc1"].balance_cents == 6000
+    assert PasswordHasher().verify("user1", "newpassword", reloaded.get_passwords()["user1"].password)
+    assert "missing" not in reloaded.get_accounts()
+    reloaded.close()
+
+
+def test_opened_and_reassigned_accounts_are_visible_to_owner_lookup(handler: AtmSqliteHandler) -> None:
+    atm = make_atm(handler)
+    atm.open_account("user1", "new", 700)
+    atm.reassign_account("acc0", "user2")
+    owner_index = handler.get_accounts_by_owner()
+    assert {a.account_id for a in owner_index["user1"]} == {"acc1", "new"}
+    assert "acc0" in {a.account_id for a in owner_index["user2"]}
+
+
+def test_cassettes_are_persisted(handler: AtmSqliteHandler, tmp_path) -> None:
+    atm = ATM.from_handler(handler, cash=CashDispenser(handler.get_inventory()))
+    atm.load_cassettes({5000: 4})
+    atm.login("user1", "password123").withdraw("acc1", 10000)
+    handler.close()
+
+    reloaded = AtmSqliteHandler(db_file=str(tmp_path / "data.db"))
+    assert reloaded.get_inventory() == {5000: 2}
+    reloaded.close()
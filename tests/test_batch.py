@@ -0,0 +1,73 @@
+import json
+from typing import Dict
+import pytest
+from atm import ATM
+from dao import User, Password, Account
+from exceptions import BatchError
+
+
+@pytest.fixture
+def atm() -> ATM:
+    users: Dict[str, User] = {"user1": User(user_id="user1", name="John Doe")}
+    passwords: Dict[str, Password] = {"user1": Password(user_id="user1", password="password123")}
+    accounts: Dict[str, Account] = {
+        "acc1": Account(account_id="acc1", owner_id="user1", balance_cents=10000),
+        "acc2": Account(account_id="acc2", owner_id="user2", balance_cents=20000),
+    }
+    return ATM(users, passwords, accounts)
+
+
+class RecordingJournal:
+    def __init__(self) -> None:
+        self.records = []
+
+    def append(self, record: Dict) -> None:
+        self.records.append(record)
+
+
+def test_batch_is_committed_as_one_record(atm: ATM) -> None:
+    atm.journal = RecordingJournal()
+    result = atm.apply_batch([
+        {"op": "deposit", "account_id": "acc1", "amount": 5000},
+        {"op": "transfer", "from_account": "acc2", "to_account": "acc1", "amount": 2500},
+        {"op": "withdraw", "account_id": "acc2", "amount": 500},
+    ])
+    assert result.applied == 3 and result.failures == {}
+    assert atm.accounts["acc1"].balance_cents == 17500
+    assert atm.accounts["acc2"].balance_cents == 17000
+    assert atm.journal.records == [{"op": "batch", "balances": {"acc1": 17500, "acc2": 17000}}]
+
+
+def test_atomic_batch_is_all_or_nothing(atm: ATM) -> None:
+    with pytest.raises(BatchError) as error:
+        atm.apply_batch([
+            {"op": "deposit", "account_id": "acc1", "amount": 5000},
+            {"op": "deposit", "account_id": "missing", "amount": 5000},
+            {"op": "deposit", "account_id": "acc1", "amount": -1},
+        ])
+    assert set(error.value.failures) == {1, 2}
+    assert atm.accounts["acc1"].balance_cents == 10000
+
+
+def test_non_atomic_batch_reports_per_item(atm: ATM) -> None:
+    result = atm.apply_batch([
+        {"op": "deposit", "account_id": "acc1", "amount": 5000},
+        {"op": "refund", "account_id": "acc1", "amount": 5000},
+        [1],
+        5,
+    ], atomic=False)
+    assert result.applied == 1 and list(result.failures) == [1, 2, 3]
+    assert atm.accounts["acc1"].balance_cents == 15000
+
+
+def test_batch_file_is_streamed_in_chunks(atm: ATM, tmp_path) -> None:
+    path = tmp_path / "settlement.jsonl"
+    lines = [json.dumps({"op": "deposit", "account_id": "acc1", "amount": 100}) for _ in range(10)]
+    lines.insert(4, "{not json")
+    lines.insert(7, "[1]")
+    path.write_text("\n".join(lines) + "\n")
+
+    result = atm.apply_batch_file(str(path), chunk_size=3)
+    assert result.applied == 10
+    assert list(result.failures) == [4, 7]
+    assert atm.accounts["acc1"].balance_cents == 11000
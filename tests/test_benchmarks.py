@@ -0,0 +1,34 @@
+import random
+from argparse import Namespace
+from benchmarks.datasets import Dataset, skewed_index
+from benchmarks.run_suite import regressions, run
+from benchmarks.workload import generate_operations
+
+
+def test_skewed_index_stays_in_range_and_favours_low_indexes() -> None:
+    rng = random.Random(1)
+    draws = [skewed_index(rng, 1000, 1.2) for _ in range(10000)]
+    assert min(draws) >= 0 and max(draws) < 1000
+    assert sum(draw < 10 for draw in draws) > 5000
+
+
+def test_every_user_owns_an_account() -> None:
+    dataset = Dataset(users=50, accounts=200, owner_skew=1.5).generate()
+    assert set(dataset.owners) == set(range(50))
+    for operation in generate_operations(dataset, 500):
+        if "account_id" in operation:
+            assert dataset.owners[int(operation["account_id"])] == int(operation["user_id"])
+
+
+def test_suite_runs_and_compares(tmp_path) -> None:
+    args = Namespace(mode="journal", accounts=300, users=None, owner_skew=1.0, account_skew=1.0, operations=500,
+                     cli_operations=20, threads=2, kdf_iterations=1000, seed=1, workdir=str(tmp_path))
+    results = run(args)
+    assert results["failures"] == 0
+    assert set(results["throughput"]) == {"atm", "cli", "cli_headless"}
+    assert results["latency"]["atm_storage"]["load_data"]["count"] == 1
+    assert sum(summary["count"] for summary in results["latency"]["atm_operation"].values()) >= 500
+    assert regressions(results, results, 0.2) == []
+    slower = {**results, "throughput": {"atm": results["throughput"]["atm"] / 2}}
+    assert regressions(slower, results, 0.2) == [f"throughput atm: {results['throughput']['atm']:,.0f}/s -> "
+                                                 f"{slower['throughput']['atm']:,.0f}/s"]
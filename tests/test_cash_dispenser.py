@@ -0,0 +1,70 @@
+import pytest
+from atm import ATM
+from atm_handler.atm_file_handler import AtmFileHandler
+from atm_handler.atm_journal_handler import AtmJournalHandler
+from cash_dispenser import CashDispenser, solve_notes
+from dao import User, Password, Account
+from exceptions import ATMError, UndispensableAmountError
+
+
+class FailingJournal:
+    def append(self, record) -> None:
+        raise OSError("disk full")
+
+
+def make_atm(cash: CashDispenser, journal=None) -> ATM:
+    users = {"user1": User(user_id="user1", name="John Doe")}
+    passwords = {"user1": Password(user_id="user1", password="password123")}
+    accounts = {"acc1": Account(owner_id="user1", balance_cents=1000000, account_id="acc1")}
+    return ATM(users, passwords, accounts, journal=journal, cash=cash)
+
+
+def test_solver_uses_the_fewest_notes_within_the_counts() -> None:
+    assert solve_notes(6000, (5000, 2000), (1, 3), 40) == (0, 3)
+    assert solve_notes(11000, (5000, 2000), (5, 5), 40) == (1, 3)
+    assert solve_notes(20000, (10000, 5000, 2000), (1, 5, 5), 40) == (1, 2, 0)
+    assert solve_notes(3000, (5000, 2000), (5, 5), 40) is None
+    assert solve_notes(20000, (2000,), (20,), 5) is None
+
+
+def test_plan_respects_the_inventory() -> None:
+    cash = CashDispenser({2000: 2, 5000: 1})
+    assert cash.plan(9000) == {5000: 1, 2000: 2}
+    assert cash.plan(11000) is None
+    assert cash.plan(1000) is None
+
+
+def test_undispensable_withdrawal_leaves_the_balance() -> None:
+    atm = make_atm(CashDispenser({2000: 10, 5000: 10}))
+    session = atm.login("user1", "password123")
+    with pytest.raises(UndispensableAmountError):
+        session.withdraw("acc1", 3000)
+    assert atm.accounts["acc1"].balance_cents == 1000000
+    session.withdraw("acc1", 9000)
+    assert atm.cash.counts == {2000: 8, 5000: 9}
+    assert atm.collect_changes()["cassettes"] == {"2000": 8, "5000": 9}
+
+
+def test_failed_commit_puts_the_notes_back() -> None:
+    atm = make_atm(CashDispenser({2000: 10}), journal=FailingJournal())
+    with pytest.raises(ATMError):
+        atm.login("user1", "password123").withdraw("acc1", 4000)
+    assert atm.cash.counts == {2000: 10}
+    assert atm.accounts["acc1"].balance_cents == 1000000
+
+
+def test_inventory_is_persisted_through_the_journal(tmp_path) -> None:
+    data_file = str(tmp_path / "data.json")
+    handler = AtmJournalHandler(data_file=data_file, journal_file=str(tmp_path / "data.journal"))
+    handler.save_data({"user1": User(user_id="user1", name="John Doe")},
+                      {"user1": Password(user_id="user1", password="password123")},
+                      {"acc1": Account(owner_id="user1", balance_cents=1000000, account_id="acc1")})
+    atm = ATM.from_handler(handler, cash=CashDispenser(handler.get_inventory()))
+    atm.load_cassettes({2000: 10, 10000: 5})
+    atm.login("user1", "password123").withdraw("acc1", 14000)
+    handler.close()
+
+    reopened = AtmJournalHandler(data_file=data_file, journal_file=str(tmp_path / "data.journal"))
+    assert reopened.get_inventory() == {2000: 8, 10000: 4}
+    assert reopened.compact()
+    assert AtmFileHandler(data_file=data_file).get_inventory() == {2000: 8, 10000: 4}
@@ -0,0 +1,105 @@
+import json
+import queue
+import threading
+import pytest
+from atm_handler.atm_file_handler import AtmFileHandler
+from cluster import STOP, ATMCluster, ClusterATM, Ledger, LedgerClient
+from exceptions import ATMError, InvalidAmountError, OutcomeUnknownError, TooManyAttemptsError, UnauthorizedAccessError
+from rate_limiter import LoginLimiter
+
+
+def test_ledger_acknowledges_a_batch_per_worker(make_atm) -> None:
+    requests, responses = queue.Queue(), [queue.Queue(), queue.Queue()]
+    for request in [(0, 1, "withdraw", ("user1", "acc1", 1000)), (1, 1, "balance", ("user2",)),
+                    (0, 2, "transfer", ("user1", "acc2", "acc1", 500)), STOP]:
+        requests.put(request)
+    Ledger(make_atm(), responses).run(requests)
+    for worker in (0, 1):
+        assert responses[worker].get()[0] == "snapshot"
+    assert responses[0].get() == ("acks", [(1, True, None),
+                                           (2, False, ("UnauthorizedAccessError",
+                                                       "Transfer failed: Unauthorized access."))])
+    assert responses[1].get() == ("acks", [(1, True, {"acc2": 100000})])
+
+
+def test_cluster_atm_forwards_to_the_ledger(make_atm) -> None:
+    ledger_atm = make_atm()
+    requests, responses = queue.Queue(), [queue.Queue(), queue.Queue()]
+    ledger = threading.Thread(target=Ledger(ledger_atm, responses).run, args=(requests,))
+    ledger.start()
+    atms = []
+    for worker in (0, 1):
+        _, users, passwords = responses[worker].get()
+        atms.append(ClusterATM(users, passwords, LedgerClient(worker, requests, responses[worker], passwords)))
+
+    session = atms[0].login("user1", "password123")
+    with pytest.raises(InvalidAmountError):
+        session.withdraw("acc1", -5)
+    session.withdraw("acc1", 2500)
+    assert session.get_balance() == {"acc1": 97500}
+    with pytest.raises(UnauthorizedAccessError):
+        session.deposit("acc2", 100)
+    session.change_password("newpassword")
+    # the other worker got the new hash from the ledger before the change was acknowledged
+    assert atms[1].login("user1", "newpassword").name == "John Doe"
+    requests.put(STOP)
+    ledger.join()
+    assert ledger_atm.accounts["acc1"].balance_cents == 97500
+
+
+def test_workers_share_the_login_limiter(make_atm) -> None:
+    requests, responses = queue.Queue(), [queue.Queue(), queue.Queue()]
+    ledger_atm = make_atm(login_limiter=LoginLimiter(per_user=3))
+    ledger = threading.Thread(target=Ledger(ledger_atm, responses).run, args=(requests,))
+    ledger.start()
+    atms = []
+    for worker in (0, 1):
+        _, users, passwords = responses[worker].get()
+        atms.append(ClusterATM(users, passwords, LedgerClient(worker, requests, responses[worker], passwords)))
+    for atm in (atms[0], atms[1], atms[0]):
+        with pytest.raises(UnauthorizedAccessError):
+            atm.login("user1", "wrong")
+    # the failures on both workers count against one bucket
+    with pytest.raises(TooManyAttemptsError):
+        atms[1].login("user1", "password123")
+    assert atms[0].login_limiter.counters()["failures"] == 3
+    requests.put(STOP)
+    ledger.join()
+
+
+def test_timed_out_mutation_has_an_unknown_outcome() -> None:
+    # nobody serves the queue, the request stays queued like one the ledger hasn't reached yet
+    client = LedgerClient(0, queue.Queue(), queue.Queue(), {}, timeout=0.01)
+    with pytest.raises(OutcomeUnknownError):
+        client.call("withdraw", "user1", "acc1", 1000)
+    with pytest.raises(ATMError) as error:
+        client.call("balance", "user1")
+    assert not isinstance(error.value, OutcomeUnknownError)
+
+
+def run_transfers(atm: ClusterATM, results) -> None:
+    session = atm.login("user1", "password123")
+    for _ in range(50):
+        session.transfer("acc1", "acc2", 100)
+    try:
+        session.withdraw("acc2", 100)
+    except UnauthorizedAccessError as e:
+        results.put(str(e))
+    results.put(session.get_balance())
+
+
+def test_workers_share_one_ledger(tmp_path, customer_json) -> None:
+    data_file = tmp_path / "data.json"
+    data_file.write_text(json.dumps(customer_json()))
+    cluster = ATMCluster(AtmFileHandler(data_file=str(data_file)), workers=2, timeout=30)
+    results = cluster.context.Queue()
+    cluster.start()
+    cluster.run_workers(run_transfers, results)
+    cluster.join()
+    assert cluster.stop()
+    outcomes = [results.get(timeout=5) for _ in range(4)]
+    assert outcomes.count("Withdrawal failed: Unauthorized access.") == 2
+    # the ledger saved on stop
+    accounts = AtmFileHandler(data_file=str(data_file)).get_accounts()
+    assert accounts["acc1"].balance_cents == 90000
+    assert accounts["acc2"].balance_cents == 110000
@@ -0,0 +1,70 @@
+import json
+import os
+import time
+import pytest
+from atm import ATM
+from atm_handler.atm_file_handler import AtmFileHandler
+from atm_handler.atomic_file import atomic_write
+from exceptions import DataFileCorruptedError
+from flusher import BackgroundFlusher
+from password_hasher import PasswordHasher
+
+
+@pytest.fixture
+def data_file(tmp_path) -> str:
+    path = tmp_path / "data.json"
+    path.write_text(json.dumps({
+        "users": {"user1": {"user_id": "user1", "name": "John Doe", "email": ""}},
+        "passwords": {"user1": {"user_id": "user1", "password": PasswordHasher().hash("password123")}},
+        "accounts": {"acc1": {"owner_id": "user1", "balance_cents": 10000, "account_id": "acc1"}},
+    }))
+    return str(path)
+
+
+def test_atomic_write_keeps_previous_file_on_failure(tmp_path) -> None:
+    path = str(tmp_path / "data.json")
+    with atomic_write(path) as f:
+        f.write("old")
+    with pytest.raises(RuntimeError):
+        with atomic_write(path) as f:
+            f.write("half written")
+            raise RuntimeError("crash")
+    assert open(path).read() == "old"
+    assert os.listdir(tmp_path) == ["data.json"]
+
+
+def test_corrupted_data_file_is_not_loaded_as_empty(data_file: str) -> None:
+    with open(data_file, "w") as f:
+        f.write('{"users": {"user1": {"user_id": "us')
+    with pytest.raises(DataFileCorruptedError):
+        AtmFileHandler(data_file=data_file).load_data()
+
+
+def test_flush_persists_dirty_state(data_file: str) -> None:
+    handler = AtmFileHandler(data_file=data_file)
+    atm = ATM.from_handler(handler)
+    flusher = BackgroundFlusher.attach(atm, handler, interval=None, dirty_threshold=100)
+    atm.authenticate("user1", "password123")
+    atm.withdraw("acc1", 2500)
+    assert flusher.dirty == 1
+    # not flushed yet, the snapshot on disk is unchanged
+    assert json.load(open(data_file))["accounts"]["acc1"]["balance_cents"] == 10000
+
+    assert flusher.stop()
+    assert flusher.dirty == 0
+    assert AtmFileHandler(data_file=data_file).get_accounts()["acc1"].balance_cents == 7500
+
+
+def test_threshold_wakes_the_flusher(data_file: str) -> None:
+    handler = AtmFileHandler(data_file=data_file)
+    atm = ATM.from_handler(handler)
+    flusher = BackgroundFlusher.attach(atm, handler, interval=60, dirty_threshold=2)
+    atm.authenticate("user1", "password123")
+    atm.deposit("acc1", 100)
+    atm.deposit("acc1", 100)
+    for _ in range(200):
+        if flusher.dirty == 0:
+            break
+        time.sleep(0.01)
+    assert AtmFileHandler(data_file=data_file).get_accounts()["acc1"].balance_cents == 10200
+    flusher.stop()
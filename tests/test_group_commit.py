@@ -0,0 +1,180 @@
+import threading
+import time
+from typing import Dict, List
+import pytest
+from atm import ATM
+from atm_handler.atm_journal_handler import AtmJournalHandler
+from cash_dispenser import CashDispenser
+from dao import User, Password, Account
+from exceptions import ATMError
+from group_commit import GroupCommitter
+from password_hasher import PasswordHasher
+
+
+class SlowJournal:
+    def __init__(self, fail: bool = False) -> None:
+        self.batches: List[List[Dict]] = []
+        self.fail = fail
+
+    def append_many(self, records: List[Dict]) -> None:
+        time.sleep(0.01)
+        if self.fail:
+            raise OSError("disk full")
+        self.batches.append(records)
+
+
+def append_concurrently(committer: GroupCommitter, threads: int, per_thread: int) -> List[Exception]:
+    errors: List[Exception] = []
+
+    def work(thread: int) -> None:
+        for i in range(per_thread):
+            try:
+                committer.append({"thread": thread, "i": i})
+            except Exception as e:
+                errors.append(e)
+
+    workers = [threading.Thread(target=work, args=(thread,)) for thread in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return errors
+
+
+def test_concurrent_appends_share_writes() -> None:
+    journal = SlowJournal()
+    committer = GroupCommitter(journal, max_batch=8, max_wait=0.005)
+    assert append_concurrently(committer, threads=8, per_thread=5) == []
+    records = [record for batch in journal.batches for record in batch]
+    assert len(records) == 40 and committer.records == 40
+    assert max(len(batch) for batch in journal.batches) <= 8
+    assert committer.batches < 40
+    # every thread's records are durable in the order it appended them
+    for thread in range(8):
+        assert [record["i"] for record in records if record["thread"] == thread] == list(range(5))
+
+
+def test_failed_batch_fails_every_caller() -> None:
+    committer = GroupCommitter(SlowJournal(fail=True), max_batch=4, max_wait=0.005)
+    errors = append_concurrently(committer, threads=4, per_thread=2)
+    assert len(errors) == 8 and all(isinstance(e, OSError) for e in errors)
+
+
+def test_journal_without_append_many_fails_only_the_bad_record() -> None:
+    class Journal:
+        def __init__(self) -> None:
+            self.records: List[Dict] = []
+
+        def append(self, record: Dict) -> None:
+            if record.get("bad"):
+                raise OSError("bad record")
+            self.records.append(record)
+
+    journal = Journal()
+    committer = GroupCommitter(journal)
+    committer.append({"good": 1})
+    with pytest.raises(OSError):
+        committer.append({"bad": 1})
+    assert journal.records == [{"good": 1}]
+
+
+def test_atm_commits_through_the_journal_handler(tmp_path) -> None:
+    data_file = str(tmp_path / "data.json")
+    handler = AtmJournalHandler(data_file=data_file)
+    handler.save_data({"user1": User(user_id="user1", name="John Doe")},
+                      {"user1": Password(user_id="user1", password=PasswordHasher().hash("password123"))},
+                      {f"acc{i}": Account(account_id=f"acc{i}", owner_id="user1", balance_cents=0) for i in range(4)})
+    atm = ATM.from_handler(handler)
+    atm.journal = committer = GroupCommitter(atm.journal, max_wait=0.002)
+    session = atm.login("user1", "password123")
+
+    def deposit(account_id: str) -> None:
+        for _ in range(25):
+            session.deposit(account_id, 100)
+
+    threads = [threading.Thread(target=deposit, args=(f"acc{i}",)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert committer.records == 100
+    handler.close()
+    # nothing was saved, the balances come back from the journal alone
+    accounts = AtmJournalHandler(data_file=data_file).get_accounts()
+    assert [accounts[f"acc{i}"].balance_cents for i in range(4)] == [2500] * 4
+
+
+def test_failed_group_commit_rolls_back() -> None:
+    atm = ATM({"user1": User(user_id="user1", name="John Doe")},
+              {"user1": Password(user_id="user1", password="password123")},
+              {"acc1": Account(account_id="acc1", owner_id="user1", balance_cents=10000)},
+              journal=GroupCommitter(SlowJournal(fail=True)))
+    session = atm.login("user1", "password123")
+    with pytest.raises(ATMError):
+        session.withdraw("acc1", 2000)
+    assert atm.accounts["acc1"].balance_cents == 10000
+
+
+def test_cash_withdrawals_share_a_batch() -> None:
+    # the dispenser is locked only while the notes are taken and the record queued, not through the write
+    journal = SlowJournal()
+    atm = ATM({"user1": User(user_id="user1", name="John Doe")},
+              {"user1": Password(user_id="user1", password=PasswordHasher().hash("password123"))},
+              {f"acc{i}": Account(account_id=f"acc{i}", owner_id="user1", balance_cents=10000) for i in range(8)},
+              journal=GroupCommitter(journal, max_wait=0.005), cash=CashDispenser({2000: 100}))
+    session = atm.login("user1", "password123")
+    threads = [threading.Thread(target=session.withdraw, args=(f"acc{i}", 2000)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    records = [record for batch in journal.batches for record in batch]
+    assert len(records) == 8 and max(len(batch) for batch in journal.batches) > 1
+    # after-images in take order, the last one is the inventory
+    assert [record["cassettes"]["2000"] for record in records] == list(range(99, 91, -1))
+    assert atm.cash.counts == {2000: 92}
+
+
+def test_failed_withdrawal_journals_the_returned_notes() -> None:
+    # the first withdrawal fails after the second one journaled an inventory without its notes
+    class Journal:
+        def __init__(self) -> None:
+            self.records: List[Dict] = []
+            self.second_done = threading.Event()
+
+        def submit(self, record: Dict) -> Dict:
+            self.records.append(record)
+            return record
+
+        def wait(self, record: Dict) -> None:
+            if record is self.records[0]:
+                self.second_done.wait(5)
+                raise OSError("disk full")
+            self.second_done.set()
+
+        def append(self, record: Dict) -> None:
+            self.records.append(record)
+
+    journal = Journal()
+    atm = ATM({"user1": User(user_id="user1", name="John Doe")},
+              {"user1": Password(user_id="user1", password=PasswordHasher().hash("password123"))},
+              {f"acc{i}": Account(account_id=f"acc{i}", owner_id="user1", balance_cents=10000) for i in range(2)},
+              journal=journal, cash=CashDispenser({2000: 10}))
+    session = atm.login("user1", "password123")
+    errors = []
+
+    def first() -> None:
+        try:
+            session.withdraw("acc0", 4000)
+        except ATMError as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=first)
+    thread.start()
+    while not journal.records:
+        time.sleep(0.001)
+    session.withdraw("acc1", 2000)
+    thread.join()
+    assert len(errors) == 1
+    assert [record["cassettes"] for record in journal.records] == [{"2000": 8}, {"2000": 7}, {"2000": 9}]
+    assert atm.cash.counts == {2000: 9}
@@ -0,0 +1,127 @@
+import json
+import random
+import threading
+import time
+import pytest
+from atm import ATM
+from atm_handler.atm_journal_handler import AtmJournalHandler
+from dao import User, Password, Account
+from exceptions import ATMError
+from index_manager import SortedBalanceIndex
+
+
+@pytest.fixture
+def atm() -> ATM:
+    users = {
+        "user1": User(user_id="user1", name="John Doe", email="john@example.com"),
+        "user2": User(user_id="user2", name="Jane Doe", email="jane@example.com"),
+    }
+    passwords = {
+        "user1": Password(user_id="user1", password="password123"),
+        "user2": Password(user_id="user2", password="password456"),
+    }
+    accounts = {
+        "acc1": Account(owner_id="user1", balance_cents=10000, account_id="acc1"),
+        "acc2": Account(owner_id="user1", balance_cents=20000, account_id="acc2"),
+        "acc3": Account(owner_id="user2", balance_cents=30000, account_id="acc3"),
+    }
+    return ATM(users, passwords, accounts)
+
+
+def test_sorted_balance_index_matches_a_sorted_list() -> None:
+    rng = random.Random(7)
+    entries = {f"acc{i}": rng.randrange(1000) for i in range(500)}
+    index = SortedBalanceIndex(((balance, aid) for aid, balance in entries.items()), load=8)
+    for _ in range(2000):
+        account_id = f"acc{rng.randrange(600)}"
+        if account_id in entries:
+            index.remove(entries.pop(account_id), account_id)
+        else:
+            entries[account_id] = rng.randrange(1000)
+            index.add(entries[account_id], account_id)
+    expected = sorted((balance, aid) for aid, balance in entries.items())
+    assert len(index) == len(expected)
+    assert list(index.range(200, 400)) == [e for e in expected if 200 <= e[0] <= 400]
+    assert index.top(5) == expected[::-1][:5]
+
+
+def test_balance_index_follows_operations(atm: ATM) -> None:
+    assert atm.indexes.top_balances(1) == [(30000, "acc3")]
+    atm.authenticate("user1", "password123")
+    atm.deposit("acc1", 25000)
+    assert atm.indexes.top_balances(2) == [(35000, "acc1"), (30000, "acc3")]
+    assert atm.indexes.accounts_in_balance_range(0, 30000) == [(20000, "acc2"), (30000, "acc3")]
+
+
+def test_open_and_reassign_account_update_owner_index(atm: ATM) -> None:
+    atm.indexes.top_balances(1)
+    atm.open_account("user2", "acc4", 500)
+    atm.reassign_account("acc1", "user2")
+    assert {a.account_id for a in atm.accounts_by_owner["user1"]} == {"acc2"}
+    assert {a.account_id for a in atm.accounts_by_owner["user2"]} == {"acc1", "acc3", "acc4"}
+    assert atm.indexes.accounts_in_balance_range(0, 1000) == [(500, "acc4")]
+    with pytest.raises(ATMError):
+        atm.open_account("user1", "acc4")
+
+
+def test_email_index(atm: ATM) -> None:
+    assert atm.indexes.user_by_email(" JOHN@example.com").user_id == "user1"
+    atm.update_email("user1", "johnny@example.com")
+    assert atm.indexes.user_by_email("john@example.com") is None
+    assert atm.indexes.user_id_by_email("johnny@example.com") == "user1"
+    with pytest.raises(ATMError):
+        atm.update_email("user2", "johnny@example.com")
+
+
+def test_concurrent_email_updates_claim_once(atm: ATM) -> None:
+    class SlowJournal:
+        def append(self, record) -> None:
+            time.sleep(0.05)
+
+    atm.journal = SlowJournal()
+    errors = []
+
+    def claim(user_id: str) -> None:
+        try:
+            atm.update_email(user_id, "shared@example.com")
+        except ATMError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=claim, args=(user_id,)) for user_id in ("user1", "user2")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(errors) == 1
+    owner = atm.indexes.user_id_by_email("shared@example.com")
+    assert [user.user_id for user in atm.users.values() if user.email == "shared@example.com"] == [owner]
+
+
+def test_parallel_rebuild_matches_serial(atm: ATM) -> None:
+    for i in range(100):
+        atm.open_account("user1", f"bulk{i}", (i * 37) % 1000)
+    serial = atm.indexes.accounts_in_balance_range(0, 10 ** 9)
+    atm.rebuild_indexes(workers=2)
+    assert atm.indexes.accounts_in_balance_range(0, 10 ** 9) == serial
+    assert len(atm.accounts_by_owner["user1"]) == 102
+
+
+def test_structural_changes_are_journaled(tmp_path) -> None:
+    data_file = tmp_path / "data.json"
+    data_file.write_text(json.dumps({
+        "users": {"user1": {"user_id": "user1", "name": "John Doe", "email": ""},
+                  "user2": {"user_id": "user2", "name": "Jane Doe", "email": ""}},
+        "passwords": {},
+        "accounts": {"acc1": {"owner_id": "user1", "balance_cents": 100, "account_id": "acc1"}},
+    }))
+    handler = AtmJournalHandler(data_file=str(data_file))
+    atm = ATM.from_handler(handler)
+    atm.open_account("user1", "acc2", 200)
+    atm.reassign_account("acc1", "user2")
+    atm.update_email("user2", "jane@example.com")
+    handler.close()
+
+    reloaded = ATM.from_handler(AtmJournalHandler(data_file=str(data_file)))
+    assert reloaded.accounts["acc2"].balance_cents == 200
+    assert [a.account_id for a in reloaded.accounts_by_owner["user2"]] == ["acc1"]
+    assert reloaded.indexes.user_id_by_email("jane@example.com") == "user2"
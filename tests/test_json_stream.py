@@ -0,0 +1,28 @@
+import io
+import json
+from atm_handler.json_stream import iter_sections, write_sections
+
+
+def test_round_trip_matches_json_module() -> None:
+    data = {
+        "users": {"1": {"user_id": "1", "name": "Jöhn \"Doe\"", "email": ""}},
+        "version": 3,
+        "accounts": {str(i): {"owner_id": "1", "balance_cents": 123456789 * i, "account_id": str(i)}
+                     for i in range(50)},
+        "passwords": {},
+    }
+    out = io.StringIO()
+    write_sections(out, [(name, section.items()) for name, section in data.items() if isinstance(section, dict)])
+    assert json.loads(out.getvalue()) == {name: section for name, section in data.items() if name != "version"}
+
+    expected = [(name, key, value) for name, section in data.items() if isinstance(section, dict)
+                for key, value in section.items()]
+    text = json.dumps(data, indent=2)
+    # tiny chunks cut strings, numbers and whitespace at every possible position
+    for chunk_size in (1, 3, 7, 4096):
+        assert list(iter_sections(io.StringIO(text), chunk_size)) == expected
+
+
+def test_empty_input() -> None:
+    assert list(iter_sections(io.StringIO(""))) == []
+    assert list(iter_sections(io.StringIO("{}"))) == []
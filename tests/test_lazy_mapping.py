@@ -0,0 +1,45 @@
+from typing import Dict, List
+import pytest
+from atm import ATM
+from dao import User, Password, Account
+from exceptions import AccountNotFoundError
+from lazy_mapping import LazyMapping, LazyOwnerIndex
+
+
+@pytest.fixture
+def store() -> Dict[str, Dict]:
+    return {
+        "users": {"user1": User(user_id="user1", name="John Doe")},
+        "passwords": {"user1": Password(user_id="user1", password="password123")},
+        "accounts": {f"acc{i}": Account(account_id=f"acc{i}", owner_id="user1" if i < 2 else f"user{i}",
+                                        balance_cents=10000) for i in range(10000)},
+    }
+
+
+def test_session_only_loads_touched_accounts(store: Dict[str, Dict]) -> None:
+    loads: List[str] = []
+
+    def load_account(account_id: str):
+        loads.append(account_id)
+        return store["accounts"].get(account_id)
+
+    accounts = LazyMapping(load_account)
+    atm = ATM(LazyMapping(store["users"].get), LazyMapping(store["passwords"].get), accounts,
+              accounts_by_owner=LazyOwnerIndex(lambda owner_id: ["acc0", "acc1"] if owner_id == "user1" else [],
+                                               accounts))
+    atm.authenticate("user1", "password123")
+    assert atm.get_balance() == {"acc0": 10000, "acc1": 10000}
+    atm.withdraw("acc0", 1000)
+    atm.transfer("acc1", "acc42", 1000)
+    with pytest.raises(AccountNotFoundError):
+        atm.deposit("missing", 1000)
+
+    assert sorted(set(loads)) == ["acc0", "acc1", "acc42", "missing"]
+    assert store["accounts"]["acc42"].balance_cents == 11000
+
+
+def test_lazy_mapping_keeps_loaded_objects() -> None:
+    mapping = LazyMapping({"a": Account(account_id="a", owner_id="u", balance_cents=100)}.get)
+    assert mapping["a"] is mapping["a"]
+    assert "b" not in mapping
+    assert list(mapping) == ["a"]
@@ -0,0 +1,121 @@
+import time
+import pytest
+from atm import ATM
+from exceptions import ATMError, LimitExceededError
+from limits import LimitRule, RollingWindow, WithdrawalLimits
+from transaction_history import TransactionHistory
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FailingJournal:
+    def append(self, record) -> None:
+        raise OSError("disk full")
+
+
+@pytest.fixture
+def clock() -> Clock:
+    return Clock()
+
+
+@pytest.fixture
+def limits(clock: Clock) -> WithdrawalLimits:
+    return WithdrawalLimits([LimitRule("daily withdrawal limit", "account", 24 * 3600, 24, max_amount_cents=50000),
+                             LimitRule("velocity", "user", 600, 10, max_count=3)], clock=clock)
+
+
+@pytest.fixture
+def atm(make_atm, limits: WithdrawalLimits) -> ATM:
+    return make_atm(balance_cents=1000000, accounts={"acc1": "user1", "acc2": "user1", "acc3": "user2"}, limits=limits)
+
+
+def test_window_totals_expire_bucket_by_bucket() -> None:
+    window = RollingWindow(window_seconds=100, buckets=10)
+    window.add("a", 500, 1, now=0)
+    window.add("a", 300, 1, now=55)
+    assert window.totals("a", now=99) == (800, 2)
+    assert window.totals("a", now=100) == (300, 1)
+    assert window.totals("a", now=1000) == (0, 0)
+
+
+def test_live_windows_are_never_evicted() -> None:
+    window = RollingWindow(window_seconds=100, buckets=10, max_keys=2)
+    window.add("a", 500, 1, now=0)
+    window.add("b", 500, 1, now=50)
+    # dropping a would reset its limit, the new key is refused instead
+    assert not window.admits("c", now=99)
+    assert window.totals("a", now=99) == (500, 1)
+    assert window.admits("c", now=100)
+    assert len(window) == 1
+
+
+def test_full_table_rejects_new_keys(clock: Clock) -> None:
+    limits = WithdrawalLimits([LimitRule("daily withdrawal limit", "account", 24 * 3600, 24, max_amount_cents=50000)],
+                              max_keys=1, clock=clock)
+    limits.reserve("user1", "acc1", 100)
+    with pytest.raises(LimitExceededError):
+        limits.reserve("user1", "acc2", 100)
+    assert limits.remaining("user1", "acc1") == [("daily withdrawal limit", 49900, None)]
+
+
+def test_limits_are_rebuilt_from_the_history(atm: ATM, tmp_path) -> None:
+    def restart() -> ATM:
+        limits = WithdrawalLimits([LimitRule("daily withdrawal limit", "account", 24 * 3600, 24,
+                                             max_amount_cents=50000),
+                                   LimitRule("velocity", "user", 600, 10, max_count=3)], clock=time.time)
+        history = TransactionHistory(str(tmp_path / "history"), segment_size=2)
+        return ATM(atm.users, atm.passwords, atm.accounts, history=history, limits=limits)
+
+    first = restart()
+    session = first.login("user1", "password123")
+    session.withdraw("acc1", 30000)
+    session.transfer("acc1", "acc3", 10000)
+    session.deposit("acc1", 90000)
+    first.history.close()
+
+    session = restart().login("user1", "password123")
+    # 40000 of the daily 50000 and 2 of the 3 operations were used before the restart, the deposit doesn't count
+    with pytest.raises(LimitExceededError):
+        session.withdraw("acc1", 10001)
+    session.withdraw("acc1", 10000)
+    with pytest.raises(LimitExceededError):
+        session.withdraw("acc2", 100)
+
+
+def test_daily_limit_counts_withdrawals_and_transfers(atm: ATM, clock: Clock) -> None:
+    session = atm.login("user1", "password123")
+    session.withdraw("acc1", 30000)
+    with pytest.raises(LimitExceededError):
+        session.transfer("acc1", "acc3", 20001)
+    session.transfer("acc1", "acc3", 20000)
+    assert atm.accounts["acc1"].balance_cents == 950000
+    clock.now = 24 * 3600
+    session.withdraw("acc1", 50000)
+
+
+def test_velocity_is_per_user(atm: ATM, clock: Clock) -> None:
+    john = atm.login("user1", "password123")
+    john.withdraw("acc1", 100)
+    john.withdraw("acc2", 100)
+    john.withdraw("acc1", 100)
+    with pytest.raises(LimitExceededError):
+        john.withdraw("acc2", 100)
+    atm.login("user2", "securepass").withdraw("acc3", 100)
+    clock.now = 600
+    john.withdraw("acc2", 100)
+
+
+def test_failed_commit_releases_the_reservation(atm: ATM, limits: WithdrawalLimits) -> None:
+    session = atm.login("user1", "password123")
+    atm.journal = FailingJournal()
+    with pytest.raises(ATMError):
+        session.withdraw("acc1", 50000)
+    assert limits.remaining("user1", "acc1") == [("daily withdrawal limit", 50000, None), ("velocity", None, 3)]
+    atm.journal = None
+    session.withdraw("acc1", 50000)
@@ -0,0 +1,82 @@
+import threading
+import pytest
+from exceptions import InvalidAmountError
+from atm_handler.atm_sqlite_handler import AtmSqliteHandler
+from metrics import ATM_OPERATIONS, HANDLER_OPERATIONS, MetricsRegistry, bucket_of, bucket_upper_bound
+
+
+def test_buckets_bound_the_relative_error() -> None:
+    for value in (0, 1, 31, 32, 33, 1000, 123456, 10 ** 9, 3 * 10 ** 11):
+        upper = bucket_upper_bound(bucket_of(value))
+        assert value <= upper <= value * 1.07 + 1
+        assert bucket_of(upper) == bucket_of(value)
+
+
+def test_operations_are_timed_and_errors_counted(make_atm) -> None:
+    metrics = MetricsRegistry()
+    atm = make_atm()
+    metrics.instrument(atm, ATM_OPERATIONS, "atm_operation")
+    session = atm.login("user1", "password123")
+    session.withdraw("acc1", 100)
+    with pytest.raises(InvalidAmountError):
+        session.withdraw("acc1", -1)
+    session.get_balance()
+
+    summary = metrics.to_dict()["atm_operation"]
+    assert summary["withdraw"]["count"] == 2 and summary["withdraw"]["errors"] == 1
+    assert summary["authenticate"]["count"] == 1
+    assert summary["get_balance"]["p99"] >= summary["get_balance"]["p50"] > 0
+    text = metrics.prometheus_text()
+    assert '# TYPE atm_operation_seconds histogram' in text
+    assert 'atm_operation_seconds_count{operation="withdraw"} 2' in text
+    assert 'atm_operation_seconds_bucket{operation="withdraw",le="+Inf"} 2' in text
+    assert 'atm_operation_errors_total{operation="withdraw"} 1' in text
+
+
+def test_threads_are_merged() -> None:
+    metrics = MetricsRegistry(clock=lambda: 0)
+    threads = [threading.Thread(target=lambda: [metrics.record("m", "op", 1000) for _ in range(1000)])
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert metrics.to_dict()["m"]["op"]["count"] == 4000
+
+
+def test_scrape_while_recording_is_a_valid_histogram() -> None:
+    metrics = MetricsRegistry()
+    done = threading.Event()
+
+    def record() -> None:
+        while not done.is_set():
+            metrics.record("m", "op", 1000)
+
+    thread = threading.Thread(target=record)
+    thread.start()
+    try:
+        for _ in range(200):
+            counts = [int(line.rsplit(" ", 1)[1]) for line in metrics.prometheus_text().splitlines()
+                      if line.startswith("m_seconds_bucket")]
+            # cumulative buckets, the last one is +Inf
+            assert counts == sorted(counts)
+    finally:
+        done.set()
+        thread.join()
+
+
+def test_nested_handler_calls_are_recorded_once(tmp_path) -> None:
+    metrics = MetricsRegistry()
+    handler = AtmSqliteHandler(db_file=str(tmp_path / "data.db"))
+    handler.get_accounts()
+    metrics.instrument(handler, HANDLER_OPERATIONS, "handler_operation")
+    handler.append({"op": "deposit", "balances": {}})
+    handler.save_changes({"balances": {}})
+    handler.close()
+    assert set(metrics.to_dict()["handler_operation"]) == {"append", "save_changes"}
+
+
+def test_disabled_registry_wraps_nothing(make_atm) -> None:
+    atm = make_atm()
+    MetricsRegistry(enabled=False).instrument(atm, ATM_OPERATIONS, "atm_operation")
+    assert "_withdraw" not in vars(atm)
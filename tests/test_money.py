@@ -0,0 +1,29 @@
+import pytest
+from dao import Account
+from exceptions import InvalidAmountError
+from money import format_cents, to_cents
+
+
+def test_to_cents_is_exact() -> None:
+    assert to_cents("10.5") == 1050
+    assert to_cents(0.1) == 10
+    assert to_cents(1014.5) == 101450
+    assert to_cents(7) == 700
+    assert sum(to_cents(0.1) for _ in range(10)) == to_cents(1)
+
+
+@pytest.mark.parametrize("amount", ["abc", "1.005", float("nan"), True])
+def test_to_cents_rejects_invalid_amounts(amount) -> None:
+    with pytest.raises(InvalidAmountError):
+        to_cents(amount)
+
+
+def test_format_cents() -> None:
+    assert format_cents(101450) == "1014.50"
+    assert format_cents(-5) == "-0.05"
+
+
+def test_account_reads_legacy_float_balance() -> None:
+    account = Account.from_dict({"owner_id": "1", "balance": 1014.5, "account_id": "1"})
+    assert account.balance_cents == 101450
+    assert account.to_dict() == {"owner_id": "1", "balance_cents": 101450, "account_id": "1"}
@@ -0,0 +1,92 @@
+import pytest
+import password_hasher
+from atm import ATM
+from dao import User, Password, Account
+from exceptions import UnauthorizedAccessError
+from password_hasher import PasswordHasher, VerificationCache, is_hashed, migrate_passwords
+
+
+class Journal:
+    def __init__(self) -> None:
+        self.records = []
+
+    def append(self, record) -> None:
+        self.records.append(record)
+
+
+@pytest.fixture
+def atm() -> ATM:
+    users = {"user1": User(user_id="user1", name="John Doe")}
+    passwords = {"user1": Password(user_id="user1", password="password123")}
+    accounts = {"acc1": Account(owner_id="user1", balance_cents=10000, account_id="acc1")}
+    return ATM(users, passwords, accounts, journal=Journal())
+
+
+def test_hash_is_salted_and_verifies() -> None:
+    hasher = PasswordHasher()
+    first, second = hasher.hash("secret"), hasher.hash("secret")
+    assert first != second
+    assert hasher.verify("user1", "secret", first)
+    assert not hasher.verify("user1", "wrong", first)
+
+
+def test_plaintext_entry_is_rehashed_on_login(atm: ATM) -> None:
+    atm.authenticate("user1", "password123")
+    stored = atm.passwords["user1"].password
+    assert is_hashed(stored)
+    assert atm.journal.records == [{"op": "change_password", "passwords": {"user1": stored}}]
+    # already hashed, the next login writes nothing
+    atm.authenticate("user1", "password123")
+    assert len(atm.journal.records) == 1
+    with pytest.raises(UnauthorizedAccessError):
+        atm.authenticate("user1", "wrong")
+
+
+def test_malformed_stored_hash_fails_the_login(atm: ATM) -> None:
+    for stored in ("pbkdf2_sha256$1000$c2FsdA==$not base64!", "pbkdf2_sha256$1000$%%%$aGFzaA==", "pbkdf2_sha256$x"):
+        atm.passwords["user1"].password = stored
+        with pytest.raises(UnauthorizedAccessError):
+            atm.authenticate("user1", "password123")
+
+
+def test_atms_share_the_default_hasher(atm: ATM) -> None:
+    other = ATM({}, {}, {})
+    assert atm.password_hasher is other.password_hasher is password_hasher.default_password_hasher()
+
+
+def test_cached_verification_skips_the_kdf(monkeypatch) -> None:
+    hasher = PasswordHasher()
+    stored = hasher.hash("secret")
+    derivations = []
+    derive = password_hasher._derive
+    monkeypatch.setattr(password_hasher, "_derive", lambda *args: derivations.append(args) or derive(*args))
+    assert hasher.verify("user1", "secret", stored)
+    assert hasher.verify("user1", "secret", stored)
+    assert len(derivations) == 1
+    # a wrong password never matches the cached fingerprint
+    assert not hasher.verify("user1", "wrong", stored)
+    assert len(derivations) == 2
+
+
+def test_cache_is_bounded_and_expires() -> None:
+    now = [0.0]
+    cache = VerificationCache(max_size=2, ttl=10, clock=lambda: now[0])
+    cache.put(("a", "1"), b"a")
+    cache.put(("b", "1"), b"b")
+    cache.get(("a", "1"))
+    cache.put(("c", "1"), b"c")
+    # b was the least recently used
+    assert cache.get(("b", "1")) is None
+    assert cache.get(("a", "1")) == b"a"
+    now[0] = 10
+    assert cache.get(("a", "1")) is None
+    assert len(cache) == 1
+
+
+def test_migrate_passwords() -> None:
+    hasher = PasswordHasher()
+    passwords = {"user1": Password(user_id="user1", password="password123"),
+                 "user2": Password(user_id="user2", password=hasher.hash("password456"))}
+    assert migrate_passwords(passwords, hasher) == 1
+    assert hasher.verify("user1", "password123", passwords["user1"].password)
+    assert hasher.verify("user2", "password456", passwords["user2"].password)
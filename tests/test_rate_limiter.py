@@ -0,0 +1,106 @@
+import pytest
+from atm import ATM
+from dao import User, Password, Account
+from exceptions import TooManyAttemptsError, UnauthorizedAccessError
+from rate_limiter import LoginLimiter, RateLimiter
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock() -> Clock:
+    return Clock()
+
+
+@pytest.fixture
+def atm(clock: Clock) -> ATM:
+    users = {"user1": User(user_id="user1", name="John Doe")}
+    passwords = {"user1": Password(user_id="user1", password="password123")}
+    accounts = {"acc1": Account(owner_id="user1", balance_cents=10000, account_id="acc1")}
+    return ATM(users, passwords, accounts,
+               login_limiter=LoginLimiter(per_user=3, per_client=5, refill_seconds=10, clock=clock))
+
+
+def test_bucket_refills_over_time(clock: Clock) -> None:
+    limiter = RateLimiter(capacity=2, refill_seconds=10, clock=clock)
+    assert limiter.consume("a") and limiter.consume("a")
+    assert not limiter.consume("a")
+    clock.now = 10
+    assert limiter.consume("a")
+    assert not limiter.available("a")
+
+
+def test_idle_keys_are_evicted(clock: Clock) -> None:
+    limiter = RateLimiter(capacity=2, refill_seconds=10, max_keys=2, clock=clock)
+    limiter.consume("a")
+    clock.now = 20
+    # a refilled completely, it is dropped as soon as another key is touched
+    limiter.consume("b")
+    assert len(limiter) == 1
+    limiter.consume("c")
+    limiter.consume("d")
+    assert len(limiter) == 2
+    assert limiter.evicted == 2
+
+
+def test_user_is_locked_out_after_failures(atm: ATM, clock: Clock) -> None:
+    for _ in range(3):
+        with pytest.raises(UnauthorizedAccessError):
+            atm.authenticate("user1", "wrong")
+    # even the right password is rejected while locked out
+    with pytest.raises(TooManyAttemptsError):
+        atm.authenticate("user1", "password123")
+    clock.now = 10
+    assert atm.authenticate("user1", "password123") == "John Doe"
+    assert atm.login_limiter.counters()["rejected"] == 1
+    assert atm.login_limiter.counters()["failures"] == 3
+
+
+def test_client_is_locked_out_across_users(atm: ATM) -> None:
+    for i in range(5):
+        with pytest.raises(UnauthorizedAccessError):
+            atm.authenticate(f"user{i}", "guess", client_id="10.0.0.1")
+    with pytest.raises(TooManyAttemptsError):
+        atm.authenticate("user1", "password123", client_id="10.0.0.1")
+    assert atm.authenticate("user1", "password123", client_id="10.0.0.2") == "John Doe"
+
+
+def test_rejected_attempt_does_no_password_work(atm: ATM, monkeypatch) -> None:
+    for _ in range(3):
+        with pytest.raises(UnauthorizedAccessError):
+            atm.authenticate("user1", "wrong")
+    monkeypatch.setattr(atm.password_hasher, "verify", lambda *args: pytest.fail("password was verified"))
+    with pytest.raises(TooManyAttemptsError):
+        atm.authenticate("user1", "wrong")
+
+
+def test_concurrent_guesses_are_capped_before_password_work(atm: ATM, monkeypatch) -> None:
+    # the tokens are taken by check(), attempts that are still verifying count against the limit
+    for _ in range(3):
+        atm.login_limiter.check("user1")
+    monkeypatch.setattr(atm.password_hasher, "verify", lambda *args: pytest.fail("password was verified"))
+    with pytest.raises(TooManyAttemptsError):
+        atm.authenticate("user1", "wrong")
+
+
+def test_successful_login_gives_the_client_token_back(atm: ATM) -> None:
+    for _ in range(5):
+        atm.authenticate("user1", "password123", client_id="10.0.0.1")
+    assert atm.authenticate("user1", "password123", client_id="10.0.0.1") == "John Doe"
+
+
+def test_locked_out_keys_are_evicted_last(clock: Clock) -> None:
+    limiter = RateLimiter(capacity=2, refill_seconds=10, max_keys=2, clock=clock)
+    limiter.consume("locked")
+    limiter.consume("locked")
+    limiter.consume("full")
+    limiter.refund("full")
+    limiter.consume("new")
+    assert not limiter.available("locked")
+    assert limiter.evicted == 1
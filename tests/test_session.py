@@ -0,0 +1,46 @@
+import threading
+import pytest
+from atm import ATM
+from exceptions import UnauthorizedAccessError
+
+
+@pytest.fixture
+def atm(make_atm) -> ATM:
+    return make_atm(balance_cents=1000000)
+
+
+def test_sessions_are_independent(atm: ATM) -> None:
+    john = atm.login("user1", "password123")
+    jane = atm.login("user2", "securepass")
+    assert john.get_balance() == {"acc1": 1000000}
+    assert jane.get_balance() == {"acc2": 1000000}
+    with pytest.raises(UnauthorizedAccessError):
+        jane.withdraw("acc1", 1000)
+    assert atm.specific_user is None
+
+
+def test_logged_out_session_is_rejected(atm: ATM) -> None:
+    session = atm.login("user1", "password123")
+    session.logout()
+    with pytest.raises(UnauthorizedAccessError):
+        session.get_balance()
+
+
+def test_concurrent_opposite_transfers_keep_total(atm: ATM) -> None:
+    john = atm.login("user1", "password123")
+    jane = atm.login("user2", "securepass")
+
+    def run(session, from_account: str, to_account: str) -> None:
+        for _ in range(500):
+            session.transfer(from_account, to_account, 100)
+            session.deposit(from_account, 100)
+
+    threads = [threading.Thread(target=run, args=(john, "acc1", "acc2")) for _ in range(4)]
+    threads += [threading.Thread(target=run, args=(jane, "acc2", "acc1")) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert atm.accounts["acc1"].balance_cents == 1200000
+    assert atm.accounts["acc2"].balance_cents == 1200000
@@ -0,0 +1,101 @@
+import os
+import pytest
+from atm import ATM
+from exceptions import ATMError, UnauthorizedAccessError
+from transaction_history import TransactionHistory, ACTIVE_FILE
+
+
+@pytest.fixture
+def history(tmp_path) -> TransactionHistory:
+    history = TransactionHistory(str(tmp_path / "history"), segment_size=5)
+    yield history
+    history.close()
+
+
+@pytest.fixture
+def atm(make_atm, history: TransactionHistory) -> ATM:
+    return make_atm(balance_cents=10000, history=history)
+
+
+def test_operations_are_recorded(atm: ATM) -> None:
+    session = atm.login("user1", "password123")
+    session.withdraw("acc1", 1000)
+    session.deposit("acc1", 500)
+    session.transfer("acc1", "acc2", 2500)
+    page = session.get_statement("acc1")
+    assert [(t.operation, t.amount_cents, t.balance_cents, t.counterparty) for t in page.transactions] == [
+        ("withdraw", -1000, 9000, None),
+        ("deposit", 500, 9500, None),
+        ("transfer", -2500, 7000, "acc2"),
+    ]
+    assert page.next_since is None
+    incoming = atm.login("user2", "securepass").get_statement("acc2").transactions
+    assert [(t.amount_cents, t.balance_cents, t.counterparty) for t in incoming] == [(2500, 12500, "acc1")]
+
+
+def test_statement_pages_across_segments(atm: ATM, history: TransactionHistory) -> None:
+    session = atm.login("user1", "password123")
+    for amount in range(1, 24):
+        session.deposit("acc1", amount)
+        atm.login("user2", "securepass").deposit("acc2", amount)
+    assert any(name.endswith(".jsonl.gz") for name in os.listdir(history.directory))
+
+    amounts, since = [], 0
+    while since is not None:
+        page = session.get_statement("acc1", since=since, limit=4)
+        amounts.extend(t.amount_cents for t in page.transactions)
+        since = page.next_since
+    assert amounts == list(range(1, 24))
+
+
+def test_history_survives_restart(atm: ATM, history: TransactionHistory) -> None:
+    session = atm.login("user1", "password123")
+    for amount in range(1, 8):
+        session.deposit("acc1", amount)
+    history.close()
+    with open(os.path.join(history.directory, ACTIVE_FILE), "a", encoding="utf-8") as f:
+        f.write('{"seq": 99, "timest')
+
+    reopened = TransactionHistory(history.directory, segment_size=5)
+    try:
+        assert [t.amount_cents for t in reopened.get_statement("acc1").transactions] == list(range(1, 8))
+        assert reopened.record("deposit", [("acc1", 8, 10036, None)])[0].seq == 8
+    finally:
+        reopened.close()
+
+
+def test_statement_hands_out_only_synced_entries(atm: ATM, history: TransactionHistory, monkeypatch) -> None:
+    session = atm.login("user1", "password123")
+    session.withdraw("acc1", 1000)
+
+    def fail(fd):
+        raise OSError("disk gone")
+    monkeypatch.setattr(os, "fsync", fail)
+    # the balance change is committed, its history entry could still be lost - no client may see its seq yet
+    session.deposit("acc1", 500)
+    page = session.get_statement("acc1")
+    assert [t.amount_cents for t in page.transactions] == [-1000]
+    assert page.next_since is None
+    assert history.next_seq == 3
+    monkeypatch.undo()
+
+
+def test_batch_legs_are_recorded_with_running_balance(atm: ATM) -> None:
+    atm.apply_batch([
+        {"op": "deposit", "account_id": "acc1", "amount": 100},
+        {"op": "transfer", "from_account": "acc1", "to_account": "acc2", "amount": 300},
+    ])
+    transactions = atm.login("user1", "password123").get_statement("acc1").transactions
+    assert [(t.operation, t.amount_cents, t.balance_cents) for t in transactions] == [
+        ("batch", 100, 10100), ("batch", -300, 9800)]
+
+
+def test_statement_of_foreign_account_is_rejected(atm: ATM) -> None:
+    with pytest.raises(UnauthorizedAccessError):
+        atm.login("user1", "password123").get_statement("acc2")
+
+
+def test_statement_without_history_fails(make_atm) -> None:
+    atm = make_atm()
+    with pytest.raises(ATMError):
+        atm.login("user1", "password123").get_statement("acc1")